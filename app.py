@@ -1,24 +1,178 @@
 import os
+import json
 import logging
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+import time
+from flask import (
+    Flask, Response, abort, g, render_template, request, jsonify, session, redirect, url_for, stream_with_context
+)
 from config import Config
+from models import db
+import fragment_cache
+import http_caching
+from session_store import ServerSideSessionInterface, build_session_store
 from services.spoonacular import (
     search_recipes, get_recipe_info, generate_meal_plan, 
-    generate_shopping_list, get_recipe_nutrition_widget, get_recipe_videos
+    get_recipe_nutrition_widget, get_recipe_videos, get_similar_recipes, search_by_nutrients, RECIPE_VIDEOS
 )
+from services import sqlite_connections
+from services import shopping_list as shopping_list_store
+from services.cache import cache_stats, get_ttl
+from services.quota import QuotaExceededError, quota_stats
+from services.resilience import breaker_stats
+from services.llm_cache import llm_cache_stats
+from services.nutrition_store import COLUMNS as NUTRIENT_COLUMNS
+from services.image_proxy import IMAGE_SIZES, MIMETYPES as IMAGE_TYPES, image_cache_stats, proxy_enabled as image_proxy_enabled
+from services.image_proxy import recipe_image as load_recipe_image, source_url as recipe_image_source_url
+from services.pantry import RANKINGS as PANTRY_RANKINGS, find_by_ingredients
+from services.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, observe_request, render_metrics
 from services.openrouter import get_ai_response as get_openrouter_response
+from services.openrouter import stream_ai_response as stream_openrouter_response
 try:
     from services.openai import get_ai_response as get_openai_response
+    from services.openai import stream_ai_response as stream_openai_response
+    from services.openai import analyze_recipes
     OPENAI_AVAILABLE = True
 except (ImportError, ValueError):
     OPENAI_AVAILABLE = False
 
 # Configure logging
-logging.basicConfig(level=logging.DEBUG)
+logging.basicConfig(level=getattr(logging, Config.LOG_LEVEL, logging.INFO))
 
 # Create Flask app
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", Config.SECRET_KEY)
+app.config["SQLALCHEMY_DATABASE_URI"] = Config.SQLALCHEMY_DATABASE_URI
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+    "pool_recycle": 300,
+    "pool_pre_ping": True,
+}
+db.init_app(app)
+
+if Config.SESSION_BACKEND != 'cookie':
+    app.session_interface = ServerSideSessionInterface(
+        build_session_store(Config.SESSION_BACKEND, path=Config.SESSION_DB_PATH, redis_url=Config.REDIS_URL)
+    )
+
+with app.app_context():
+    db.create_all()
+    shopping_list_store.init_schema()
+
+if Config.METRICS_ENABLED:
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        # Streamed responses are measured to their first byte
+        started = g.pop('request_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            observe_request(
+                route, request.method, response.status_code,
+                time.perf_counter() - started, response.content_length
+            )
+        return response
+
+fragment_cache.init_app(app)
+sqlite_connections.init_app(app)
+
+# Registered after the metrics hook so that it runs first and metrics see
+# the compressed response
+http_caching.init_app(app)
+
+def cacheable(response, namespace):
+    """
+    Let browsers reuse a JSON response for as long as the server caches it
+    """
+    response.cache_control.public = True
+    response.cache_control.max_age = get_ttl(namespace)
+    return response
+
+def sse_event(event, payload):
+    """
+    Format one server-sent event with a JSON payload
+    """
+    return f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+
+@app.template_global()
+def recipe_image_url(recipe, size='card'):
+    """
+    URL of a recipe's image at a size from IMAGE_SIZES: the local image
+    proxy when enabled, otherwise the image host's image of that size
+    """
+    if not recipe.get('id') or not recipe.get('image'):
+        return recipe.get('image')
+    if image_proxy_enabled():
+        return url_for('recipe_image', recipe_id=recipe['id'], size=size)
+    image = recipe['image'].rsplit('/', 1)[-1]
+    extension = image.rsplit('.', 1)[-1].lower() if '.' in image else ''
+    return recipe_image_source_url(recipe['id'], extension if extension in IMAGE_TYPES else None, size)
+
+def with_image_urls(recipes, size='card'):
+    """
+    Copies of recipe summaries with their image pointed at recipe_image_url
+    """
+    return [{**recipe, 'image': recipe_image_url(recipe, size)} for recipe in recipes or []]
+
+def plan_with_image_urls(meal_plan):
+    """
+    Copy of a day or week meal plan with every meal's image pointed at recipe_image_url
+    """
+    if 'week' in meal_plan:
+        week = {day: plan_with_image_urls(plan) for day, plan in meal_plan['week'].items()}
+        return {**meal_plan, 'week': week}
+    if 'meals' in meal_plan:
+        return {**meal_plan, 'meals': with_image_urls(meal_plan['meals'])}
+    return meal_plan
+
+def remember_viewed_recipe(recipe_summary):
+    """
+    Move a recipe to the end of the session's viewed list, keeping only the
+    Config.VIEWED_RECIPES_LIMIT most recent
+    """
+    viewed_recipes = session.get('viewed_recipes', [])
+    if viewed_recipes and viewed_recipes[-1] == recipe_summary:
+        return
+    
+    viewed_recipes = [recipe for recipe in viewed_recipes if recipe.get('id') != recipe_summary['id']]
+    viewed_recipes.append(recipe_summary)
+    session['viewed_recipes'] = viewed_recipes[-Config.VIEWED_RECIPES_LIMIT:]
+
+def current_shopping_list_id(create=False):
+    """
+    Returns the ID of this visitor's server-side shopping list, or None
+
+    Recipe IDs that older versions kept in the cookie are moved into the
+    store the first time a list is needed.
+    """
+    list_id = session.get('shopping_list_id')
+    if shopping_list_store.list_exists(list_id):
+        return list_id
+    
+    legacy_recipe_ids = session.pop('shopping_list', None)
+    if not create and not legacy_recipe_ids:
+        return None
+    
+    list_id = shopping_list_store.create_list(getattr(session, 'sid', None))
+    session['shopping_list_id'] = list_id
+    for recipe_id in legacy_recipe_ids or []:
+        try:
+            shopping_list_store.add_recipe(list_id, int(recipe_id))
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error migrating recipe {recipe_id} to shopping list: {e}")
+    return list_id
+
+def chat_error_message(e):
+    """
+    Map an AI provider exception to a user-facing error message
+    """
+    if "API key not found" in str(e):
+        return "AI service API key is missing. Please contact the administrator."
+    if "429" in str(e) or "rate limit" in str(e).lower():
+        return "AI service rate limit exceeded. Please try again later."
+    return "Could not get a response from the AI. Please try again."
 
 @app.route('/')
 def index():
@@ -35,45 +189,42 @@ def search():
     
     try:
         results = search_recipes(query, diet, intolerances)
-        return render_template('index.html', recipes=results, search_query=query)
+        return render_template(
+            'index.html', recipes=results, search_query=query,
+            search_identity=fragment_cache.search_identity(query, diet, intolerances)
+        )
     except Exception as e:
         logging.error(f"Error searching recipes: {e}")
         error_message = "An error occurred while searching for recipes."
         
-        # Check if it's an API limit error (402 Payment Required)
-        if "402" in str(e) and "Payment Required" in str(e):
+        # Check if the Spoonacular daily quota is spent
+        if isinstance(e, QuotaExceededError):
             error_message = "The recipe service has reached its daily request limit. Please try again tomorrow or contact support for assistance."
         
         return render_template('index.html', error=error_message)
 
 @app.route('/recipe/<int:recipe_id>')
 def recipe(recipe_id):
+    # Progressive mode renders from /information alone; similar recipes
+    # and videos are fetched by the page after first paint
+    progressive = Config.RECIPE_PROGRESSIVE_RENDERING
     try:
-        recipe_data = get_recipe_info(recipe_id)
+        recipe_data = get_recipe_info(recipe_id, enrich=not progressive)
         
         # Add recipe to session for potential shopping list addition
-        if 'viewed_recipes' not in session:
-            session['viewed_recipes'] = []
-            
-        # Only add if not already in the list
-        recipe_summary = {
+        remember_viewed_recipe({
             'id': recipe_data['id'],
             'title': recipe_data['title'],
-            'image': recipe_data.get('image', '')
-        }
-        
-        viewed_recipes = session['viewed_recipes']
-        if recipe_summary not in viewed_recipes:
-            viewed_recipes.append(recipe_summary)
-            session['viewed_recipes'] = viewed_recipes
+            'image': recipe_image_url(recipe_data) or ''
+        })
             
-        return render_template('recipe.html', recipe=recipe_data)
+        return render_template('recipe.html', recipe=recipe_data, progressive=progressive)
     except Exception as e:
         logging.error(f"Error getting recipe info: {e}")
         error_message = "Could not retrieve recipe information. Please try again."
         
-        # Check if it's an API limit error (402 Payment Required)
-        if "402" in str(e) and "Payment Required" in str(e):
+        # Check if the Spoonacular daily quota is spent
+        if isinstance(e, QuotaExceededError):
             error_message = "The recipe service has reached its daily request limit. Please try again tomorrow or contact support for assistance."
         
         return render_template('index.html', error=error_message)
@@ -104,15 +255,77 @@ def api_chat():
         return jsonify({"response": response, "provider": provider})
     except Exception as e:
         logging.error(f"Error getting AI response from {provider}: {e}")
-        
-        error_message = "Could not get a response from the AI. Please try again."
-        
-        if "API key not found" in str(e):
-            error_message = "AI service API key is missing. Please contact the administrator."
-        elif "429" in str(e) or "rate limit" in str(e).lower():
-            error_message = "AI service rate limit exceeded. Please try again later."
-        
-        return jsonify({"error": error_message, "provider": provider}), 500
+        return jsonify({"error": chat_error_message(e), "provider": provider}), 500
+
+@app.route('/api/chat/stream', methods=['POST'])
+def api_chat_stream():
+    """
+    Stream the AI response as server-sent events
+
+    Emits 'token' events carrying {"text": ...} chunks as they arrive, then a
+    single 'done' event, or an 'error' event if the upstream call fails.
+    """
+    data = request.json
+    user_message = data.get('message', '')
+    chat_history = data.get('history', [])
+    provider = data.get('provider', 'openrouter')  # Default to OpenRouter
+    
+    if not user_message:
+        return jsonify({"error": "No message provided"}), 400
+    
+    if provider == 'openai' and OPENAI_AVAILABLE:
+        chunks = stream_openai_response(user_message, chat_history)
+    else:
+        chunks = stream_openrouter_response(user_message, chat_history)
+    
+    def generate():
+        try:
+            for text in chunks:
+                yield sse_event('token', {"text": text})
+            yield sse_event('done', {"provider": provider})
+        except Exception as e:
+            logging.error(f"Error streaming AI response from {provider}: {e}")
+            yield sse_event('error', {"error": chat_error_message(e), "provider": provider})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/analyze-recipes', methods=['POST'])
+def api_analyze_recipes():
+    """
+    Extract structured data from many recipe texts, streamed as server-sent events
+
+    Takes {"recipes": [text, ...]}. Emits a 'result' event carrying
+    {"index": ..., "result": ...} for each recipe as soon as its analysis
+    is ready (in completion order, not input order), then a 'done' event.
+    """
+    if not OPENAI_AVAILABLE:
+        return jsonify({"error": "Recipe analysis is not available."}), 503
+    
+    data = request.get_json(silent=True) or {}
+    recipes = data.get('recipes')
+    if not isinstance(recipes, list) or not recipes:
+        return jsonify({"error": "No recipes provided"}), 400
+    if len(recipes) > Config.OPENAI_ANALYSIS_MAX_BATCH:
+        return jsonify({"error": f"At most {Config.OPENAI_ANALYSIS_MAX_BATCH} recipes per request"}), 400
+    
+    def generate():
+        results = analyze_recipes(recipes)
+        try:
+            for index, result in results:
+                yield sse_event('result', {"index": index, "result": result})
+            yield sse_event('done', {"count": len(recipes)})
+        finally:
+            results.close()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/meal-plan')
 def meal_plan():
@@ -128,14 +341,14 @@ def api_meal_plan():
     
     try:
         meal_plan = generate_meal_plan(time_frame, target_calories, diet, exclude)
-        return jsonify(meal_plan)
+        return jsonify(plan_with_image_urls(meal_plan))
     except Exception as e:
         logging.error(f"Error generating meal plan: {e}")
         error_message = "Could not generate meal plan. Please try again."
         status_code = 500
         
-        # Check if it's an API limit error (402 Payment Required)
-        if "402" in str(e) and "Payment Required" in str(e):
+        # Check if the Spoonacular daily quota is spent
+        if isinstance(e, QuotaExceededError):
             error_message = "The recipe service has reached its daily request limit. Please try again tomorrow or contact support for assistance."
             status_code = 402
             
@@ -153,15 +366,30 @@ def api_add_to_shopping_list():
     if not recipe_id:
         return jsonify({"error": "No recipe ID provided"}), 400
     
-    # Store in session
-    if 'shopping_list' not in session:
-        session['shopping_list'] = []
+    try:
+        recipe_id = int(recipe_id)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid recipe ID"}), 400
     
-    # Check if recipe is already in the shopping list
-    if recipe_id not in session['shopping_list']:
-        session['shopping_list'].append(recipe_id)
+    list_id = current_shopping_list_id(create=True)
     
-    return jsonify({"success": True, "message": "Recipe added to shopping list", "count": len(session['shopping_list'])})
+    try:
+        shopping_list_store.add_recipe(list_id, recipe_id)
+    except Exception as e:
+        db.session.rollback()
+        logging.error(f"Error adding recipe to shopping list: {e}")
+        error_message = "Could not add recipe to shopping list. Please try again."
+        status_code = 500
+        
+        # Check if the Spoonacular daily quota is spent
+        if isinstance(e, QuotaExceededError):
+            error_message = "The recipe service has reached its daily request limit. Please try again tomorrow or contact support for assistance."
+            status_code = 402
+            
+        return jsonify({"error": error_message}), status_code
+    
+    count = len(shopping_list_store.get_recipe_ids(list_id))
+    return jsonify({"success": True, "message": "Recipe added to shopping list", "count": count})
 
 @app.route('/api/remove-from-shopping-list', methods=['POST'])
 def api_remove_from_shopping_list():
@@ -171,38 +399,33 @@ def api_remove_from_shopping_list():
     if not recipe_id:
         return jsonify({"error": "No recipe ID provided"}), 400
     
-    # Remove from session
-    if 'shopping_list' in session and recipe_id in session['shopping_list']:
-        session['shopping_list'].remove(recipe_id)
+    try:
+        recipe_id = int(recipe_id)
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid recipe ID"}), 400
     
-    return jsonify({"success": True, "message": "Recipe removed from shopping list", "count": len(session.get('shopping_list', []))})
+    list_id = current_shopping_list_id()
+    count = 0
+    if list_id:
+        shopping_list_store.remove_recipe(list_id, recipe_id)
+        count = len(shopping_list_store.get_recipe_ids(list_id))
+    
+    return jsonify({"success": True, "message": "Recipe removed from shopping list", "count": count})
 
 @app.route('/api/get-shopping-list', methods=['GET'])
 def api_get_shopping_list():
-    recipe_ids = session.get('shopping_list', [])
+    list_id = current_shopping_list_id()
     
-    if not recipe_ids or len(recipe_ids) == 0:
-        return jsonify({"aisles": []})
+    if not list_id:
+        return jsonify({"recipe_ids": [], "aisles": []})
     
-    try:
-        shopping_list = generate_shopping_list(recipe_ids)
-        return jsonify(shopping_list)
-    except Exception as e:
-        logging.error(f"Error generating shopping list: {e}")
-        error_message = "Could not generate shopping list. Please try again."
-        status_code = 500
-        
-        # Check if it's an API limit error (402 Payment Required)
-        if "402" in str(e) and "Payment Required" in str(e):
-            error_message = "The recipe service has reached its daily request limit. Please try again tomorrow or contact support for assistance."
-            status_code = 402
-            
-        return jsonify({"error": error_message}), status_code
+    return jsonify(shopping_list_store.get_shopping_list(list_id))
 
 @app.route('/api/clear-shopping-list', methods=['POST'])
 def api_clear_shopping_list():
-    if 'shopping_list' in session:
-        session.pop('shopping_list')
+    list_id = current_shopping_list_id()
+    if list_id:
+        shopping_list_store.clear_list(list_id)
     
     return jsonify({"success": True, "message": "Shopping list cleared"})
 
@@ -210,36 +433,145 @@ def api_clear_shopping_list():
 def api_nutrition(recipe_id):
     try:
         nutrition_data = get_recipe_nutrition_widget(recipe_id)
-        return jsonify(nutrition_data)
+        if nutrition_data is None:
+            return jsonify(nutrition_data)
+        return cacheable(jsonify(nutrition_data), 'nutrition')
     except Exception as e:
         logging.error(f"Error getting nutrition data: {e}")
         error_message = "Could not get nutrition data. Please try again."
         status_code = 500
         
-        # Check if it's an API limit error (402 Payment Required)
-        if "402" in str(e) and "Payment Required" in str(e):
+        # Check if the Spoonacular daily quota is spent
+        if isinstance(e, QuotaExceededError):
             error_message = "The recipe service has reached its daily request limit. Please try again tomorrow or contact support for assistance."
             status_code = 402
             
         return jsonify({"error": error_message}), status_code
 
+@app.route('/api/nutrition/search', methods=['GET'])
+def api_nutrition_search():
+    """
+    Recipes by nutrient ranges, e.g. ?max_calories=500&min_protein=30&sort=-protein
+    """
+    bounds = {}
+    for column in NUTRIENT_COLUMNS:
+        low = request.args.get(f'min_{column}', type=float)
+        high = request.args.get(f'max_{column}', type=float)
+        if low is not None or high is not None:
+            bounds[column] = (low, high)
+    
+    sort = request.args.get('sort', '')
+    descending = sort.startswith('-')
+    sort = sort.lstrip('-') or None
+    if sort and sort not in NUTRIENT_COLUMNS:
+        return jsonify({"error": f"Unknown nutrient: {sort}"}), 400
+    
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    number = min(max(request.args.get('number', 12, type=int), 1), 100)
+    total, results = search_by_nutrients(bounds, offset, number, sort, descending)
+    return jsonify({"total": total, "offset": offset, "results": results})
+
+@app.route('/api/recipes-by-ingredients', methods=['GET', 'POST'])
+def api_recipes_by_ingredients():
+    """
+    Local recipes ranked by pantry coverage, e.g. ?ingredients=chicken,rice,garlic&ranking=missing
+
+    POST takes the same fields as JSON, with ingredients as a list.
+    """
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+    else:
+        data = request.args
+    ingredients = data.get('ingredients') or []
+    if isinstance(ingredients, str):
+        ingredients = ingredients.split(',')
+    ingredients = [str(item).strip() for item in ingredients if str(item).strip()]
+    if not ingredients:
+        return jsonify({"error": "No ingredients provided"}), 400
+    
+    ranking = data.get('ranking') or 'coverage'
+    if ranking not in PANTRY_RANKINGS:
+        return jsonify({"error": f"Unknown ranking: {ranking}"}), 400
+    
+    try:
+        offset = max(int(data.get('offset', 0)), 0)
+        number = min(max(int(data.get('number', 12)), 1), 100)
+    except (TypeError, ValueError):
+        return jsonify({"error": "offset and number must be integers"}), 400
+    ignore_pantry = str(data.get('ignore_pantry', 'true')).lower() not in ('false', '0', 'no')
+    total, results = find_by_ingredients(
+        ingredients, number=number, offset=offset, ranking=ranking, ignore_pantry=ignore_pantry,
+        diet=data.get('diet', ''), intolerances=data.get('intolerances', '')
+    )
+    return jsonify({"total": total, "offset": offset, "results": results})
+
 @app.route('/api/recipe-videos/<path:query>', methods=['GET'])
 def api_recipe_videos(query):
     try:
-        videos = get_recipe_videos(query, number=3)
-        return jsonify({"videos": videos})
+        videos = get_recipe_videos(query, number=RECIPE_VIDEOS)
+        return cacheable(jsonify({"videos": videos}), 'videos')
     except Exception as e:
         logging.error(f"Error getting recipe videos: {e}")
         error_message = "Could not get recipe videos. Please try again."
         status_code = 500
         
-        # Check if it's an API limit error (402 Payment Required)
-        if "402" in str(e) and "Payment Required" in str(e):
+        # Check if the Spoonacular daily quota is spent
+        if isinstance(e, QuotaExceededError):
             error_message = "The recipe service has reached its daily request limit. Please try again tomorrow or contact support for assistance."
             status_code = 402
             
         return jsonify({"error": error_message}), status_code
 
+@app.route('/api/recipe/<int:recipe_id>/similar', methods=['GET'])
+def api_similar_recipes(recipe_id):
+    # Optional enrichment: failures degrade to an empty list
+    similar_recipes = get_similar_recipes(recipe_id)
+    return cacheable(jsonify({"similar_recipes": with_image_urls(similar_recipes)}), 'similar')
+
+@app.route('/img/<int:recipe_id>/<size>', methods=['GET'])
+def recipe_image(recipe_id, size):
+    """
+    A recipe's image resized to one of IMAGE_SIZES, from the local image cache
+
+    Falls back to redirecting to the image host when the proxy is disabled
+    or the image cannot be fetched.
+    """
+    if size not in IMAGE_SIZES:
+        abort(404)
+    if not image_proxy_enabled():
+        return redirect(recipe_image_source_url(recipe_id, size=size))
+    try:
+        data, mimetype = load_recipe_image(recipe_id, size)
+    except Exception as e:
+        logging.warning(f"Error proxying image of recipe {recipe_id}: {e}")
+        return redirect(recipe_image_source_url(recipe_id, size=size))
+    
+    # Recipe images never change, so browsers may keep them indefinitely
+    response = Response(data, mimetype=mimetype)
+    response.headers['Cache-Control'] = f'public, max-age={Config.STATIC_MAX_AGE}, immutable'
+    return response
+
+@app.route('/api/cache-stats', methods=['GET'])
+def api_cache_stats():
+    # Hit rates for the Spoonacular response cache, the chat prompt cache,
+    # the rendered fragment cache and the image cache, plus the Spoonacular quota left
+    # today, what each endpoint has cost and the state of each upstream
+    # circuit breaker
+    return jsonify({
+        "responses": cache_stats(),
+        "llm": llm_cache_stats(),
+        "fragments": fragment_cache.fragment_cache_stats(),
+        "images": image_cache_stats(),
+        "quota": quota_stats(),
+        "circuits": breaker_stats(),
+    })
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    if not Config.METRICS_ENABLED:
+        abort(404)
+    return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
 @app.errorhandler(404)
 def page_not_found(e):
     return render_template('index.html', error="Page not found"), 404
@@ -0,0 +1,510 @@
+"""
+Local stand-in for the Spoonacular, OpenRouter and OpenAI APIs
+Serves deterministic synthetic recipes and canned chat completions with
+configurable latency and error rate so the app can be load-tested without
+spending API quota. Point the app at it with
+
+    SPOONACULAR_BASE_URL=http://127.0.0.1:<port>
+    OPENROUTER_API_URL=http://127.0.0.1:<port>/api/v1/chat/completions
+    OPENAI_BASE_URL=http://127.0.0.1:<port>/v1
+    RECIPE_IMAGE_SOURCE_URL=http://127.0.0.1:<port>/recipes
+
+    python -m benchmarks.fake_upstream --port 8900 --latency 0.2 --error-rate 0.01
+
+Recorded responses can be served instead of synthetic ones with --fixtures
+DIR: every *.json file there holds {"path": ..., "status": ..., "body": ...}
+and answers requests for that exact path.
+"""
+import argparse
+import glob
+import json
+import os
+import io
+import random
+import re
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+CUISINES = ['Italian', 'Mexican', 'Indian', 'Chinese', 'Thai', 'French', 'American', 'Greek', 'Japanese', 'Spanish']
+DISH_TYPES = ['main course', 'side dish', 'dessert', 'salad', 'soup', 'breakfast', 'snack']
+ADJECTIVES = ['Spicy', 'Creamy', 'Quick', 'Roasted', 'Grilled', 'Crispy', 'Hearty', 'Zesty', 'Smoky', 'Fresh']
+DISHES = ['Pasta', 'Curry', 'Tacos', 'Stir Fry', 'Salad', 'Soup', 'Risotto', 'Burger', 'Pie', 'Noodles']
+
+# (id, name, aisle, unit, typical amount)
+INGREDIENTS = [
+    (1001, 'butter', 'Milk, Eggs, Other Dairy', 'tbsp', 2),
+    (1123, 'egg', 'Milk, Eggs, Other Dairy', '', 2),
+    (1077, 'milk', 'Milk, Eggs, Other Dairy', 'cup', 1),
+    (1041009, 'cheddar cheese', 'Cheese', 'cup', 1),
+    (1033, 'parmesan', 'Cheese', 'tbsp', 3),
+    (5062, 'chicken breast', 'Meat', 'lb', 1),
+    (10023572, 'ground beef', 'Meat', 'lb', 1),
+    (15076, 'salmon', 'Seafood', 'oz', 8),
+    (15152, 'shrimp', 'Seafood', 'oz', 8),
+    (16057, 'chickpeas', 'Canned and Jarred', 'can', 1),
+    (11529, 'tomato', 'Produce', '', 2),
+    (11282, 'onion', 'Produce', '', 1),
+    (11215, 'garlic', 'Produce', 'cloves', 3),
+    (11333, 'bell pepper', 'Produce', '', 1),
+    (11457, 'spinach', 'Produce', 'cups', 2),
+    (11124, 'carrot', 'Produce', '', 2),
+    (11352, 'potato', 'Produce', '', 2),
+    (9152, 'lemon juice', 'Produce', 'tbsp', 2),
+    (11297, 'parsley', 'Produce', 'tbsp', 2),
+    (2044, 'basil', 'Produce', 'leaves', 6),
+    (20444, 'rice', 'Pasta and Rice', 'cup', 1),
+    (20420, 'pasta', 'Pasta and Rice', 'oz', 8),
+    (20081, 'flour', 'Baking', 'cup', 1),
+    (19335, 'sugar', 'Baking', 'tbsp', 2),
+    (18371, 'baking powder', 'Baking', 'tsp', 1),
+    (4053, 'olive oil', 'Oil, Vinegar, Salad Dressing', 'tbsp', 2),
+    (2047, 'salt', 'Spices and Seasonings', 'tsp', 1),
+    (1002030, 'black pepper', 'Spices and Seasonings', 'tsp', 0.5),
+    (2009, 'chili powder', 'Spices and Seasonings', 'tsp', 1),
+    (1002014, 'cumin', 'Spices and Seasonings', 'tsp', 1),
+    (16124, 'soy sauce', 'Ethnic Foods', 'tbsp', 2),
+    (12118, 'coconut milk', 'Ethnic Foods', 'can', 1),
+    (16098, 'peanut butter', 'Nut butters, Jams, and Honey', 'tbsp', 2),
+    (12061, 'almonds', 'Nuts', 'cup', 0.25),
+    (6194, 'chicken broth', 'Canned and Jarred', 'cups', 2),
+    (11291, 'green onions', 'Produce', '', 2),
+    (9003, 'apple', 'Produce', '', 1),
+    (9040, 'banana', 'Produce', '', 1),
+    (14412, 'water', 'Beverages', 'cups', 1),
+    (18064, 'bread', 'Bakery/Bread', 'slices', 2),
+]
+
+
+def make_recipe(recipe_id):
+    """
+    Build a deterministic synthetic recipe in Spoonacular's /information shape
+    """
+    rng = random.Random(recipe_id)
+    title = f"{rng.choice(ADJECTIVES)} {rng.choice(CUISINES)} {rng.choice(DISHES)} #{recipe_id}"
+    ingredients = rng.sample(INGREDIENTS, rng.randint(5, 12))
+    meaty = any(aisle in ('Meat', 'Seafood') for _, _, aisle, _, _ in ingredients)
+    dairy = any(aisle in ('Milk, Eggs, Other Dairy', 'Cheese') for _, _, aisle, _, _ in ingredients)
+    gluten = any(name in ('flour', 'pasta', 'bread') for _, name, _, _, _ in ingredients)
+    calories = rng.uniform(150, 900)
+    protein = rng.uniform(5, 60)
+    fat = rng.uniform(3, 45)
+    carbs = rng.uniform(10, 110)
+
+    diets = []
+    if not meaty:
+        diets.append('lacto ovo vegetarian')
+        if not dairy:
+            diets.append('vegan')
+    if not gluten:
+        diets.append('gluten free')
+    if not dairy:
+        diets.append('dairy free')
+
+    nutrients = [
+        ('Calories', calories, 'kcal'),
+        ('Fat', fat, 'g'),
+        ('Saturated Fat', fat * 0.3, 'g'),
+        ('Carbohydrates', carbs, 'g'),
+        ('Sugar', carbs * 0.2, 'g'),
+        ('Cholesterol', rng.uniform(0, 150), 'mg'),
+        ('Sodium', rng.uniform(100, 1500), 'mg'),
+        ('Protein', protein, 'g'),
+        ('Fiber', rng.uniform(1, 12), 'g'),
+        ('Vitamin C', rng.uniform(0, 60), 'mg'),
+        ('Iron', rng.uniform(0, 8), 'mg'),
+    ]
+    daily = {'Calories': 2000, 'Fat': 65, 'Saturated Fat': 20, 'Carbohydrates': 300, 'Sugar': 100,
+             'Cholesterol': 300, 'Sodium': 2400, 'Protein': 50, 'Fiber': 25, 'Vitamin C': 60, 'Iron': 18}
+
+    return {
+        'id': recipe_id,
+        'title': title,
+        'image': f"https://img.spoonacular.com/recipes/{recipe_id}-556x370.jpg",
+        'imageType': 'jpg',
+        'readyInMinutes': rng.choice([15, 20, 30, 45, 60, 90]),
+        'servings': rng.choice([1, 2, 4, 6]),
+        'sourceUrl': f"https://example.com/recipes/{recipe_id}",
+        'summary': f"<b>{title}</b> is a {rng.choice(DISH_TYPES)} ready in no time.",
+        'vegetarian': not meaty,
+        'vegan': not meaty and not dairy,
+        'glutenFree': not gluten,
+        'dairyFree': not dairy,
+        'cuisines': [rng.choice(CUISINES)],
+        'dishTypes': rng.sample(DISH_TYPES, 2),
+        'diets': diets,
+        'extendedIngredients': [
+            {
+                'id': ingredient_id,
+                'name': name,
+                'nameClean': name,
+                'aisle': aisle,
+                'amount': amount,
+                'unit': unit,
+                'original': f"{amount} {unit} {name}".strip(),
+                'measures': {
+                    'us': {'amount': amount, 'unitShort': unit, 'unitLong': unit},
+                    'metric': {'amount': amount, 'unitShort': unit, 'unitLong': unit},
+                },
+            }
+            for ingredient_id, name, aisle, unit, amount in ingredients
+        ],
+        'instructions': 'Prepare the ingredients. Cook. Serve.',
+        'analyzedInstructions': [{
+            'name': '',
+            'steps': [
+                {'number': 1, 'step': 'Prepare the ingredients.'},
+                {'number': 2, 'step': 'Cook everything together.'},
+                {'number': 3, 'step': 'Serve warm.'},
+            ],
+        }],
+        'nutrition': {
+            'nutrients': [
+                {'name': name, 'amount': round(amount, 2), 'unit': unit,
+                 'percentOfDailyNeeds': round(amount / daily[name] * 100, 2)}
+                for name, amount, unit in nutrients
+            ],
+            'caloricBreakdown': {
+                'percentProtein': round(protein * 4 / calories * 100, 2),
+                'percentFat': round(fat * 9 / calories * 100, 2),
+                'percentCarbs': round(carbs * 4 / calories * 100, 2),
+            },
+        },
+    }
+
+
+def make_image(recipe_id, width, height):
+    """
+    Deterministic solid-colour recipe image: a JPEG with Pillow, a BMP without
+    """
+    rng = random.Random(recipe_id)
+    colour = (rng.randrange(256), rng.randrange(256), rng.randrange(256))
+    if Image is not None:
+        output = io.BytesIO()
+        Image.new('RGB', (width, height), colour).save(output, format='JPEG', quality=90)
+        return output.getvalue()
+    row = bytes(reversed(colour)) * width
+    row += b'\0' * (-len(row) % 4)
+    pixels = row * height
+    header = struct.pack('<2sIHHI', b'BM', 54 + len(pixels), 0, 0, 54)
+    info = struct.pack('<IiiHHIIiiII', 40, width, height, 1, 24, 0, len(pixels), 2835, 2835, 0, 0)
+    return header + info + pixels
+
+
+# Approximate Spoonacular point cost of each endpoint
+POINTS = {
+    'complexSearch': 1.0, 'informationBulk': 1.0, 'information': 1.0, 'similar': 1.0,
+    'nutritionWidget': 1.0, 'videos': 1.0, 'mealplanner': 1.0, 'shoppingList': 1.0,
+}
+
+
+def _summary(recipe):
+    return {key: recipe[key] for key in ('id', 'title', 'image', 'imageType', 'readyInMinutes', 'servings', 'sourceUrl')}
+
+
+def _query_id(query):
+    """
+    Map a free-text query to a stable recipe ID range start
+    """
+    return 1000 + sum(ord(c) for c in query.lower()) * 37 % 50000
+
+
+class FakeSpoonacular:
+    """
+    Request router for the fake Spoonacular and chat completion endpoints
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, quota=None, error_rate=0.0, fixtures=None, token_latency=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        # Daily points before every call is answered with 402; None for unlimited
+        self.quota = quota
+        # Fraction of requests answered with a 500
+        self.error_rate = error_rate
+        # path -> (status, body) recorded responses
+        self.fixtures = fixtures or {}
+        # Seconds between streamed chat completion chunks
+        self.token_latency = token_latency
+        self.points_used = 0.0
+        self.calls = {}
+        self._lock = threading.Lock()
+
+    def record(self, endpoint):
+        with self._lock:
+            self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+
+    def charge(self, endpoint, query):
+        """
+        Spend the points for a call; returns (allowed, quota headers)
+        """
+        if endpoint not in POINTS:
+            return True, {}
+        cost = POINTS[endpoint]
+        if endpoint == 'informationBulk':
+            ids = [recipe_id for recipe_id in query.get('ids', [''])[0].split(',') if recipe_id]
+            cost += 0.5 * max(0, len(ids) - 1)
+        with self._lock:
+            if self.quota is not None and self.points_used + cost > self.quota:
+                allowed, cost = False, 0.0
+            else:
+                allowed = True
+                self.points_used += cost
+            headers = {'X-API-Quota-Request': f"{cost:g}", 'X-API-Quota-Used': f"{self.points_used:g}"}
+            if self.quota is not None:
+                headers['X-API-Quota-Left'] = f"{max(0.0, self.quota - self.points_used):g}"
+        return allowed, headers
+
+    def delay(self):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+    def handle(self, method, path, query, body):
+        """
+        Returns (endpoint name, status, JSON payload) for a request
+        """
+        params = {key: values[0] for key, values in query.items()}
+
+        if self.error_rate and random.random() < self.error_rate:
+            return 'injectedError', 500, {'status': 'failure', 'message': 'Injected upstream error'}
+
+        if path in self.fixtures:
+            status, payload = self.fixtures[path]
+            return 'fixture', status, payload
+
+        if path.endswith('/chat/completions') and method == 'POST':
+            return 'chatCompletions', 200, self._completion(body or {})
+
+        if path == '/recipes/complexSearch':
+            start = _query_id(params.get('query', ''))
+            number = int(params.get('number', 10))
+            offset = int(params.get('offset', 0))
+            results = [make_recipe(start + offset + i) for i in range(number)]
+            return 'complexSearch', 200, {'results': results, 'offset': offset, 'number': number, 'totalResults': 100}
+
+        if path == '/recipes/informationBulk':
+            ids = [int(recipe_id) for recipe_id in params.get('ids', '').split(',') if recipe_id]
+            return 'informationBulk', 200, [make_recipe(recipe_id) for recipe_id in ids]
+
+        match = re.fullmatch(r'/recipes/(\d+)-(\d+)x(\d+)\.\w+', path)
+        if match:
+            recipe_id, width, height = (int(group) for group in match.groups())
+            return 'recipeImage', 200, make_image(recipe_id, width, height)
+
+        match = re.fullmatch(r'/recipes/(\d+)/(information|similar|nutritionWidget\.json)', path)
+        if match:
+            recipe_id, kind = int(match.group(1)), match.group(2)
+            recipe = make_recipe(recipe_id)
+            if kind == 'information':
+                return 'information', 200, recipe
+            if kind == 'similar':
+                number = int(params.get('number', 3))
+                return 'similar', 200, [_summary(make_recipe(recipe_id * 7 + i)) for i in range(1, number + 1)]
+            nutrition = recipe['nutrition']
+            by_name = {nutrient['name']: nutrient for nutrient in nutrition['nutrients']}
+            return 'nutritionWidget', 200, {
+                'calories': str(int(by_name['Calories']['amount'])),
+                'carbs': f"{int(by_name['Carbohydrates']['amount'])}g",
+                'fat': f"{int(by_name['Fat']['amount'])}g",
+                'protein': f"{int(by_name['Protein']['amount'])}g",
+                'bad': [], 'good': [],
+                'nutrients': nutrition['nutrients'],
+                'caloricBreakdown': nutrition['caloricBreakdown'],
+            }
+
+        if path == '/food/videos/search':
+            number = int(params.get('number', 1))
+            seed = _query_id(params.get('query', ''))
+            videos = [
+                {'title': f"How to cook {params.get('query', '')} ({i + 1})", 'shortTitle': params.get('query', ''),
+                 'youTubeId': f"vid{seed + i}", 'views': 1000 * (i + 1), 'length': 300}
+                for i in range(number)
+            ]
+            return 'videos', 200, {'videos': videos, 'totalResults': number}
+
+        if path == '/mealplanner/generate':
+            rng = random.Random()
+            if params.get('timeFrame') == 'week':
+                days = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+                week = {day: self._plan_day(rng) for day in days}
+                return 'mealplanner', 200, {'week': week}
+            return 'mealplanner', 200, self._plan_day(rng)
+
+        if path == '/mealplanner/shopping-list/compute' and method == 'POST':
+            items = (body or {}).get('items', [])
+            aisles = {}
+            for item in items:
+                for ingredient in make_recipe(int(item['id']))['extendedIngredients']:
+                    aisles.setdefault(ingredient['aisle'], []).append({
+                        'name': ingredient['name'],
+                        'measures': {'original': {'amount': ingredient['amount'], 'unit': ingredient['unit']}},
+                        'ingredientId': ingredient['id'],
+                    })
+            return 'shoppingList', 200, {
+                'aisles': [{'aisle': aisle, 'items': entries} for aisle, entries in sorted(aisles.items())],
+            }
+
+        return 'unknown', 404, {'status': 'failure', 'message': f'Unknown endpoint {path}'}
+
+    def _completion(self, body):
+        """
+        Canned chat completion; a list of SSE chunks when streaming
+        """
+        messages = body.get('messages') or [{}]
+        question = str(messages[-1].get('content', ''))[:80]
+        answer = f"Here is a quick idea for \"{question}\": saute garlic in olive oil, add tomatoes, and simmer for ten minutes."
+        model = body.get('model', 'fake-model')
+        if not body.get('stream'):
+            return {
+                'id': 'chatcmpl-fake', 'object': 'chat.completion', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': answer}, 'finish_reason': 'stop'}],
+                'usage': {'prompt_tokens': 50, 'completion_tokens': len(answer) // 4, 'total_tokens': 50 + len(answer) // 4},
+            }
+        chunks = []
+        for word in answer.split(' '):
+            chunks.append({
+                'id': 'chatcmpl-fake', 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': model,
+                'choices': [{'index': 0, 'delta': {'content': word + ' '}, 'finish_reason': None}],
+            })
+        return chunks
+
+    def _plan_day(self, rng):
+        meals = [_summary(make_recipe(rng.randint(1000, 60000))) for _ in range(3)]
+        recipes = [make_recipe(meal['id']) for meal in meals]
+        totals = {}
+        for recipe in recipes:
+            for nutrient in recipe['nutrition']['nutrients']:
+                totals[nutrient['name']] = totals.get(nutrient['name'], 0) + nutrient['amount']
+        return {
+            'meals': meals,
+            'nutrients': {
+                'calories': totals['Calories'],
+                'protein': totals['Protein'],
+                'fat': totals['Fat'],
+                'carbohydrates': totals['Carbohydrates'],
+            },
+        }
+
+
+def make_handler(fake):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _dispatch(self, method):
+            url = urlparse(self.path)
+            body = None
+            length = int(self.headers.get('Content-Length') or 0)
+            if length:
+                body = json.loads(self.rfile.read(length))
+
+            fake.delay()
+            query = parse_qs(url.query)
+            endpoint, status, payload = fake.handle(method, url.path, query, body)
+            fake.record(endpoint)
+            allowed, quota_headers = fake.charge(endpoint, query)
+            if not allowed:
+                status = 402
+                payload = {'status': 'failure', 'code': 402, 'message': 'Your daily points limit has been reached.'}
+
+            if status == 200 and endpoint == 'chatCompletions' and isinstance(payload, list):
+                self._stream(payload)
+                return
+
+            if isinstance(payload, bytes):
+                data, content_type = payload, 'image/bmp' if payload.startswith(b'BM') else 'image/jpeg'
+            else:
+                data, content_type = json.dumps(payload).encode(), 'application/json'
+            self.send_response(status)
+            for name, value in quota_headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _stream(self, chunks):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+            for chunk in chunks:
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+                if fake.token_latency:
+                    time.sleep(fake.token_latency)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+
+        def do_GET(self):
+            self._dispatch('GET')
+
+        def do_POST(self):
+            self._dispatch('POST')
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def load_fixtures(directory):
+    """
+    Read recorded responses from *.json files into a path -> (status, body) dict
+    """
+    fixtures = {}
+    for filename in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        with open(filename, encoding='utf-8') as f:
+            fixture = json.load(f)
+        fixtures[fixture['path']] = (fixture.get('status', 200), fixture['body'])
+    return fixtures
+
+
+def start_server(host='127.0.0.1', port=0, latency=0.0, jitter=0.0, quota=None, error_rate=0.0,
+                 fixtures=None, token_latency=0.0):
+    """
+    Start the fake upstream on a background thread
+
+    Returns (server, fake); server.server_address holds the bound port.
+    """
+    fake = FakeSpoonacular(
+        latency=latency, jitter=jitter, quota=quota, error_rate=error_rate,
+        fixtures=load_fixtures(fixtures) if fixtures else None, token_latency=token_latency
+    )
+    server = ThreadingHTTPServer((host, port), make_handler(fake))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, fake
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency', type=float, default=0.2, help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=0.0, help='random +/- seconds added to the latency')
+    parser.add_argument('--quota', type=float, help='daily points before answering 402 (default: unlimited)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with a 500')
+    parser.add_argument('--fixtures', help='directory of recorded responses to serve')
+    parser.add_argument('--token-latency', type=float, default=0.0, help='seconds between streamed chat chunks')
+    args = parser.parse_args()
+
+    server, _ = start_server(
+        args.host, args.port, args.latency, args.jitter, args.quota,
+        args.error_rate, args.fixtures, args.token_latency
+    )
+    print(f"Fake upstream listening on http://{args.host}:{server.server_address[1]}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
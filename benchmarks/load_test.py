@@ -0,0 +1,164 @@
+"""
+Load benchmark comparing gunicorn worker modes
+Starts the fake Spoonacular upstream, serves the app under each
+WORKER_MODE in turn and drives one route with concurrent clients,
+reporting requests/sec and latency percentiles.
+
+    python -m benchmarks.load_test --modes sync,gthread,gevent --latency 0.2
+
+Caching is disabled so every request reaches the (slow) upstream. Each
+app run keeps its databases, caches and images in a fresh temporary
+directory, so instance/ is never touched.
+"""
+import argparse
+import math
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fake_upstream import start_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of a list of numbers
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url, timeout=1).read()
+            return
+        except (urllib.error.URLError, ConnectionError, OSError):
+            time.sleep(0.2)
+    raise RuntimeError(f"App did not come up at {url}")
+
+
+def state_env(state):
+    """
+    Environment pointing every database, cache and image directory at state
+    """
+    return {
+        'DATABASE_URL': f"sqlite:///{os.path.join(state, 'app.db')}",
+        'SESSION_DB_PATH': os.path.join(state, 'sessions.sqlite3'),
+        'CACHE_PATH': os.path.join(state, 'cache.sqlite3'),
+        'LLM_CACHE_PATH': os.path.join(state, 'llm_cache.sqlite3'),
+        'RECIPE_STORE_PATH': os.path.join(state, 'recipes.sqlite3'),
+        'NUTRITION_STORE_PATH': os.path.join(state, 'nutrition.sqlite3'),
+        'IMAGE_CACHE_DIR': os.path.join(state, 'images'),
+        'QUOTA_DB_PATH': os.path.join(state, 'quota.sqlite3'),
+        'OPENAI_ANALYSIS_CACHE_PATH': os.path.join(state, 'analysis.sqlite3'),
+    }
+
+
+def start_app(mode, port, upstream_url, workers, threads, state, extra_env=None):
+    """
+    Serve the app under gunicorn, keeping all of its state in the state directory
+    """
+    env = dict(
+        os.environ,
+        WORKER_MODE=mode,
+        WEB_CONCURRENCY=str(workers),
+        THREADS=str(threads),
+        BIND=f"127.0.0.1:{port}",
+        SPOONACULAR_BASE_URL=upstream_url,
+        CACHE_BACKEND='none',
+        HTTP_MAX_RETRIES='0',
+    )
+    env.update(state_env(state))
+    env.update(extra_env or {})
+    return subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'main:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+
+
+def drive(url, total, concurrency):
+    """
+    Issue total GET requests with the given concurrency
+
+    Returns (elapsed seconds, list of latencies of successful requests, error count)
+    """
+    def one(_):
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(url, timeout=60) as response:
+                response.read()
+            return time.perf_counter() - start
+        except (urllib.error.URLError, OSError):
+            return None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(total)))
+    elapsed = time.perf_counter() - start
+
+    latencies = [result for result in results if result is not None]
+    return elapsed, latencies, len(results) - len(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', default='sync,gthread,gevent')
+    parser.add_argument('--path', default='/api/recipe-videos/pasta', help='route to load')
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=8, help='threads per worker in gthread mode')
+    parser.add_argument('--latency', type=float, default=0.2, help='fake upstream latency in seconds')
+    args = parser.parse_args()
+
+    upstream, _ = start_server(latency=args.latency)
+    upstream_url = f"http://127.0.0.1:{upstream.server_address[1]}"
+
+    print(f"{args.requests} requests to {args.path}, concurrency {args.concurrency}, "
+          f"{args.workers} workers, upstream latency {args.latency * 1000:.0f}ms")
+    print(f"{'mode':<10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+
+    for mode in args.modes.split(','):
+        port = free_port()
+        state = tempfile.mkdtemp(prefix=f'load-test-{mode}-')
+        app = start_app(mode, port, upstream_url, args.workers, args.threads, state)
+        try:
+            wait_until_ready(f"http://127.0.0.1:{port}/")
+            url = f"http://127.0.0.1:{port}{args.path}"
+            drive(url, min(args.concurrency, args.requests), args.concurrency)  # warm up
+            elapsed, latencies, errors = drive(url, args.requests, args.concurrency)
+        finally:
+            app.terminate()
+            app.wait()
+            shutil.rmtree(state, ignore_errors=True)
+
+        print(f"{mode:<10}{len(latencies) / elapsed:>10.1f}"
+              f"{percentile(latencies, 50) * 1000:>10.0f}"
+              f"{percentile(latencies, 95) * 1000:>10.0f}"
+              f"{percentile(latencies, 99) * 1000:>10.0f}"
+              f"{errors:>8}")
+
+    upstream.shutdown()
+
+
+if __name__ == '__main__':
+    main()
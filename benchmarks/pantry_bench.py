@@ -0,0 +1,56 @@
+"""
+Pantry match benchmark
+Indexes synthetic corpora of increasing size and times "cook with what I
+have" queries for small and large pantries under both rankings, reporting
+matrix build time and per-query latency percentiles.
+
+    python -m benchmarks.pantry_bench --sizes 10000,100000
+"""
+import argparse
+import time
+
+from benchmarks.fake_upstream import INGREDIENTS, make_recipe
+from benchmarks.load_test import percentile
+from services.pantry import _Matrix, _matrix, find_by_ingredients
+from services.recipe_store import RecipeIndex
+
+# (label, pantry, ranking)
+PANTRIES = [
+    ('3 items', ['chicken', 'rice', 'garlic'], 'coverage'),
+    ('3 items', ['chicken', 'rice', 'garlic'], 'missing'),
+    ('10 items', [name for _, name, _, _, _ in INGREDIENTS[:10]], 'coverage'),
+    ('whole corpus', [name for _, name, _, _, _ in INGREDIENTS], 'coverage'),
+    ('whole corpus', [name for _, name, _, _, _ in INGREDIENTS], 'missing'),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000', help='corpus sizes to index')
+    parser.add_argument('--rounds', type=int, default=20, help='times each query is run')
+    args = parser.parse_args()
+
+    print(f"{'recipes':>10}{'matrix s':>10}{'pantry':>28}{'matches':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for size in (int(size) for size in args.sizes.split(',')):
+        index = RecipeIndex()
+        for recipe_id in range(1, size + 1):
+            index.add(make_recipe(recipe_id))
+        started = time.perf_counter()
+        _Matrix(index)
+        build = time.perf_counter() - started
+        _matrix(index)  # warm the shared snapshot
+
+        for label, pantry, ranking in PANTRIES:
+            latencies = []
+            for _ in range(args.rounds):
+                started = time.perf_counter()
+                total, _ = find_by_ingredients(pantry, ranking=ranking, index=index)
+                latencies.append(time.perf_counter() - started)
+            label = f"{label} by {ranking}"
+            print(f"{size:>10}{build:>10.2f}{label:>28}{total:>10}"
+                  f"{percentile(latencies, 50) * 1000:>10.2f}"
+                  f"{percentile(latencies, 99) * 1000:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
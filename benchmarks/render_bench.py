@@ -0,0 +1,97 @@
+"""
+Template render benchmark
+Renders the recipe page (progressive and fully enriched) and a search result
+page in-process, with the fragment cache off and then warm, and reports
+per-render latency percentiles and the speed-up.
+
+    python -m benchmarks.render_bench --rounds 500 --distinct 20
+
+App state lives in a temporary directory; no upstream is called.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.fake_upstream import make_recipe
+from benchmarks.load_test import percentile
+
+
+def _scenarios(distinct):
+    """
+    name -> (path, template, list of per-render contexts)
+    """
+    from fragment_cache import search_identity
+    from services.recipe_store import card
+
+    recipes = [make_recipe(1000 + i) for i in range(distinct)]
+    similar = [{key: recipe[key] for key in ('id', 'title', 'image', 'readyInMinutes', 'servings')}
+               for recipe in recipes[:3]]
+    queries = [f"pasta {i}" for i in range(distinct)]
+    return {
+        'recipe (progressive)': ('/recipe/1', 'recipe.html', [
+            {'recipe': recipe, 'progressive': True} for recipe in recipes
+        ]),
+        'recipe (enriched)': ('/recipe/1', 'recipe.html', [
+            {'recipe': {**recipe, 'similar_recipes': similar}, 'progressive': False} for recipe in recipes
+        ]),
+        'search (12 results)': ('/search', 'index.html', [
+            {'recipes': [card(make_recipe(2000 + i * 12 + j)) for j in range(12)], 'search_query': query,
+             'search_identity': search_identity(query)}
+            for i, query in enumerate(queries)
+        ]),
+    }
+
+
+def _time_renders(app, path, template, contexts, rounds):
+    from flask import render_template
+
+    latencies = []
+    with app.test_request_context(path):
+        for i in range(rounds):
+            context = contexts[i % len(contexts)]
+            started = time.perf_counter()
+            render_template(template, **context)
+            latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rounds', type=int, default=500, help='renders per scenario and mode')
+    parser.add_argument('--distinct', type=int, default=20, help='distinct recipes / queries rendered')
+    args = parser.parse_args()
+
+    state = tempfile.mkdtemp(prefix='render-bench-')
+    os.environ.update({
+        'DATABASE_URL': f"sqlite:///{os.path.join(state, 'app.db')}",
+        'SESSION_DB_PATH': os.path.join(state, 'sessions.sqlite3'),
+        'CACHE_PATH': os.path.join(state, 'cache.sqlite3'),
+        'RECIPE_STORE_PATH': os.path.join(state, 'recipes.sqlite3'),
+        'NUTRITION_STORE_PATH': os.path.join(state, 'nutrition.sqlite3'),
+        'QUOTA_DB_PATH': os.path.join(state, 'quota.sqlite3'),
+        'LOG_LEVEL': 'WARNING',
+    })
+    from app import app
+    from config import Config
+
+    print(f"{args.rounds} renders per scenario over {args.distinct} distinct pages")
+    print(f"{'scenario':<24}{'mode':>8}{'p50 ms':>10}{'p99 ms':>10}{'speed-up':>10}")
+    for name, (path, template, contexts) in _scenarios(args.distinct).items():
+        Config.FRAGMENT_CACHE_ENABLED = False
+        uncached = _time_renders(app, path, template, contexts, args.rounds)
+
+        Config.FRAGMENT_CACHE_ENABLED = True
+        _time_renders(app, path, template, contexts, len(contexts))  # prime
+        cached = _time_renders(app, path, template, contexts, args.rounds)
+
+        speedup = percentile(uncached, 50) / max(percentile(cached, 50), 1e-9)
+        for mode, latencies in (('off', uncached), ('warm', cached)):
+            print(f"{name:<24}{mode:>8}"
+                  f"{percentile(latencies, 50) * 1000:>10.3f}"
+                  f"{percentile(latencies, 99) * 1000:>10.3f}"
+                  + (f"{speedup:>9.1f}x" if mode == 'warm' else ''))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,196 @@
+"""
+Route benchmark against local upstream stand-ins
+Starts the fake Spoonacular/OpenRouter/OpenAI server and the app under
+gunicorn, then drives every route in app.py in turn, reporting requests/sec,
+latency percentiles, errors and the upstream calls each route caused.
+
+    python -m benchmarks.route_bench --requests 200 --concurrency 16 --latency 0.1
+    python -m benchmarks.route_bench --routes recipe,search --error-rate 0.05
+
+All app state (databases, caches, recipe corpus) lives in a temporary
+directory, so runs are reproducible and never touch instance/.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+
+from benchmarks.fake_upstream import start_server
+from benchmarks.load_test import free_port, percentile, start_app, wait_until_ready
+
+QUERIES = ['pasta', 'chicken curry', 'vegan salad', 'tomato soup', 'tacos', 'risotto', 'pie', 'noodles']
+
+# name -> (method, path template, JSON body template or None)
+SCENARIOS = {
+    'index': ('GET', '/', None),
+    'search': ('GET', '/search?query={query}', None),
+    'recipe': ('GET', '/recipe/{id}', None),
+    'nutrition': ('GET', '/api/nutrition/{id}', None),
+    'nutrition_search': ('GET', '/api/nutrition/search?max_calories=500&min_protein=30', None),
+    'similar': ('GET', '/api/recipe/{id}/similar', None),
+    'recipes_by_ingredients': ('GET', '/api/recipes-by-ingredients?ingredients=chicken%20breast,tomato,onion', None),
+    'recipe_image': ('GET', '/img/{id}/card', None),
+    'videos': ('GET', '/api/recipe-videos/{query}', None),
+    'chat_page': ('GET', '/chat', None),
+    'chat': ('POST', '/api/chat', {'message': 'How do I make {query}?', 'provider': 'openrouter', 'history': []}),
+    'chat_stream': ('POST', '/api/chat/stream', {'message': 'How do I make {query}?', 'provider': 'openrouter', 'history': []}),
+    'chat_openai': ('POST', '/api/chat', {'message': 'How do I make {query}?', 'provider': 'openai', 'history': []}),
+    'analyze_recipes': ('POST', '/api/analyze-recipes', {'recipes': ['{query}\n2 eggs\n1 cup milk\nMix and cook.', '{query} for two']}),
+    'meal_plan_page': ('GET', '/meal-plan', None),
+    'meal_plan': ('POST', '/api/meal-plan', {'timeFrame': 'day', 'targetCalories': 2000}),
+    'shopping_list_page': ('GET', '/shopping-list', None),
+    'add_to_shopping_list': ('POST', '/api/add-to-shopping-list', {'recipe_id': '{id}'}),
+    'get_shopping_list': ('GET', '/api/get-shopping-list', None),
+    'remove_from_shopping_list': ('POST', '/api/remove-from-shopping-list', {'recipe_id': '{id}'}),
+    'clear_shopping_list': ('POST', '/api/clear-shopping-list', {}),
+    'cache_stats': ('GET', '/api/cache-stats', None),
+    'metrics': ('GET', '/metrics', None),
+}
+
+
+def _fill(template, values):
+    if isinstance(template, str):
+        return template.format(**values)
+    if isinstance(template, dict):
+        return {key: _fill(value, values) for key, value in template.items()}
+    if isinstance(template, list):
+        return [_fill(value, values) for value in template]
+    return template
+
+
+class Client:
+    """
+    One simulated user per thread, keeping its own session cookie
+    """
+    _local = threading.local()
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def _opener(self):
+        opener = getattr(self._local, 'opener', None)
+        if opener is None:
+            opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+            self._local.opener = opener
+        return opener
+
+    def request(self, method, path, body=None):
+        """
+        Returns (seconds, status); status is None for a connection failure
+        """
+        data = json.dumps(body).encode() if body is not None else None
+        request = urllib.request.Request(self.base_url + path, data=data, method=method)
+        if data is not None:
+            request.add_header('Content-Type', 'application/json')
+        start = time.perf_counter()
+        try:
+            with self._opener().open(request, timeout=60) as response:
+                response.read()
+                status = response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            status = e.code
+        except (urllib.error.URLError, OSError):
+            status = None
+        return time.perf_counter() - start, status
+
+
+def run_scenario(client, scenario, total, concurrency, distinct):
+    """
+    Returns (elapsed seconds, latencies of 2xx/3xx responses, error count)
+    """
+    method, path, body = SCENARIOS[scenario]
+    rng = random.Random(scenario)
+    # A fixed pool of IDs and queries so repeated requests can hit the caches
+    values = [
+        {'id': 1000 + rng.randrange(distinct), 'query': rng.choice(QUERIES)}
+        for _ in range(total)
+    ]
+
+    def one(value):
+        # Queries contain spaces, which must be escaped in the URL but not the body
+        escaped = {key: urllib.parse.quote(str(item)) for key, item in value.items()}
+        return client.request(method, _fill(path, escaped), _fill(body, value))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, values))
+    elapsed = time.perf_counter() - start
+
+    latencies = [seconds for seconds, status in results if status is not None and status < 400]
+    return elapsed, latencies, len(results) - len(latencies)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--routes', default=','.join(SCENARIOS), help='comma-separated scenarios to run')
+    parser.add_argument('--requests', type=int, default=200, help='requests per route')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--distinct', type=int, default=50, help='distinct recipe IDs requested')
+    parser.add_argument('--mode', default='gthread', help='gunicorn WORKER_MODE')
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--cache', default='sqlite', help='CACHE_BACKEND for the app')
+    parser.add_argument('--latency', type=float, default=0.1, help='fake upstream latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of upstream calls that fail')
+    parser.add_argument('--token-latency', type=float, default=0.01, help='seconds between streamed chat chunks')
+    parser.add_argument('--fixtures', help='directory of recorded upstream responses')
+    args = parser.parse_args()
+
+    upstream, fake = start_server(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+        fixtures=args.fixtures, token_latency=args.token_latency
+    )
+    upstream_url = f"http://127.0.0.1:{upstream.server_address[1]}"
+    state = tempfile.mkdtemp(prefix='route-bench-')
+    port = free_port()
+    app = start_app(args.mode, port, upstream_url, args.workers, args.threads, state, extra_env={
+        'CACHE_BACKEND': args.cache,
+        'HTTP_MAX_RETRIES': '0' if args.error_rate == 0 else os.environ.get('HTTP_MAX_RETRIES', '2'),
+        'OPENROUTER_API_URL': f"{upstream_url}/api/v1/chat/completions",
+        'OPENROUTER_API_KEY': 'bench',
+        'OPENAI_BASE_URL': f"{upstream_url}/v1",
+        'OPENAI_API_KEY': 'bench',
+        'RECIPE_IMAGE_SOURCE_URL': f"{upstream_url}/recipes",
+        'LOG_LEVEL': 'WARNING',
+    })
+
+    print(f"{args.requests} requests per route, concurrency {args.concurrency}, {args.mode} x{args.workers}, "
+          f"upstream latency {args.latency * 1000:.0f}ms, error rate {args.error_rate:.0%}, cache {args.cache}")
+    print(f"{'route':<28}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'errors':>8}  upstream calls")
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        wait_until_ready(base_url + '/')
+        client = Client(base_url)
+        for scenario in args.routes.split(','):
+            before = dict(fake.calls)
+            elapsed, latencies, errors = run_scenario(
+                client, scenario, args.requests, args.concurrency, args.distinct
+            )
+            calls = {endpoint: count - before.get(endpoint, 0)
+                     for endpoint, count in fake.calls.items() if count != before.get(endpoint, 0)}
+            print(f"{scenario:<28}{len(latencies) / elapsed:>9.1f}"
+                  f"{percentile(latencies, 50) * 1000:>9.0f}"
+                  f"{percentile(latencies, 95) * 1000:>9.0f}"
+                  f"{percentile(latencies, 99) * 1000:>9.0f}"
+                  f"{errors:>8}  "
+                  + ', '.join(f"{endpoint}={count}" for endpoint, count in sorted(calls.items())))
+    finally:
+        app.terminate()
+        app.wait()
+        upstream.shutdown()
+        shutil.rmtree(state, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
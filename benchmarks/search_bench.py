@@ -0,0 +1,58 @@
+"""
+Local recipe search benchmark
+Indexes synthetic corpora of increasing size and times typical searches
+(plain, prefix-as-you-type, diet and intolerance filtered) against the
+in-memory index, reporting build time and per-query latency percentiles.
+
+    python -m benchmarks.search_bench --sizes 10000,100000
+"""
+import argparse
+import time
+
+from benchmarks.fake_upstream import make_recipe
+from benchmarks.load_test import percentile
+from services.recipe_store import RecipeIndex
+
+# (query, diet, intolerances)
+QUERIES = [
+    ('pasta', '', ''),
+    ('spicy curry', '', ''),
+    ('chicken', 'gluten-free', ''),
+    ('italian soup', 'vegetarian', ''),
+    ('cre', '', ''),
+    ('grilled tom', '', ''),
+    ('salad', 'vegan', 'peanut,tree-nut'),
+    ('garlic rice', '', 'dairy,egg'),
+    ('thai noodles', 'pescetarian', 'soy'),
+    ('mexican', '', 'gluten'),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000', help='corpus sizes to index')
+    parser.add_argument('--rounds', type=int, default=20, help='times each query is run')
+    args = parser.parse_args()
+
+    print(f"{'recipes':>10}{'build s':>10}{'query':>24}{'matches':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for size in (int(size) for size in args.sizes.split(',')):
+        index = RecipeIndex()
+        started = time.perf_counter()
+        for recipe_id in range(1, size + 1):
+            index.add(make_recipe(recipe_id))
+        build = time.perf_counter() - started
+
+        for query, diet, intolerances in QUERIES:
+            latencies = []
+            for _ in range(args.rounds):
+                started = time.perf_counter()
+                total, _ = index.search(query, diet, intolerances)
+                latencies.append(time.perf_counter() - started)
+            label = '+'.join(part for part in (query, diet, intolerances) if part)
+            print(f"{size:>10}{build:>10.1f}{label[:23]:>24}{total:>10}"
+                  f"{percentile(latencies, 50) * 1000:>10.2f}"
+                  f"{percentile(latencies, 99) * 1000:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""
+Similar-recipe recommender benchmark
+Indexes synthetic corpora of increasing size and reports the similarity
+index's full build time, the time to absorb 1% more recipes incrementally,
+and top-k query latency percentiles.
+
+    python -m benchmarks.similar_bench --sizes 10000,100000
+
+Nutrition is stored in a temporary directory.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.fake_upstream import make_recipe
+from benchmarks.load_test import percentile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', default='10000,100000', help='corpus sizes to index')
+    parser.add_argument('--queries', type=int, default=200, help='recipes looked up per size')
+    parser.add_argument('--number', type=int, default=3, help='neighbours per lookup')
+    args = parser.parse_args()
+
+    state = tempfile.mkdtemp(prefix='similar-bench-')
+    os.environ['NUTRITION_STORE_PATH'] = os.path.join(state, 'nutrition.sqlite3')
+    from services.nutrition_store import get_nutrition_store
+    from services.recipe_store import RecipeIndex
+    from services.recommender import SimilarityIndex
+
+    nutrition = get_nutrition_store()
+    print(f"{'recipes':>10}{'build s':>10}{'+1% ms':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for size in (int(size) for size in args.sizes.split(',')):
+        growth = max(size // 100, 1)
+        recipes = [make_recipe(recipe_id) for recipe_id in range(1, size + growth + 1)]
+        nutrition.add_recipes(recipes)
+        index = RecipeIndex()
+        for recipe in recipes[:size]:
+            index.add(recipe)
+
+        similarity = SimilarityIndex()
+        started = time.perf_counter()
+        similarity.update(index, nutrition)
+        build = time.perf_counter() - started
+
+        for recipe in recipes[size:]:
+            index.add(recipe)
+        started = time.perf_counter()
+        similarity.update(index, nutrition)
+        incremental = time.perf_counter() - started
+
+        rng = random.Random(size)
+        latencies = []
+        for _ in range(args.queries):
+            recipe_id = rng.randint(1, size + growth)
+            started = time.perf_counter()
+            similarity.similar(recipe_id, args.number)
+            latencies.append(time.perf_counter() - started)
+        print(f"{size:>10}{build:>10.2f}{incremental * 1000:>10.1f}"
+              f"{percentile(latencies, 50) * 1000:>10.2f}"
+              f"{percentile(latencies, 99) * 1000:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -4,7 +4,168 @@ from dotenv import load_dotenv
 load_dotenv()
 
 class Config:
+    LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+    # Per-route and per-upstream timings and counters served at /metrics
+    METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() == "true"
     SECRET_KEY = os.environ.get("SESSION_SECRET", "dev-secret-key")
     SPOONACULAR_API_KEY = os.environ.get("SPOONACULAR_API_KEY", "")
     OPENROUTER_API_KEY = os.environ.get("OPENROUTER_API_KEY", "")
-    OPENROUTER_API_URL = "https://openrouter.ai/api/v1/chat/completions"
+    OPENROUTER_API_URL = os.environ.get("OPENROUTER_API_URL", "https://openrouter.ai/api/v1/chat/completions")
+    # Alternative OpenAI-compatible endpoint, e.g. the benchmark stand-in
+    OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL") or None
+    # Relative SQLite paths live in Flask's instance folder
+    SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL", "sqlite:///cooking_assistant.db")
+
+    # Where session data lives: 'sqlite' or 'redis' keep it server-side and
+    # send only an ID cookie; 'cookie' is Flask's signed-cookie default
+    SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "sqlite")
+    SESSION_DB_PATH = os.environ.get("SESSION_DB_PATH", os.path.join("instance", "sessions.sqlite3"))
+    REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+    # Most recently viewed recipes remembered per session
+    VIEWED_RECIPES_LIMIT = int(os.environ.get("VIEWED_RECIPES_LIMIT", "20"))
+
+    # Response cache for Spoonacular calls: 'memory', 'sqlite' or 'none'.
+    # The sqlite backend is shared by every gunicorn worker on the host.
+    CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory")
+    CACHE_PATH = os.environ.get("CACHE_PATH", os.path.join("instance", "cache.sqlite3"))
+    CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "2048"))
+    CACHE_SHARED_MAX_ENTRIES = int(os.environ.get("CACHE_SHARED_MAX_ENTRIES", "50000"))
+    CACHE_DEFAULT_TTL = 60 * 60
+    # Seconds each Spoonacular endpoint's responses stay fresh
+    CACHE_TTLS = {
+        "search": 60 * 60,
+        "information": 7 * 24 * 60 * 60,
+        "similar": 24 * 60 * 60,
+        "videos": 24 * 60 * 60,
+        "nutrition": 7 * 24 * 60 * 60,
+        "llm": 24 * 60 * 60,
+        "chat_summary": 24 * 60 * 60,
+        "recipe_analysis": 30 * 24 * 60 * 60,
+    }
+    # Seconds expired responses are kept around to serve stale when needed
+    CACHE_STALE_GRACE = int(os.environ.get("CACHE_STALE_GRACE", str(24 * 60 * 60)))
+    # Seconds failed Spoonacular calls are remembered so they are not
+    # retried on every request; empty results are kept at most 'empty'
+    NEGATIVE_CACHE_TTLS = {
+        "error": int(os.environ.get("NEGATIVE_CACHE_TTL", "30")),
+        "not_found": 10 * 60,
+        "empty": 60 * 60,
+    }
+    # Stale entries are refreshed on this many background threads
+    REVALIDATION_WORKERS = int(os.environ.get("REVALIDATION_WORKERS", "4"))
+    # An upstream endpoint failing this many times in a row is not called
+    # again for CIRCUIT_RESET_TIMEOUT seconds
+    CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_RESET_TIMEOUT = float(os.environ.get("CIRCUIT_RESET_TIMEOUT", "30"))
+    # Answer repeated chat prompts from a cache of their own, on the same
+    # backend as the response cache but sized separately so long completions
+    # never evict Spoonacular responses
+    LLM_CACHE_ENABLED = os.environ.get("LLM_CACHE_ENABLED", "true").lower() == "true"
+    LLM_CACHE_PATH = os.environ.get("LLM_CACHE_PATH", os.path.join("instance", "llm_cache.sqlite3"))
+    LLM_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_MAX_ENTRIES", "512"))
+    LLM_CACHE_SHARED_MAX_ENTRIES = int(os.environ.get("LLM_CACHE_SHARED_MAX_ENTRIES", "10000"))
+
+    # Chat history sent to the model: recent turns within this many tokens,
+    # older turns folded into a running summary this many messages at a time
+    CHAT_HISTORY_TOKEN_BUDGET = int(os.environ.get("CHAT_HISTORY_TOKEN_BUDGET", "1500"))
+    CHAT_SUMMARY_STEP = int(os.environ.get("CHAT_SUMMARY_STEP", "4"))
+
+    # Local recipe corpus: every recipe fetched from Spoonacular is kept here
+    # and searches are answered locally when it has at least
+    # LOCAL_SEARCH_MIN_RESULTS matches. Workers pick up each other's additions
+    # every RECIPE_STORE_SYNC_INTERVAL seconds.
+    RECIPE_STORE_ENABLED = os.environ.get("RECIPE_STORE_ENABLED", "true").lower() == "true"
+    RECIPE_STORE_PATH = os.environ.get("RECIPE_STORE_PATH", os.path.join("instance", "recipes.sqlite3"))
+    LOCAL_SEARCH_MIN_RESULTS = int(os.environ.get("LOCAL_SEARCH_MIN_RESULTS", "12"))
+    RECIPE_STORE_SYNC_INTERVAL = float(os.environ.get("RECIPE_STORE_SYNC_INTERVAL", "30"))
+
+    # Per-recipe nutrient vectors extracted from /information responses,
+    # serving /api/nutrition and meal-plan totals without upstream calls
+    NUTRITION_STORE_ENABLED = os.environ.get("NUTRITION_STORE_ENABLED", "true").lower() == "true"
+    NUTRITION_STORE_PATH = os.environ.get("NUTRITION_STORE_PATH", os.path.join("instance", "nutrition.sqlite3"))
+
+    # Build meal plans from the local corpus when at least MEAL_PLAN_MIN_POOL
+    # recipes fit the diet and exclusions, and every day comes within
+    # MEAL_PLAN_CALORIE_TOLERANCE of the calorie target; otherwise ask upstream
+    LOCAL_MEAL_PLANS_ENABLED = os.environ.get("LOCAL_MEAL_PLANS_ENABLED", "true").lower() == "true"
+    MEAL_PLAN_MIN_POOL = int(os.environ.get("MEAL_PLAN_MIN_POOL", "30"))
+    MEAL_PLAN_CALORIE_TOLERANCE = float(os.environ.get("MEAL_PLAN_CALORIE_TOLERANCE", "0.1"))
+
+    # Recommend similar recipes from the local corpus (see
+    # services.recommender) once it holds LOCAL_SIMILAR_MIN_CORPUS recipes;
+    # SIMILAR_RECIPES is how many a recipe page shows
+    LOCAL_SIMILAR_RECIPES_ENABLED = os.environ.get("LOCAL_SIMILAR_RECIPES_ENABLED", "true").lower() == "true"
+    LOCAL_SIMILAR_MIN_CORPUS = int(os.environ.get("LOCAL_SIMILAR_MIN_CORPUS", "100"))
+    SIMILAR_RECIPES = int(os.environ.get("SIMILAR_RECIPES", "3"))
+
+    # Spoonacular daily quota: below QUOTA_OPTIONAL_RESERVE points left,
+    # optional lookups (similar recipes, videos) are skipped; below
+    # QUOTA_STALE_RESERVE, expired cached responses are served rather than
+    # calling upstream. Shared by every worker through QUOTA_DB_PATH.
+    QUOTA_DB_PATH = os.environ.get("QUOTA_DB_PATH", os.path.join("instance", "quota.sqlite3"))
+    QUOTA_OPTIONAL_RESERVE = float(os.environ.get("QUOTA_OPTIONAL_RESERVE", "30"))
+    QUOTA_STALE_RESERVE = float(os.environ.get("QUOTA_STALE_RESERVE", "10"))
+    QUOTA_REFRESH_INTERVAL = float(os.environ.get("QUOTA_REFRESH_INTERVAL", "1"))
+
+    # Rendered page sections (recipe body, similar recipes, search results)
+    # kept per worker and reused while their underlying data is unchanged
+    FRAGMENT_CACHE_ENABLED = os.environ.get("FRAGMENT_CACHE_ENABLED", "true").lower() == "true"
+    FRAGMENT_CACHE_MAX_ENTRIES = int(os.environ.get("FRAGMENT_CACHE_MAX_ENTRIES", "1024"))
+    FRAGMENT_CACHE_TTL = int(os.environ.get("FRAGMENT_CACHE_TTL", str(24 * 60 * 60)))
+
+    # Compress text responses of at least COMPRESSION_MIN_SIZE bytes (brotli
+    # when the brotli package is installed, gzip otherwise). Fingerprinted
+    # static asset URLs are cached by browsers for STATIC_MAX_AGE seconds.
+    COMPRESSION_ENABLED = os.environ.get("COMPRESSION_ENABLED", "true").lower() == "true"
+    COMPRESSION_MIN_SIZE = int(os.environ.get("COMPRESSION_MIN_SIZE", "500"))
+    STATIC_MAX_AGE = int(os.environ.get("STATIC_MAX_AGE", str(365 * 24 * 60 * 60)))
+
+    # Serve recipe images from /img/<recipe_id>/<size>: fetched once from
+    # RECIPE_IMAGE_SOURCE_URL, resized, and kept in IMAGE_CACHE_DIR up to
+    # IMAGE_CACHE_MAX_BYTES, least recently used images evicted first. Needs
+    # Pillow; without it pages link the image host's sized images instead
+    IMAGE_PROXY_ENABLED = os.environ.get("IMAGE_PROXY_ENABLED", "true").lower() == "true"
+    RECIPE_IMAGE_SOURCE_URL = os.environ.get("RECIPE_IMAGE_SOURCE_URL", "https://img.spoonacular.com/recipes")
+    IMAGE_CACHE_DIR = os.environ.get("IMAGE_CACHE_DIR", os.path.join("instance", "images"))
+    IMAGE_CACHE_MAX_BYTES = int(os.environ.get("IMAGE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+    # Render /recipe/<id> from /information alone and let the page load
+    # similar recipes and videos afterwards, instead of waiting for them
+    RECIPE_PROGRESSIVE_RENDERING = os.environ.get("RECIPE_PROGRESSIVE_RENDERING", "true").lower() == "true"
+
+    # Seconds get_recipe_info waits for optional enrichments (similar
+    # recipes, videos) before rendering without them
+    RECIPE_ENRICHMENT_DEADLINE = float(os.environ.get("RECIPE_ENRICHMENT_DEADLINE", "2.5"))
+    SPOONACULAR_ENRICHMENT_WORKERS = int(os.environ.get("SPOONACULAR_ENRICHMENT_WORKERS", "16"))
+
+    # Meal plan hydration: recipes per informationBulk call and parallel calls
+    SPOONACULAR_BULK_CHUNK_SIZE = int(os.environ.get("SPOONACULAR_BULK_CHUNK_SIZE", "8"))
+    SPOONACULAR_HYDRATION_WORKERS = int(os.environ.get("SPOONACULAR_HYDRATION_WORKERS", "4"))
+
+    # Batch recipe analysis: recipe texts per request, OpenAI calls in
+    # flight per batch, and attempts per recipe while rate limited. Results
+    # are kept in their own SQLite cache, keyed by content hash.
+    OPENAI_ANALYSIS_MAX_BATCH = int(os.environ.get("OPENAI_ANALYSIS_MAX_BATCH", "500"))
+    OPENAI_ANALYSIS_WORKERS = int(os.environ.get("OPENAI_ANALYSIS_WORKERS", "8"))
+    OPENAI_ANALYSIS_MAX_ATTEMPTS = int(os.environ.get("OPENAI_ANALYSIS_MAX_ATTEMPTS", "4"))
+    OPENAI_ANALYSIS_CACHE_PATH = os.environ.get("OPENAI_ANALYSIS_CACHE_PATH", os.path.join("instance", "analysis.sqlite3"))
+    OPENAI_ANALYSIS_CACHE_MAX_ENTRIES = int(os.environ.get("OPENAI_ANALYSIS_CACHE_MAX_ENTRIES", "100000"))
+
+    # Upstream HTTP clients: keep-alive pool size, (connect, read) timeouts
+    # in seconds, and retries with exponential backoff on 429/5xx
+    HTTP_DEFAULT_POOL_SIZE = 10
+    HTTP_POOL_SIZES = {
+        "spoonacular": int(os.environ.get("SPOONACULAR_POOL_SIZE", "32")),
+        "openrouter": int(os.environ.get("OPENROUTER_POOL_SIZE", "16")),
+        "openai": int(os.environ.get("OPENAI_POOL_SIZE", "16")),
+        "images": int(os.environ.get("IMAGE_POOL_SIZE", "16")),
+    }
+    HTTP_DEFAULT_TIMEOUT = (3.05, 30)
+    HTTP_TIMEOUTS = {
+        "spoonacular": (3.05, float(os.environ.get("SPOONACULAR_TIMEOUT", "10"))),
+        "openrouter": (3.05, float(os.environ.get("OPENROUTER_TIMEOUT", "60"))),
+        "openai": (3.05, float(os.environ.get("OPENAI_TIMEOUT", "60"))),
+        "images": (3.05, float(os.environ.get("IMAGE_TIMEOUT", "10"))),
+    }
+    HTTP_MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", "2"))
+    HTTP_BACKOFF_FACTOR = float(os.environ.get("HTTP_BACKOFF_FACTOR", "0.5"))
@@ -0,0 +1,65 @@
+"""
+Rendered template fragment cache
+Page sections that are the same for every visitor (the recipe body, the
+similar-recipes strip, the search result grid) are rendered once and reused.
+Each fragment is keyed by its template, an identity (recipe ID, normalized
+search) and a digest of the data it was rendered from, so a fragment is
+never served after that data has changed; outdated versions simply age out
+of the LRU.
+"""
+import hashlib
+import json
+from flask import render_template
+from markupsafe import Markup
+from config import Config
+from services.cache import MISSING, MemoryCache, make_key
+
+_fragments = MemoryCache(Config.FRAGMENT_CACHE_MAX_ENTRIES)
+
+
+def data_digest(data):
+    """
+    Stable digest of the JSON-serializable data a fragment is rendered from
+    """
+    encoded = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()
+
+
+def search_identity(query, diet='', intolerances=''):
+    """
+    Normalized search parameters, so trivially different queries share fragments
+    """
+    normalize = lambda text: ' '.join(str(text or '').lower().split())
+    return [normalize(query), normalize(diet), ','.join(sorted(normalize(intolerances).replace(' ', '').split(',')))]
+
+
+def cached_fragment(template, identity, data, **context):
+    """
+    Render template with context, reusing the HTML last rendered for the
+    same identity and data
+
+    Templates rendered this way must depend only on their context, never
+    on the request or session.
+    """
+    if not Config.FRAGMENT_CACHE_ENABLED:
+        return Markup(render_template(template, **context))
+
+    key = make_key('fragment', template, identity, data_digest(data))
+    html = _fragments.get(key)
+    if html is MISSING:
+        html = render_template(template, **context)
+        _fragments.set(key, html, Config.FRAGMENT_CACHE_TTL)
+    return Markup(html)
+
+
+def fragment_cache_stats():
+    counts = _fragments.stats.snapshot()
+    counts['entries'] = len(_fragments)
+    return counts
+
+
+def init_app(app):
+    """
+    Make cached_fragment() available to every template
+    """
+    app.jinja_env.globals['cached_fragment'] = cached_fragment
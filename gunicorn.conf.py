@@ -0,0 +1,31 @@
+"""
+Gunicorn settings
+WORKER_MODE picks how each worker process serves concurrent requests:
+  sync    - one request at a time per worker (gunicorn's default)
+  gthread - a pool of THREADS OS threads per worker
+  gevent  - cooperative green threads. Every upstream call in services/
+            (requests, the OpenAI httpx client, the enrichment thread
+            pools) yields while it waits on the network, so one worker
+            holds up to GEVENT_CONNECTIONS in-flight requests. Each request
+            runs on its own greenlet, so the SQLite connections it opens
+            are closed when it finishes (services/sqlite_connections.py).
+Do not combine gevent with preload_app: the app must be imported after
+gevent has patched the standard library.
+"""
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_CONCURRENCY", "1"))
+worker_mode = os.environ.get("WORKER_MODE", "sync")
+
+if worker_mode == "gevent":
+    worker_class = "gevent"
+    worker_connections = int(os.environ.get("GEVENT_CONNECTIONS", "500"))
+elif worker_mode == "gthread":
+    worker_class = "gthread"
+    threads = int(os.environ.get("THREADS", "8"))
+else:
+    worker_class = "sync"
+
+# Streamed chat responses legitimately keep a request open for a while
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
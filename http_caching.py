@@ -0,0 +1,182 @@
+"""
+HTTP caching and compression for Flask responses
+Adds ETags and per-route Cache-Control to responses, answers conditional
+requests with 304 Not Modified, compresses text responses (brotli when the
+brotli package is installed, gzip otherwise) and fingerprints static asset
+URLs so browsers can keep them for a year.
+"""
+import gzip
+import hashlib
+import os
+import threading
+from flask import request
+from werkzeug.security import safe_join
+from config import Config
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Cache-Control for routes that do not set their own. Pages and anything
+# per-visitor are revalidated against their ETag on every use.
+DEFAULT_POLICY = 'private, no-cache'
+CACHE_POLICIES = {
+    'api_meal_plan': 'no-store',
+    'api_cache_stats': 'no-store',
+    'metrics': 'no-store',
+    'api_nutrition_search': 'public, max-age=300',
+    'api_recipes_by_ingredients': 'public, max-age=300',
+}
+
+COMPRESSIBLE_TYPES = frozenset([
+    'application/json', 'application/javascript', 'text/javascript', 'image/svg+xml', 'application/xml',
+])
+
+# Dynamic responses are compressed per request, static files once
+DYNAMIC_LEVELS = {'br': 4, 'gzip': 6}
+STATIC_LEVELS = {'br': 11, 'gzip': 9}
+
+_static_versions = {}
+_static_bodies = {}
+_static_lock = threading.Lock()
+
+
+def _compressible(response):
+    mimetype = response.mimetype or ''
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES
+
+
+def _compress(data, encoding, levels):
+    if encoding == 'br':
+        return brotli.compress(data, quality=levels['br'])
+    return gzip.compress(data, compresslevel=levels['gzip'], mtime=0)
+
+
+def _choose_encoding():
+    accepted = request.accept_encodings
+    if brotli is not None and accepted['br']:
+        return 'br'
+    if accepted['gzip']:
+        return 'gzip'
+    return None
+
+
+def _static_file(static_folder, filename):
+    """
+    Returns (path, mtime) of a static file, or (None, None) if it is missing
+    """
+    path = safe_join(static_folder, filename)
+    if path is None:
+        return None, None
+    try:
+        return path, os.stat(path).st_mtime
+    except OSError:
+        return None, None
+
+
+def static_version(static_folder, filename):
+    """
+    Short content hash of a static file, recomputed when its mtime changes
+    """
+    path, mtime = _static_file(static_folder, filename)
+    if path is None:
+        return None
+    cached = _static_versions.get(path)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'rb') as f:
+        version = hashlib.sha1(f.read()).hexdigest()[:12]
+    with _static_lock:
+        _static_versions[path] = (mtime, version)
+    return version
+
+
+def _compressed_static(static_folder, filename, encoding):
+    """
+    Compressed bytes of a static file, memoized per (file, mtime, encoding)
+    """
+    path, mtime = _static_file(static_folder, filename)
+    if path is None:
+        return None
+    key = (path, encoding)
+    cached = _static_bodies.get(key)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'rb') as f:
+        body = _compress(f.read(), encoding, STATIC_LEVELS)
+    with _static_lock:
+        _static_bodies[key] = (mtime, body)
+    return body
+
+
+def init_app(app):
+    """
+    Register the caching and compression hooks on a Flask app
+
+    Call after any other after_request hooks, so that those see the final
+    (compressed) response.
+    """
+
+    @app.url_defaults
+    def fingerprint_static_urls(endpoint, values):
+        if endpoint == 'static' and 'filename' in values and 'v' not in values:
+            version = static_version(app.static_folder, values['filename'])
+            if version:
+                values['v'] = version
+
+    @app.after_request
+    def cache_and_compress(response):
+        if request.endpoint == 'static':
+            return _static_response(app, response)
+
+        if request.method in ('GET', 'HEAD') and response.status_code == 200 and not response.is_streamed:
+            if 'Cache-Control' not in response.headers:
+                response.headers['Cache-Control'] = CACHE_POLICIES.get(request.endpoint, DEFAULT_POLICY)
+            if not response.cache_control.no_store:
+                # Weak: the compressed and identity bodies share one validator
+                response.add_etag(weak=True)
+                response.make_conditional(request)
+
+        if (Config.COMPRESSION_ENABLED and response.status_code == 200 and not response.is_streamed
+                and not response.direct_passthrough and 'Content-Encoding' not in response.headers
+                and _compressible(response)):
+            response.vary.add('Accept-Encoding')
+            data = response.get_data()
+            encoding = _choose_encoding()
+            if encoding and len(data) >= Config.COMPRESSION_MIN_SIZE:
+                response.set_data(_compress(data, encoding, DYNAMIC_LEVELS))
+                response.headers['Content-Encoding'] = encoding
+        return response
+
+
+def _static_response(app, response):
+    """
+    Long-lived caching for fingerprinted URLs and precompressed bodies
+
+    send_file has already set the ETag and answered conditional requests.
+    """
+    filename = request.view_args.get('filename')
+    version = request.args.get('v')
+    if version and version == static_version(app.static_folder, filename):
+        response.headers['Cache-Control'] = f'public, max-age={Config.STATIC_MAX_AGE}, immutable'
+
+    if not Config.COMPRESSION_ENABLED or response.status_code != 200 or not _compressible(response):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = _choose_encoding()
+    if not encoding or (response.content_length or 0) < Config.COMPRESSION_MIN_SIZE:
+        return response
+
+    body = _compressed_static(app.static_folder, filename, encoding)
+    if body is None:
+        return response
+    if hasattr(response.response, 'close'):
+        response.response.close()
+    response.direct_passthrough = False
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    etag, _ = response.get_etag()
+    if etag:
+        response.set_etag(etag, weak=True)
+    return response
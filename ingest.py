@@ -0,0 +1,289 @@
+"""
+Bulk recipe ingestion
+Warms the response cache and the local recipe corpus before traffic arrives,
+and snapshots/restores the corpus as newline-delimited JSON (gzip-compressed
+when the file name ends in .gz). Input files are streamed, never loaded whole.
+
+    python ingest.py fetch --ids ids.txt --output corpus.jsonl.gz
+    python ingest.py fetch --queries queries.txt --rate 2 --budget 140
+    python ingest.py export corpus.jsonl.gz
+    python ingest.py import corpus.jsonl.gz --warm-cache
+"""
+import argparse
+import gzip
+import json
+import logging
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from services.cache import MISSING, get_cache, get_ttl
+from services.nutrition_store import remember_nutrition
+from services.recipe_store import get_recipe_store
+from services.spoonacular import _information_key, hydrate_recipes, search_recipes
+
+# Estimated Spoonacular points per call, used to stay within --budget
+POINTS_PER_BULK_CALL = 1.0
+POINTS_PER_EXTRA_BULK_RECIPE = 0.5
+POINTS_PER_SEARCH = 1.0
+POINTS_PER_SEARCH_RESULT = 0.06
+
+
+def open_jsonl(path, mode):
+    """
+    Open a JSONL file for text reading or writing; '-' is stdin/stdout
+    """
+    if path == '-':
+        return sys.stdin if mode == 'r' else sys.stdout
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def read_lines(path):
+    """
+    Yield the non-blank, non-comment lines of a file, stripped
+    """
+    with open_jsonl(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line
+
+
+def batched(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class QuotaExceeded(Exception):
+    pass
+
+
+class RateLimiter:
+    """
+    Spaces upstream calls at most `rate` per second and stops once the
+    estimated points spent would exceed `budget` (None for no limit)
+    """
+
+    def __init__(self, rate, budget=None):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.budget = budget
+        self.spent = 0.0
+        self._next_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, calls, points):
+        with self._lock:
+            if self.budget is not None and self.spent + points > self.budget:
+                raise QuotaExceeded(f"Point budget of {self.budget} reached")
+            self.spent += points
+            now = time.monotonic()
+            wait = max(0.0, self._next_at - now)
+            self._next_at = max(now, self._next_at) + self.interval * calls
+        if wait:
+            time.sleep(wait)
+
+
+class JsonlWriter:
+    """
+    Thread-safe writer of one JSON object per line
+    """
+
+    def __init__(self, path):
+        self.file = open_jsonl(path, 'w') if path else None
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        if self.file is None:
+            return
+        line = json.dumps(record, separators=(',', ':'))
+        with self._lock:
+            self.file.write(line + '\n')
+            self.count += 1
+
+    def close(self):
+        if self.file is not None and self.file is not sys.stdout:
+            self.file.close()
+
+
+def _uncached(recipe_ids):
+    """
+    The recipe_ids without a fresh /information response in the cache
+    """
+    cache = get_cache()
+    return [
+        recipe_id for recipe_id in dict.fromkeys(recipe_ids)
+        if cache.get_with_expiry(_information_key(recipe_id))[0] is MISSING
+    ]
+
+
+def _fetch_ids(recipe_ids, limiter, writer):
+    # Cached recipes cost nothing, so only the rest are charged to the budget
+    uncached = _uncached(recipe_ids)
+    if uncached:
+        chunks = -(-len(uncached) // Config.SPOONACULAR_BULK_CHUNK_SIZE)
+        limiter.acquire(chunks, chunks * POINTS_PER_BULK_CALL + (len(uncached) - chunks) * POINTS_PER_EXTRA_BULK_RECIPE)
+    recipes = hydrate_recipes(recipe_ids)
+    for recipe in recipes.values():
+        writer.write(recipe)
+    return len(recipes), len(set(recipe_ids)) - len(recipes)
+
+
+def _fetch_query(query, limiter, writer, number):
+    limiter.acquire(1, POINTS_PER_SEARCH + number * POINTS_PER_SEARCH_RESULT)
+    results = search_recipes(query, number=number, use_local=False)
+    for recipe in results:
+        writer.write(recipe)
+    return len(results), 0
+
+
+def fetch(args):
+    """
+    Fetch recipes by ID (informationBulk) or by search query with bounded
+    concurrency; every recipe lands in the cache and recipe corpus
+    """
+    if Config.CACHE_BACKEND != 'sqlite':
+        logging.warning(
+            f"CACHE_BACKEND is '{Config.CACHE_BACKEND}': fetched responses are only kept in the "
+            "recipe corpus, not the response cache, once this process exits"
+        )
+    limiter = RateLimiter(args.rate, args.budget)
+    writer = JsonlWriter(args.output)
+
+    if args.ids:
+        ids = (int(line) for line in read_lines(args.ids) if line.isdigit())
+        units = batched(ids, args.batch_size)
+        work = lambda batch: _fetch_ids(batch, limiter, writer)
+    else:
+        units = read_lines(args.queries)
+        work = lambda query: _fetch_query(query, limiter, writer, args.number)
+
+    fetched = failed = 0
+    # Cap in-flight work so a large input file is never queued all at once
+    slots = threading.BoundedSemaphore(args.concurrency * 2)
+    stop = threading.Event()
+    lock = threading.Lock()
+
+    def run(unit):
+        nonlocal fetched, failed
+        try:
+            if stop.is_set():
+                return
+            ok, missing = work(unit)
+            with lock:
+                fetched += ok
+                failed += missing
+        except QuotaExceeded as e:
+            if not stop.is_set():
+                logging.warning(f"{e}; stopping")
+            stop.set()
+        except Exception as e:
+            logging.error(f"Error fetching {unit}: {e}")
+            with lock:
+                failed += len(unit) if isinstance(unit, list) else 1
+        finally:
+            slots.release()
+
+    started = time.monotonic()
+    try:
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            for unit in units:
+                if stop.is_set():
+                    break
+                slots.acquire()
+                executor.submit(run, unit)
+    finally:
+        writer.close()
+
+    logging.info(
+        f"Fetched {fetched} recipes ({failed} failed) in {time.monotonic() - started:.1f}s, "
+        f"~{limiter.spent:.1f} points; wrote {writer.count} records"
+    )
+
+
+def export(args):
+    """
+    Write every recipe in the local corpus to a JSONL snapshot
+    """
+    store = get_recipe_store()
+    if store is None:
+        sys.exit("The recipe store is disabled (RECIPE_STORE_ENABLED=false)")
+
+    writer = JsonlWriter(args.path)
+    try:
+        for recipe in store.iter_recipes():
+            writer.write(recipe)
+    finally:
+        writer.close()
+    logging.info(f"Exported {writer.count} recipes to {args.path}")
+
+
+def restore(args):
+    """
+    Load a JSONL snapshot into the local corpus and nutrition store,
+    optionally also seeding the /information response cache with the
+    recipes that carry full details
+    """
+    store = get_recipe_store()
+    if store is None:
+        sys.exit("The recipe store is disabled (RECIPE_STORE_ENABLED=false)")
+    if args.warm_cache and Config.CACHE_BACKEND != 'sqlite':
+        sys.exit(f"--warm-cache needs CACHE_BACKEND=sqlite; the '{Config.CACHE_BACKEND}' cache does not outlive this process")
+
+    cache = get_cache()
+    ttl = get_ttl('information')
+    count = 0
+    for batch in batched((json.loads(line) for line in read_lines(args.path)), args.batch_size):
+        store.add_recipes(batch)
+        remember_nutrition(batch)
+        if args.warm_cache:
+            for recipe in batch:
+                if recipe.get('extendedIngredients') and recipe.get('nutrition'):
+                    cache.set(_information_key(recipe['id']), recipe, ttl)
+        count += len(batch)
+    logging.info(f"Imported {count} recipes from {args.path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    fetch_parser = commands.add_parser('fetch', help='fetch recipes from Spoonacular')
+    source = fetch_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--ids', help='file with one recipe ID per line')
+    source.add_argument('--queries', help='file with one search query per line')
+    fetch_parser.add_argument('--output', help='also write fetched recipes to this JSONL file')
+    fetch_parser.add_argument('--concurrency', type=int, default=4)
+    fetch_parser.add_argument('--batch-size', type=int, default=Config.SPOONACULAR_BULK_CHUNK_SIZE * 4,
+                              help='recipe IDs per hydration batch')
+    fetch_parser.add_argument('--number', type=int, default=100, help='results per search query')
+    fetch_parser.add_argument('--rate', type=float, default=1.0, help='upstream calls per second')
+    fetch_parser.add_argument('--budget', type=float, help='stop after roughly this many API points')
+    fetch_parser.set_defaults(handler=fetch)
+
+    export_parser = commands.add_parser('export', help='snapshot the recipe corpus to JSONL')
+    export_parser.add_argument('path')
+    export_parser.set_defaults(handler=export)
+
+    import_parser = commands.add_parser('import', help='restore the recipe corpus from JSONL')
+    import_parser.add_argument('path')
+    import_parser.add_argument('--batch-size', type=int, default=500)
+    import_parser.add_argument('--warm-cache', action='store_true', help='also seed the /information cache (CACHE_BACKEND=sqlite only)')
+    import_parser.set_defaults(handler=restore)
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Database models for server-side state
+"""
+from datetime import datetime
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import DeclarativeBase
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+db = SQLAlchemy(model_class=Base)
+
+
+class RecipeIngredients(db.Model):
+    """
+    A recipe's ingredient breakdown, combined by (aisle, name, unit)
+    """
+    __tablename__ = 'recipe_ingredients'
+
+    recipe_id = db.Column(db.Integer, primary_key=True)
+    title = db.Column(db.String(255))
+    image = db.Column(db.String(512))
+    # List of {"ingredient_id", "name", "aisle", "unit", "amount"} dicts
+    ingredients = db.Column(db.JSON, nullable=False)
+    fetched_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class ShoppingList(db.Model):
+    __tablename__ = 'shopping_lists'
+
+    id = db.Column(db.String(32), primary_key=True)
+    # Session the list belongs to; the list is purged once it has expired
+    session_id = db.Column(db.String(64))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+
+class ShoppingListRecipe(db.Model):
+    """
+    A recipe that has been added to a shopping list
+    """
+    __tablename__ = 'shopping_list_recipes'
+
+    list_id = db.Column(db.String(32), db.ForeignKey('shopping_lists.id', ondelete='CASCADE'), primary_key=True)
+    recipe_id = db.Column(db.Integer, primary_key=True)
+    added_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+
+class ShoppingListItem(db.Model):
+    """
+    Running total for one ingredient on a shopping list
+
+    Kept up to date incrementally as recipes are added and removed, so
+    reading a list never needs to re-aggregate or call upstream.
+    """
+    __tablename__ = 'shopping_list_items'
+
+    list_id = db.Column(db.String(32), db.ForeignKey('shopping_lists.id', ondelete='CASCADE'), primary_key=True)
+    aisle = db.Column(db.String(128), primary_key=True)
+    name = db.Column(db.String(255), primary_key=True)
+    unit = db.Column(db.String(64), primary_key=True)
+    ingredient_id = db.Column(db.Integer)
+    amount = db.Column(db.Float, nullable=False, default=0.0)
+    # Number of recipes on the list that use this ingredient
+    recipe_count = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,377 @@
+"""
+Response cache for upstream API calls
+Provides an in-process LRU with per-entry TTLs and an optional SQLite backend
+that every worker process on the host can share. Expired entries are kept for
+Config.CACHE_STALE_GRACE seconds so get_stale() can still serve them when
+calling upstream is not an option.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from config import Config
+from services.sqlite_connections import thread_connection
+
+# Returned by get() on a miss so that None, [] and {} can be cached as values
+MISSING = object()
+
+
+class CacheStats:
+    """
+    Thread-safe hit/miss/eviction counters for a cache backend
+    """
+    FIELDS = ('hits', 'misses', 'sets', 'evictions', 'expirations')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+
+    def incr(self, field, amount=1):
+        with self._lock:
+            self._counts[field] += amount
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self._counts)
+        lookups = counts['hits'] + counts['misses']
+        counts['hit_ratio'] = counts['hits'] / lookups if lookups else 0.0
+        return counts
+
+
+class MemoryCache:
+    """
+    In-process LRU cache with a TTL on every entry
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.incr('misses')
+                return MISSING
+
+            value, expires_at = entry
+            now = time.time()
+            if expires_at <= now:
+                # Counted once, when the entry is dropped after its grace period
+                if expires_at + Config.CACHE_STALE_GRACE <= now:
+                    del self._entries[key]
+                    self.stats.incr('expirations')
+                self.stats.incr('misses')
+                return MISSING
+
+            self._entries.move_to_end(key)
+            self.stats.incr('hits')
+            return value
+
+    def get_with_expiry(self, key):
+        """
+        Like get(), but returns (value, expires_at) without touching the counters
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= time.time():
+                return MISSING, 0
+            return entry
+
+    def get_stale(self, key):
+        """
+        Returns (value, expires_at) even if expired, as long as it is within
+        the stale grace period; counters are not touched
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] + Config.CACHE_STALE_GRACE <= time.time():
+                return MISSING, 0
+            return entry
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            self.stats.incr('sets')
+
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.incr('evictions')
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    SQLite-backed cache shared by every worker process on the host
+
+    Values are stored as JSON. Entries are evicted least-recently-used first
+    once the table grows past max_entries.
+    """
+    # Only prune every N writes so the COUNT(*) stays off the hot path
+    PRUNE_INTERVAL = 64
+
+    def __init__(self, path, max_entries=50000):
+        self.path = path
+        self.max_entries = max_entries
+        self.stats = CacheStats()
+        self._local = threading.local()
+        self._writes = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS response_cache_accessed"
+            " ON response_cache (accessed_at)"
+        )
+        conn.commit()
+
+    def _connection(self):
+        return thread_connection(self._local, self.path)
+
+    def get(self, key):
+        value, _ = self._fetch(key)
+        if value is MISSING:
+            self.stats.incr('misses')
+        else:
+            self.stats.incr('hits')
+        return value
+
+    def get_with_expiry(self, key):
+        return self._fetch(key)
+
+    def get_stale(self, key):
+        return self._fetch(key, stale=True)
+
+    def _fetch(self, key, stale=False):
+        now = time.time()
+        try:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT value, expires_at FROM response_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return MISSING, 0
+
+            value, expires_at = row
+            if expires_at + Config.CACHE_STALE_GRACE <= now:
+                deleted = conn.execute("DELETE FROM response_cache WHERE key = ?", (key,)).rowcount
+                # Another reader (or worker) may have removed it already
+                if deleted:
+                    self.stats.incr('expirations')
+                return MISSING, 0
+            if expires_at <= now and not stale:
+                return MISSING, 0
+
+            conn.execute(
+                "UPDATE response_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            return json.loads(value), expires_at
+        except sqlite3.Error as e:
+            logging.error(f"Error reading from response cache: {e}")
+            return MISSING, 0
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        try:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO response_cache (key, value, expires_at, accessed_at)"
+                " VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now + ttl, now)
+            )
+            self.stats.incr('sets')
+
+            self._writes += 1
+            if self._writes % self.PRUNE_INTERVAL == 0:
+                self._prune(conn)
+        except sqlite3.Error as e:
+            logging.error(f"Error writing to response cache: {e}")
+
+    def _prune(self, conn):
+        conn.execute(
+            "DELETE FROM response_cache WHERE expires_at <= ?", (time.time() - Config.CACHE_STALE_GRACE,)
+        )
+        (count,) = conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            conn.execute(
+                "DELETE FROM response_cache WHERE key IN ("
+                " SELECT key FROM response_cache ORDER BY accessed_at LIMIT ?)",
+                (excess,)
+            )
+            self.stats.incr('evictions', excess)
+
+    def delete(self, key):
+        try:
+            self._connection().execute("DELETE FROM response_cache WHERE key = ?", (key,))
+        except sqlite3.Error as e:
+            logging.error(f"Error deleting from response cache: {e}")
+
+    def clear(self):
+        try:
+            self._connection().execute("DELETE FROM response_cache")
+        except sqlite3.Error as e:
+            logging.error(f"Error clearing response cache: {e}")
+
+
+class TieredCache:
+    """
+    Small per-process LRU in front of a shared backend
+
+    Hot keys are served from memory; misses fall through to the shared
+    backend so that a result fetched by one worker is reused by all of them.
+    """
+
+    def __init__(self, local, shared):
+        self.local = local
+        self.shared = shared
+        self.stats = CacheStats()
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not MISSING:
+            self.stats.incr('hits')
+            return value
+
+        value, expires_at = self.shared.get_with_expiry(key)
+        if value is MISSING:
+            self.stats.incr('misses')
+            return MISSING
+
+        remaining = expires_at - time.time()
+        if remaining > 0:
+            self.local.set(key, value, remaining)
+        self.stats.incr('hits')
+        return value
+
+    def get_with_expiry(self, key):
+        value, expires_at = self.local.get_with_expiry(key)
+        if value is MISSING:
+            value, expires_at = self.shared.get_with_expiry(key)
+        return value, expires_at
+
+    def get_stale(self, key):
+        value, expires_at = self.local.get_stale(key)
+        if value is MISSING:
+            value, expires_at = self.shared.get_stale(key)
+        return value, expires_at
+
+    def set(self, key, value, ttl):
+        self.local.set(key, value, ttl)
+        self.shared.set(key, value, ttl)
+        self.stats.incr('sets')
+
+    def delete(self, key):
+        self.local.delete(key)
+        self.shared.delete(key)
+
+    def clear(self):
+        self.local.clear()
+        self.shared.clear()
+
+
+class NullCache:
+    """
+    Cache backend that stores nothing, used when caching is disabled
+    """
+
+    def __init__(self):
+        self.stats = CacheStats()
+
+    def get(self, key):
+        self.stats.incr('misses')
+        return MISSING
+
+    def get_with_expiry(self, key):
+        return MISSING, 0
+
+    def get_stale(self, key):
+        return MISSING, 0
+
+    def set(self, key, value, ttl):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def clear(self):
+        pass
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def build_cache(backend, path=None, max_entries=None, shared_max_entries=None):
+    """
+    Build a cache for the given backend name: 'memory', 'sqlite' or 'none'
+    """
+    memory_entries = max_entries or Config.CACHE_MAX_ENTRIES
+
+    if backend == 'none':
+        return NullCache()
+    if backend == 'sqlite':
+        shared = SQLiteCache(path or Config.CACHE_PATH, max_entries=shared_max_entries or Config.CACHE_SHARED_MAX_ENTRIES)
+        return TieredCache(MemoryCache(memory_entries), shared)
+    if backend != 'memory':
+        logging.warning(f"Unknown cache backend '{backend}', falling back to memory")
+    return MemoryCache(memory_entries)
+
+
+def get_cache():
+    """
+    Returns the process-wide response cache configured by Config.CACHE_BACKEND
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = build_cache(Config.CACHE_BACKEND)
+    return _cache
+
+
+def make_key(namespace, *parts):
+    """
+    Build a stable cache key from a namespace and JSON-serializable parts
+    """
+    return f"{namespace}:" + json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+
+
+def get_ttl(namespace):
+    """
+    Returns the configured TTL in seconds for a cache namespace
+    """
+    return Config.CACHE_TTLS.get(namespace, Config.CACHE_DEFAULT_TTL)
+
+
+def cache_stats():
+    """
+    Returns the hit/miss/eviction counters of the process-wide cache
+    """
+    return get_cache().stats.snapshot()
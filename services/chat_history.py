@@ -0,0 +1,168 @@
+"""
+Token-budgeted chat history
+Keeps the most recent turns that fit Config.CHAT_HISTORY_TOKEN_BUDGET and
+folds everything older into a running summary, cached by conversation
+prefix so each turn is only ever summarized once
+"""
+import hashlib
+import logging
+import threading
+from config import Config
+from services.cache import MISSING, get_cache, get_ttl, make_key
+from services.llm_cache import estimate_tokens
+
+# Approximate per-message overhead of the chat format (role, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_SYSTEM_PROMPT = (
+    "You maintain a running summary of a conversation between a home cook and a cooking assistant. "
+    "Keep the facts the assistant needs to continue: dishes discussed, ingredients on hand, dietary "
+    "restrictions, preferences and open questions. Reply with the updated summary only, in under 150 words."
+)
+
+_encoding = None
+_encoding_loaded = False
+_encoding_lock = threading.Lock()
+
+
+def _get_encoding():
+    """
+    Returns a tiktoken encoding if tiktoken is installed and usable, else None
+    """
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        with _encoding_lock:
+            if not _encoding_loaded:
+                try:
+                    import tiktoken
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception:
+                    _encoding = None
+                _encoding_loaded = True
+    return _encoding
+
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text or ''))
+    return estimate_tokens(text)
+
+
+def message_tokens(message):
+    return count_tokens(message['content']) + MESSAGE_OVERHEAD_TOKENS
+
+
+def normalize_history(chat_history):
+    """
+    Convert chat history to role/content messages
+
+    Accepts both {"role", "content"} messages (what chat.js sends) and
+    {"user": ..., "assistant": ...} turn pairs; anything else is dropped.
+    """
+    messages = []
+    for entry in chat_history or []:
+        if not isinstance(entry, dict):
+            continue
+        if entry.get('role') in ('user', 'assistant') and entry.get('content'):
+            messages.append({"role": entry['role'], "content": str(entry['content'])})
+            continue
+        if entry.get('user'):
+            messages.append({"role": "user", "content": str(entry['user'])})
+        if entry.get('assistant'):
+            messages.append({"role": "assistant", "content": str(entry['assistant'])})
+    return messages
+
+
+def _prefix_keys(messages):
+    """
+    Cache keys for the summary of every prefix of messages (1..n)
+    """
+    keys = []
+    digest = hashlib.sha256()
+    for message in messages:
+        digest.update(f"{message['role']}\0{message['content']}\0".encode('utf-8'))
+        keys.append(make_key('chat_summary', digest.hexdigest()))
+    return keys
+
+
+def summary_request(previous_summary, messages):
+    """
+    Messages asking the model to fold new turns into the running summary
+    """
+    transcript = "\n".join(f"{message['role'].capitalize()}: {message['content']}" for message in messages)
+    content = ""
+    if previous_summary:
+        content += f"Summary so far:\n{previous_summary}\n\n"
+    content += f"New conversation turns:\n{transcript}"
+    return [
+        {"role": "system", "content": SUMMARY_SYSTEM_PROMPT},
+        {"role": "user", "content": content},
+    ]
+
+
+def summarize(messages, complete):
+    """
+    Running summary of messages, reusing the longest already-summarized prefix
+
+    complete(messages) makes a chat completion call and returns its text.
+    """
+    cache = get_cache()
+    keys = _prefix_keys(messages)
+
+    summary = cache.get(keys[-1])
+    if summary is not MISSING:
+        return summary
+
+    previous_summary, start = None, 0
+    for length in range(len(messages) - 1, 0, -1):
+        cached, _ = cache.get_with_expiry(keys[length - 1])
+        if cached is not MISSING:
+            previous_summary, start = cached, length
+            break
+
+    summary = complete(summary_request(previous_summary, messages[start:]))
+    cache.set(keys[-1], summary, get_ttl('chat_summary'))
+    return summary
+
+
+def prepare_history(chat_history, user_message, complete, budget=None):
+    """
+    Returns history messages to send with user_message within the token budget
+
+    The newest turns are kept verbatim; older ones are replaced by a single
+    system message carrying their summary. If summarizing fails the older
+    turns are simply dropped.
+    """
+    budget = Config.CHAT_HISTORY_TOKEN_BUDGET if budget is None else budget
+    messages = normalize_history(chat_history)
+
+    # chat.js appends the new message to its history before sending it
+    if messages and messages[-1]['role'] == 'user' and messages[-1]['content'] == user_message:
+        messages.pop()
+
+    used = 0
+    cut = len(messages)
+    while cut > 0:
+        tokens = message_tokens(messages[cut - 1])
+        if used + tokens > budget:
+            break
+        used += tokens
+        cut -= 1
+
+    # Fold whole batches of turns so the summary changes every few messages, not every turn
+    step = max(1, Config.CHAT_SUMMARY_STEP)
+    if cut % step:
+        cut = min(len(messages), cut + step - cut % step)
+
+    older, recent = messages[:cut], messages[cut:]
+    if not older:
+        return recent
+
+    try:
+        summary = summarize(older, complete)
+    except Exception as e:
+        logging.error(f"Error summarizing chat history: {e}")
+        return recent
+
+    return [{"role": "system", "content": f"Summary of the earlier conversation: {summary}"}] + recent
@@ -0,0 +1,176 @@
+"""
+Shared HTTP clients for upstream services
+Keeps one keep-alive connection pool per upstream and process, with
+configured timeouts and retry with backoff on 429/5xx responses. When
+metrics are enabled every call is timed and counted per endpoint.
+"""
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import Config
+from services.metrics import observe_upstream, observe_upstream_error
+from services.quota import endpoint_name
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_sessions = {}
+_openai_http_client = None
+_owner_pid = None
+_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    """
+    Drop clients inherited from a parent process (gunicorn --preload), whose
+    pooled sockets must not be shared with the child
+    """
+    global _openai_http_client, _owner_pid
+    if _owner_pid != os.getpid():
+        _sessions.clear()
+        _openai_http_client = None
+        _owner_pid = os.getpid()
+
+
+def _content_length(headers):
+    try:
+        return int(headers['Content-Length'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class InstrumentedAdapter(HTTPAdapter):
+    """
+    HTTPAdapter that records each call's latency, status and size
+    """
+
+    def __init__(self, upstream, **kwargs):
+        self.upstream = upstream
+        super().__init__(**kwargs)
+
+    def send(self, request, *args, **kwargs):
+        endpoint = endpoint_name(urlsplit(request.url).path)
+        started = time.perf_counter()
+        try:
+            response = super().send(request, *args, **kwargs)
+        except Exception as e:
+            observe_upstream_error(self.upstream, endpoint, time.perf_counter() - started, e)
+            raise
+        observe_upstream(
+            self.upstream, endpoint, response.status_code,
+            time.perf_counter() - started, _content_length(response.headers)
+        )
+        return response
+
+
+class _Retry(Retry):
+    """
+    Retry policy that never re-sends a POST the upstream may have processed
+
+    POSTs (paid chat completions) are retried only on connection errors,
+    where nothing was sent, and on 429, where nothing was done. Read
+    timeouts and 5xx responses are retried for idempotent methods only.
+    """
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method and method.upper() == 'POST':
+            return status_code == 429
+        return super().is_retry(method, status_code, has_retry_after)
+
+
+def _build_retry():
+    return _Retry(
+        total=Config.HTTP_MAX_RETRIES,
+        backoff_factor=Config.HTTP_BACKOFF_FACTOR,
+        status_forcelist=RETRY_STATUSES,
+        respect_retry_after_header=True,
+        # Hand the final response back so callers' raise_for_status() still sees it
+        raise_on_status=False,
+    )
+
+
+def get_session(upstream):
+    """
+    Returns the shared requests.Session for an upstream ('spoonacular', 'openrouter')
+    """
+    with _lock:
+        _reset_after_fork()
+        session = _sessions.get(upstream)
+        if session is None:
+            pool_size = Config.HTTP_POOL_SIZES.get(upstream, Config.HTTP_DEFAULT_POOL_SIZE)
+            options = dict(pool_connections=1, pool_maxsize=pool_size, max_retries=_build_retry())
+            if Config.METRICS_ENABLED:
+                adapter = InstrumentedAdapter(upstream, **options)
+            else:
+                adapter = HTTPAdapter(**options)
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[upstream] = session
+        return session
+
+
+def get_timeout(upstream):
+    """
+    Returns the (connect, read) timeout in seconds for an upstream
+    """
+    return Config.HTTP_TIMEOUTS.get(upstream, Config.HTTP_DEFAULT_TIMEOUT)
+
+
+def get_openai_http_client():
+    """
+    Returns the shared httpx client used by the OpenAI SDK
+
+    The SDK does its own retries and timeouts; this only sizes and reuses
+    its connection pool.
+    """
+    global _openai_http_client
+    import httpx
+
+    with _lock:
+        _reset_after_fork()
+        if _openai_http_client is None:
+            pool_size = Config.HTTP_POOL_SIZES.get('openai', Config.HTTP_DEFAULT_POOL_SIZE)
+            connect_timeout, read_timeout = get_timeout('openai')
+            transport = httpx.HTTPTransport(
+                limits=httpx.Limits(
+                    max_connections=pool_size,
+                    max_keepalive_connections=pool_size,
+                ),
+            )
+            if Config.METRICS_ENABLED:
+                transport = _instrumented_transport(httpx, transport, 'openai')
+            _openai_http_client = httpx.Client(
+                transport=transport,
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            )
+        return _openai_http_client
+
+
+def _instrumented_transport(httpx, transport, upstream):
+    """
+    Wrap an httpx transport so each call's latency, status and size are recorded
+    """
+
+    class InstrumentedTransport(httpx.BaseTransport):
+        def handle_request(self, request):
+            endpoint = endpoint_name(request.url.path)
+            started = time.perf_counter()
+            try:
+                response = transport.handle_request(request)
+            except Exception as e:
+                observe_upstream_error(upstream, endpoint, time.perf_counter() - started, e)
+                raise
+            observe_upstream(
+                upstream, endpoint, response.status_code,
+                time.perf_counter() - started, _content_length(response.headers)
+            )
+            return response
+
+        def close(self):
+            transport.close()
+
+    return InstrumentedTransport()
@@ -0,0 +1,253 @@
+"""
+Recipe image proxy with an on-disk thumbnail cache
+Each recipe's image is fetched once from the image host at its largest
+size, then resized and recompressed with Pillow to the sizes the pages
+use. Source images and thumbnails are kept as files in a
+bounded directory, evicting the least recently used first, so pages no
+longer depend on the third-party CDN once an image has been seen. Without
+Pillow the proxy stays off and pages link the image host's sized images.
+"""
+import io
+import logging
+import os
+import threading
+import time
+from config import Config
+from services.cache import CacheStats
+from services.http_client import get_session, get_timeout
+from services.recipe_store import get_recipe_store
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+# Size name -> (width, height) of the thumbnails served from /img/<id>/<size>
+IMAGE_SIZES = {
+    'thumb': (90, 90),
+    'card': (312, 231),
+    'large': (556, 370),
+    'full': (636, 393),
+}
+
+# Size fetched from the image host; every thumbnail is made from it
+SOURCE_SIZE = '636x393'
+
+JPEG_QUALITY = 82
+
+MIMETYPES = {'jpg': 'image/jpeg', 'jpeg': 'image/jpeg', 'png': 'image/png', 'gif': 'image/gif', 'webp': 'image/webp'}
+EXTENSIONS = {'image/jpeg': 'jpg', 'image/png': 'png', 'image/gif': 'gif', 'image/webp': 'webp'}
+
+# Seconds between mtime bumps of a cached file on repeated hits
+TOUCH_INTERVAL = 60 * 60
+
+# Eviction trims the cache to this share of its limit, so it does not run
+# again on the very next write
+EVICTION_TARGET = 0.9
+
+
+class ImageCache:
+    """
+    Bounded directory of image files with least-recently-used eviction
+
+    Recency is the file's mtime, bumped on hits, so the LRU order survives
+    restarts and is shared by every worker using the directory. Files are
+    written to a temporary name and renamed into place, so readers never
+    see a partial image.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._total = sum(size for _, size, _ in self._entries())
+
+    def _entries(self):
+        """
+        (mtime, size, path) of every cached file
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or entry.name.endswith('.tmp'):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def get(self, name):
+        """
+        Contents of a cached file, or None
+        """
+        path = os.path.join(self.directory, name)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            if time.time() - os.stat(path).st_mtime > TOUCH_INTERVAL:
+                os.utime(path)
+        except FileNotFoundError:
+            self.stats.incr('misses')
+            return None
+        self.stats.incr('hits')
+        return data
+
+    def set(self, name, data):
+        path = os.path.join(self.directory, name)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporary, 'wb') as f:
+            f.write(data)
+        os.replace(temporary, path)
+        self.stats.incr('sets')
+        with self._lock:
+            self._total += len(data)
+            full = self._total > self.max_bytes
+        if full:
+            self._evict()
+
+    def _evict(self):
+        """
+        Delete the least recently used files until the cache is back under
+        EVICTION_TARGET of its limit
+        """
+        with self._lock:
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in entries:
+                if total <= self.max_bytes * EVICTION_TARGET:
+                    break
+                try:
+                    os.remove(path)
+                    self.stats.incr('evictions')
+                except FileNotFoundError:
+                    pass
+                total -= size
+            self._total = total
+
+    def snapshot(self):
+        counts = self.stats.snapshot()
+        with self._lock:
+            counts['bytes'] = self._total
+        return counts
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+# Striped locks so concurrent requests for one recipe fetch its image once
+_fetch_locks = [threading.Lock() for _ in range(64)]
+
+
+def proxy_enabled():
+    """
+    Whether /img/<id>/<size> serves resized images: IMAGE_PROXY_ENABLED is
+    set and Pillow is installed to do the resizing
+    """
+    return Config.IMAGE_PROXY_ENABLED and Image is not None
+
+
+def get_image_cache():
+    """
+    Returns the process-wide image cache
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ImageCache(Config.IMAGE_CACHE_DIR, Config.IMAGE_CACHE_MAX_BYTES)
+    return _cache
+
+
+def _image_type(recipe_id):
+    """
+    File extension of a recipe's image, from the local corpus when known
+    """
+    store = get_recipe_store()
+    if store is not None:
+        image = (store.cards([recipe_id]).get(recipe_id) or {}).get('image') or ''
+        extension = image.rsplit('.', 1)[-1].lower() if '.' in image.rsplit('/', 1)[-1] else ''
+        if extension in MIMETYPES:
+            return extension
+    return 'jpg'
+
+
+def source_url(recipe_id, extension=None, size=None):
+    """
+    URL of a recipe's image on the image host, at a size from IMAGE_SIZES
+    or at SOURCE_SIZE
+    """
+    extension = extension or _image_type(recipe_id)
+    dimensions = '{}x{}'.format(*IMAGE_SIZES[size]) if size else SOURCE_SIZE
+    return f"{Config.RECIPE_IMAGE_SOURCE_URL}/{recipe_id}-{dimensions}.{extension}"
+
+
+def _resize(data, size):
+    """
+    JPEG of the image cropped and scaled to fill size
+    """
+    with Image.open(io.BytesIO(data)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            image = image.convert('RGBA')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        thumbnail = ImageOps.fit(image, size, method=Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        thumbnail.save(output, format='JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+        return output.getvalue()
+
+
+def _source_image(recipe_id):
+    """
+    (bytes, extension) of a recipe's source image, fetched on first use
+
+    The file is named by the type the image host sent, which is not always
+    the one the recipe's image URL suggests.
+    """
+    cache = get_image_cache()
+    extension = _image_type(recipe_id)
+    for candidate in dict.fromkeys([extension, *EXTENSIONS.values()]):
+        data = cache.get(f"{recipe_id}-source.{candidate}")
+        if data is not None:
+            return data, candidate
+
+    response = get_session('images').get(source_url(recipe_id, extension), timeout=get_timeout('images'))
+    response.raise_for_status()
+    mimetype = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+    extension = EXTENSIONS.get(mimetype, extension)
+    cache.set(f"{recipe_id}-source.{extension}", response.content)
+    return response.content, extension
+
+
+def recipe_image(recipe_id, size):
+    """
+    (bytes, mimetype) of a recipe's image at a size from IMAGE_SIZES
+
+    Thumbnails are JPEGs; an image Pillow cannot read is passed through as
+    the image host sent it. Raises requests.exceptions.RequestException
+    when the image host cannot provide the image.
+    """
+    cache = get_image_cache()
+    name = f"{recipe_id}-{size}.jpg"
+    with _fetch_locks[hash(recipe_id) % len(_fetch_locks)]:
+        data = cache.get(name)
+        if data is not None:
+            return data, 'image/jpeg'
+
+        source, extension = _source_image(recipe_id)
+        try:
+            data = _resize(source, IMAGE_SIZES[size])
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            # Not an image Pillow can (safely) read: pass it through unchanged
+            logging.warning(f"Could not resize image of recipe {recipe_id}: {e}")
+            return source, MIMETYPES[extension]
+        cache.set(name, data)
+        return data, 'image/jpeg'
+
+
+def image_cache_stats():
+    return get_image_cache().snapshot()
@@ -0,0 +1,195 @@
+"""
+Prompt-level cache for chat completions
+Identical prompts (after normalization) are answered from a cache kept apart
+from the Spoonacular response cache, with its own size limit and counters,
+and concurrent identical requests share a single upstream call
+"""
+import hashlib
+import json
+import re
+import threading
+from config import Config
+from services.cache import MISSING, CacheStats, build_cache, get_ttl, make_key
+
+_WHITESPACE = re.compile(r'\s+')
+_TRAILING_PUNCTUATION = re.compile(r'[\s?!.]+$')
+
+# Rough characters-per-token ratio for English text, used for spend estimates
+CHARS_PER_TOKEN = 4
+
+
+def normalize_text(text):
+    """
+    Case-fold, collapse whitespace and drop trailing punctuation
+    """
+    text = _WHITESPACE.sub(' ', str(text or '')).strip().casefold()
+    return _TRAILING_PUNCTUATION.sub('', text)
+
+
+def estimate_tokens(text):
+    return max(1, len(text or '') // CHARS_PER_TOKEN)
+
+
+def prompt_key(provider, model, messages):
+    """
+    Cache key for a chat completion request
+
+    Covers the provider, model, system prompt, history and new message; the
+    messages are normalized so trivially different phrasings share an entry.
+    """
+    normalized = [(message.get('role'), normalize_text(message.get('content'))) for message in messages]
+    digest = hashlib.sha256(json.dumps(normalized, separators=(',', ':')).encode('utf-8')).hexdigest()
+    return make_key('llm', provider, model, digest)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class PromptCache:
+    """
+    Chat completion cache with single-flight request coalescing
+
+    Entries live in backend, built on first use from Config.CACHE_BACKEND
+    with the LLM_CACHE_* limits unless one is given.
+    """
+
+    def __init__(self, backend=None):
+        self.stats = CacheStats()
+        self._backend = backend
+        self._backend_lock = threading.Lock()
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._savings_lock = threading.Lock()
+        self._coalesced = 0
+        self._tokens_saved = 0
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            with self._backend_lock:
+                if self._backend is None:
+                    self._backend = build_cache(
+                        Config.CACHE_BACKEND, path=Config.LLM_CACHE_PATH,
+                        max_entries=Config.LLM_CACHE_MAX_ENTRIES, shared_max_entries=Config.LLM_CACHE_SHARED_MAX_ENTRIES
+                    )
+        return self._backend
+
+    def lookup(self, key):
+        """
+        Returns the cached response text for a key, or None
+        """
+        if not Config.LLM_CACHE_ENABLED:
+            return None
+
+        entry = self.backend.get(key)
+        if entry is MISSING:
+            self.stats.incr('misses')
+            return None
+
+        self.stats.incr('hits')
+        self._record_saving(entry.get('tokens', 0))
+        return entry['response']
+
+    def store(self, key, response, prompt_tokens=0):
+        if not Config.LLM_CACHE_ENABLED or not response:
+            return
+        entry = {'response': response, 'tokens': prompt_tokens + estimate_tokens(response)}
+        self.backend.set(key, entry, get_ttl('llm'))
+        self.stats.incr('sets')
+
+    def get_or_compute(self, key, compute, prompt_tokens=0):
+        """
+        Returns the cached response for key, or calls compute() to produce it
+
+        While one caller is computing a key, other callers for the same key
+        wait for its result instead of making their own upstream call.
+        Exceptions are shared with the waiters but never cached.
+        """
+        cached = self.lookup(key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            call.done.wait()
+            with self._savings_lock:
+                self._coalesced += 1
+            if call.error is not None:
+                raise call.error
+            self._record_saving(prompt_tokens + estimate_tokens(call.result))
+            return call.result
+
+        try:
+            call.result = compute()
+            self.store(key, call.result, prompt_tokens)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def _record_saving(self, tokens):
+        with self._savings_lock:
+            self._tokens_saved += tokens
+
+    def snapshot(self):
+        counts = self.stats.snapshot()
+        counts['evictions'] = self.backend.stats.snapshot()['evictions']
+        with self._savings_lock:
+            counts['coalesced'] = self._coalesced
+            counts['estimated_tokens_saved'] = self._tokens_saved
+        return counts
+
+
+prompt_cache = PromptCache()
+
+
+def messages_tokens(messages):
+    """
+    Estimated prompt tokens for a list of chat messages
+    """
+    return sum(estimate_tokens(message.get('content')) for message in messages)
+
+
+def cached_completion(provider, model, messages, compute):
+    """
+    Answer a chat completion from the prompt cache, coalescing identical
+    in-flight requests; compute() makes the upstream call and returns the text
+    """
+    key = prompt_key(provider, model, messages)
+    return prompt_cache.get_or_compute(key, compute, prompt_tokens=messages_tokens(messages))
+
+
+def cached_stream(provider, model, messages, stream):
+    """
+    Yield a cached response as a single chunk, or pass through stream() and
+    cache the assembled text once it completes
+    """
+    key = prompt_key(provider, model, messages)
+    cached = prompt_cache.lookup(key)
+    if cached is not None:
+        yield cached
+        return
+
+    chunks = []
+    for chunk in stream():
+        chunks.append(chunk)
+        yield chunk
+    prompt_cache.store(key, ''.join(chunks), prompt_tokens=messages_tokens(messages))
+
+
+def llm_cache_stats():
+    return prompt_cache.snapshot()
@@ -0,0 +1,230 @@
+"""
+Local meal planner
+Builds day and week meal plans from recipes already in the local corpus and
+nutrition store, in the same shape as Spoonacular's /mealplanner/generate
+response. Each day is three meals (breakfast, then two mains where the
+corpus has enough of each) chosen to hit the calorie target and a macro
+split: a few thousand random combinations are scored at once over the
+nutrient vectors, and the best is refined one meal at a time against
+every candidate. Recipes are not repeated within a week.
+"""
+import logging
+import numpy as np
+from config import Config
+from services.nutrition_store import COLUMNS, get_nutrition_store
+from services.recipe_store import DIET_RULES, get_recipe_store, tokenize
+
+WEEK_DAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+# Meal slots in a day, as the dish-type tags a recipe needs to fill each
+MEAL_SLOTS = (
+    frozenset(['breakfast', 'brunch', 'morning']),
+    frozenset(['lunch', 'dinner', 'main']),
+    frozenset(['lunch', 'dinner', 'main']),
+)
+
+# Share of calories from (protein, fat, carbohydrates), by diet
+MACRO_SPLITS = {
+    '': (0.2, 0.3, 0.5),
+    'ketogenic': (0.2, 0.75, 0.05),
+    'low-carb': (0.3, 0.45, 0.25),
+    'low-fat': (0.25, 0.15, 0.6),
+    'high-protein': (0.35, 0.3, 0.35),
+}
+
+# Diets answered by macros alone; the rest must be in DIET_RULES
+MACRO_DIETS = frozenset(['low-carb', 'low-fat', 'high-protein'])
+
+# Exclusion terms the meal plan form sends for its quick-meal option
+QUICK_MEAL_TERM = 'time-consuming'
+QUICK_MEAL_MINUTES = 30
+
+# Random meal combinations scored per day before refining the best one
+SAMPLES_PER_DAY = 2048
+REFINE_PASSES = 3
+
+_PLAN_COLUMNS = [COLUMNS.index(name) for name in ('calories', 'protein', 'fat', 'carbohydrates')]
+_KCAL_PER_GRAM = np.array([4, 9, 4])
+_MEAL_FIELDS = ('id', 'title', 'image', 'imageType', 'readyInMinutes', 'servings', 'sourceUrl')
+
+
+def _loss(totals, target_calories, split):
+    """
+    Distance of (..., 4) calorie/protein/fat/carb totals from the targets
+
+    Calories count double; macros are compared as calories against their
+    share of the target.
+    """
+    calories = np.abs(totals[..., 0] - target_calories) / target_calories
+    macros = np.abs(totals[..., 1:] * _KCAL_PER_GRAM - np.asarray(split) * target_calories) / target_calories
+    return 2 * calories + macros.sum(axis=-1)
+
+
+def _excluded_docs(index, exclude):
+    """
+    Documents matching any exclusion term, each term matched as all of its
+    words in the title or ingredients
+    """
+    excluded = set()
+    for term in exclude:
+        docs = None
+        for token in tokenize(term):
+            found = index.postings['title'].get(token, set()) | index.postings['ingredients'].get(token, set())
+            docs = found if docs is None else docs & found
+        excluded |= docs or set()
+    return excluded
+
+
+def _tagged_docs(index, tags):
+    docs = set()
+    for tag in tags:
+        docs |= index.postings['tags'].get(tag, set())
+    return docs
+
+
+class _Pool:
+    """
+    Candidate recipes for a plan: their IDs, plan nutrient totals and the
+    candidates eligible for each meal slot
+    """
+
+    def __init__(self, recipe_ids, totals, slots):
+        self.recipe_ids = recipe_ids
+        self.totals = totals
+        self.slots = slots
+
+
+def _build_pool(diet, exclude):
+    """
+    Returns a _Pool, or None if the local data cannot support the plan
+    """
+    recipes = get_recipe_store()
+    nutrition = get_nutrition_store()
+    if recipes is None or nutrition is None:
+        return None
+    if diet and diet not in DIET_RULES and diet not in MACRO_DIETS:
+        return None
+
+    index = recipes.current_index()
+    size = len(index.doc_ids)
+    allowed = np.ones(size, dtype=bool)
+    if diet in DIET_RULES:
+        allowed &= np.frombuffer(bytes(index.filter_flags[f"diet:{diet}"][:size]), dtype=np.uint8).astype(bool)
+
+    terms = [term.strip().lower() for term in exclude.split(',') if term.strip()]
+    if QUICK_MEAL_TERM in terms:
+        terms.remove(QUICK_MEAL_TERM)
+        minutes = np.array([(card or {}).get('readyInMinutes') or 0 for card in index.cards[:size]])
+        allowed &= minutes <= QUICK_MEAL_MINUTES
+    excluded = [doc for doc in _excluded_docs(index, terms) if doc < size]
+    allowed[excluded] = False
+
+    doc_ids = np.asarray(index.doc_ids[:size], dtype=np.int64)
+    store_ids, matrix = nutrition.snapshot()
+    usable = np.isin(store_ids, doc_ids[allowed]) & ~np.isnan(matrix[:, _PLAN_COLUMNS[0]])
+    recipe_ids = store_ids[usable]
+    if len(recipe_ids) < Config.MEAL_PLAN_MIN_POOL:
+        return None
+    totals = np.nan_to_num(matrix[usable][:, _PLAN_COLUMNS]).astype(np.float64)
+
+    slots = []
+    for tags in MEAL_SLOTS:
+        tagged = np.isin(recipe_ids, doc_ids[list(_tagged_docs(index, tags))])
+        # Not enough recipes tagged for this meal: any recipe will do
+        slots.append(np.flatnonzero(tagged) if tagged.sum() >= Config.MEAL_PLAN_MIN_POOL else np.arange(len(recipe_ids)))
+    return _Pool(recipe_ids, totals, slots)
+
+
+def _plan_day(pool, used, target_calories, split, rng):
+    """
+    Pick one candidate per slot, avoiding used; returns (candidates, totals) or None
+    """
+    slots = [candidates[~np.isin(candidates, list(used))] if used else candidates for candidates in pool.slots]
+    if any(len(candidates) == 0 for candidates in slots):
+        return None
+
+    picks = np.stack([rng.choice(candidates, SAMPLES_PER_DAY) for candidates in slots], axis=1)
+    losses = _loss(pool.totals[picks].sum(axis=1), target_calories, split)
+    # A recipe twice in one day is not a plan
+    for first in range(len(slots)):
+        for second in range(first + 1, len(slots)):
+            losses[picks[:, first] == picks[:, second]] = np.inf
+    best = picks[np.argmin(losses)].copy()
+    loss = losses.min()
+
+    # Refine one slot at a time against every candidate for it
+    for _ in range(REFINE_PASSES):
+        improved = False
+        for slot, candidates in enumerate(slots):
+            others = np.delete(best, slot)
+            rest = pool.totals[others].sum(axis=0)
+            candidate_losses = _loss(rest + pool.totals[candidates], target_calories, split)
+            candidate_losses[np.isin(candidates, others)] = np.inf
+            choice = np.argmin(candidate_losses)
+            if candidate_losses[choice] < loss - 1e-9:
+                best[slot] = candidates[choice]
+                loss = candidate_losses[choice]
+                improved = True
+        if not improved:
+            break
+
+    if not np.isfinite(loss):
+        return None
+    totals = pool.totals[best].sum(axis=0)
+    if abs(totals[0] - target_calories) > target_calories * Config.MEAL_PLAN_CALORIE_TOLERANCE:
+        return None
+    return best, totals
+
+
+def _day_response(pool, picks, totals, details):
+    meals = []
+    for candidate in picks:
+        recipe = details[int(pool.recipe_ids[candidate])]
+        meals.append({**{field: recipe.get(field) for field in _MEAL_FIELDS}, 'details': recipe})
+    nutrients = {name: round(float(value), 2) for name, value in zip(('calories', 'protein', 'fat', 'carbohydrates'), totals)}
+    return {'meals': meals, 'nutrients': nutrients}
+
+
+def plan_locally(time_frame='day', target_calories=2000, diet='', exclude=''):
+    """
+    Generate a meal plan from local data, or return None to fall back upstream
+
+    Returns None when the corpus has fewer than Config.MEAL_PLAN_MIN_POOL
+    usable recipes after the diet and exclusions are applied, or when no
+    day can come within Config.MEAL_PLAN_CALORIE_TOLERANCE of the target.
+    """
+    diet = (diet or '').strip().lower().replace(' ', '-')
+    target_calories = float(target_calories or 2000)
+    if target_calories <= 0:
+        return None
+
+    pool = _build_pool(diet, exclude or '')
+    if pool is None:
+        return None
+
+    split = MACRO_SPLITS.get(diet, MACRO_SPLITS[''])
+    rng = np.random.default_rng()
+    days = WEEK_DAYS if time_frame == 'week' else ('day',)
+    used = set()
+    planned = []
+    for _ in days:
+        day = _plan_day(pool, used, target_calories, split, rng)
+        if day is None:
+            return None
+        planned.append(day)
+        used.update(int(candidate) for candidate in day[0])
+
+    store = get_recipe_store()
+    details = {}
+    for candidate in used:
+        recipe_id = int(pool.recipe_ids[candidate])
+        recipe = store.get(recipe_id)
+        if recipe is None:
+            logging.warning(f"Recipe {recipe_id} left the local corpus while planning")
+            return None
+        details[recipe_id] = recipe
+
+    responses = [_day_response(pool, picks, totals, details) for picks, totals in planned]
+    if time_frame == 'week':
+        return {'week': dict(zip(WEEK_DAYS, responses))}
+    return responses[0]
@@ -0,0 +1,209 @@
+"""
+Request and upstream-call metrics in Prometheus text format
+Routes and upstream HTTP calls are timed into histograms and counted by
+status; cache, quota and circuit-breaker state is read at scrape time.
+Metrics are per worker process. When Config.METRICS_ENABLED is false
+nothing is instrumented and the observe functions return immediately.
+"""
+import bisect
+import threading
+from config import Config
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for label_values, value in values:
+            lines.append(f"{self.name}{_labels(self.label_names, label_values)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_values, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((label_values, ([*counts], total, count))
+                            for label_values, (counts, total, count) in self._series.items())
+        for label_values, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                labels = _labels(self.label_names, label_values, ('le', _number(float(bound))))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _labels(self.label_names, label_values)
+            lines.append(f"{self.name}_sum{labels} {total:g}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+request_count = Counter(
+    'cooking_http_requests_total', 'Requests handled, by route, method and status',
+    ('route', 'method', 'status')
+)
+request_latency = Histogram(
+    'cooking_http_request_duration_seconds', 'Time to produce a response (first byte for streams)',
+    ('route', 'method'), LATENCY_BUCKETS
+)
+response_size = Histogram(
+    'cooking_http_response_bytes', 'Response body sizes, where known up front',
+    ('route',), SIZE_BUCKETS
+)
+upstream_count = Counter(
+    'cooking_upstream_requests_total', 'Upstream HTTP calls, by upstream, endpoint and status',
+    ('upstream', 'endpoint', 'status')
+)
+upstream_latency = Histogram(
+    'cooking_upstream_request_duration_seconds', 'Upstream time to response headers, including retries',
+    ('upstream', 'endpoint'), LATENCY_BUCKETS
+)
+upstream_size = Histogram(
+    'cooking_upstream_response_bytes', 'Upstream response sizes, where Content-Length is sent',
+    ('upstream', 'endpoint'), SIZE_BUCKETS
+)
+upstream_errors = Counter(
+    'cooking_upstream_errors_total', 'Upstream calls that raised or returned a 5xx',
+    ('upstream', 'endpoint', 'kind')
+)
+
+METRICS = (request_count, request_latency, response_size, upstream_count, upstream_latency, upstream_size, upstream_errors)
+
+
+def observe_request(route, method, status, seconds, size=None):
+    if not Config.METRICS_ENABLED:
+        return
+    request_count.inc((route, method, str(status)))
+    request_latency.observe((route, method), seconds)
+    if size is not None:
+        response_size.observe((route,), size)
+
+
+def observe_upstream(upstream, endpoint, status, seconds, size=None):
+    if not Config.METRICS_ENABLED:
+        return
+    upstream_count.inc((upstream, endpoint, str(status)))
+    upstream_latency.observe((upstream, endpoint), seconds)
+    if size is not None:
+        upstream_size.observe((upstream, endpoint), size)
+    if status >= 500:
+        upstream_errors.inc((upstream, endpoint, f"http_{status}"))
+
+
+def observe_upstream_error(upstream, endpoint, seconds, error):
+    if not Config.METRICS_ENABLED:
+        return
+    upstream_count.inc((upstream, endpoint, 'error'))
+    upstream_latency.observe((upstream, endpoint), seconds)
+    upstream_errors.inc((upstream, endpoint, type(error).__name__))
+
+
+def _gauge(name, help_text, samples, kind='gauge'):
+    """
+    Lines for a metric read at scrape time; samples are (labels dict, value)
+    """
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+    for labels, value in samples:
+        if value is None:
+            continue
+        label_names = tuple(labels)
+        lines.append(f"{name}{_labels(label_names, tuple(labels[label] for label in label_names))} {_number(value)}")
+    return lines
+
+
+def _state_lines():
+    from fragment_cache import fragment_cache_stats
+    from services.cache import cache_stats
+    from services.llm_cache import llm_cache_stats
+    from services.quota import quota_stats
+    from services.resilience import OPEN, breaker_stats
+
+    caches = {'responses': cache_stats(), 'llm': llm_cache_stats(), 'fragments': fragment_cache_stats()}
+    lines = []
+    for field in ('hits', 'misses', 'sets', 'evictions', 'expirations'):
+        lines += _gauge(
+            f"cooking_cache_{field}_total", f"Cache {field} since the worker started",
+            [({'cache': name}, stats.get(field)) for name, stats in caches.items()], kind='counter'
+        )
+    lines += _gauge('cooking_cache_hit_ratio', 'Cache hits / lookups since the worker started',
+                    [({'cache': name}, stats['hit_ratio']) for name, stats in caches.items()])
+
+    quota = quota_stats()
+    lines += _gauge('cooking_spoonacular_quota_remaining_points', "Spoonacular points left today",
+                    [({}, quota['remaining'])])
+    lines += _gauge('cooking_spoonacular_quota_used_points', "Spoonacular points used today",
+                    [({}, quota['used'])])
+    lines += _gauge('cooking_spoonacular_endpoint_points', "Spoonacular points spent today per endpoint",
+                    [({'endpoint': endpoint}, costs['points']) for endpoint, costs in quota['endpoints'].items()])
+
+    breakers = breaker_stats()
+    lines += _gauge('cooking_circuit_open', '1 while an upstream circuit breaker refuses calls',
+                    [({'breaker': name}, int(state['state'] == OPEN)) for name, state in breakers.items()])
+    lines += _gauge('cooking_circuit_trips_total', 'Times each circuit breaker has opened',
+                    [({'breaker': name}, state['trips']) for name, state in breakers.items()], kind='counter')
+    return lines
+
+
+def render_metrics():
+    """
+    Returns every metric in Prometheus text exposition format
+    """
+    lines = []
+    for metric in METRICS:
+        lines += metric.render()
+    lines += _state_lines()
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,325 @@
+"""
+Columnar nutrition store
+Per-serving nutrient amounts of every recipe fetched with includeNutrition
+are kept as one float32 row per recipe in an in-memory NumPy matrix (one
+column per nutrient, NaN where unknown), persisted to SQLite. The nutrition
+endpoint and meal-plan totals are served from it, and nutrient range
+queries ("under 500 kcal with over 30g protein") are vectorized over the
+whole corpus.
+"""
+import logging
+import os
+import threading
+import time
+import numpy as np
+from config import Config
+from services.sqlite_connections import thread_connection
+
+# (Spoonacular nutrient name, unit, daily value) for each column
+NUTRIENTS = (
+    ('Calories', 'kcal', 2000),
+    ('Fat', 'g', 65),
+    ('Saturated Fat', 'g', 20),
+    ('Carbohydrates', 'g', 300),
+    ('Net Carbohydrates', 'g', 300),
+    ('Sugar', 'g', 100),
+    ('Cholesterol', 'mg', 300),
+    ('Sodium', 'mg', 2400),
+    ('Protein', 'g', 50),
+    ('Fiber', 'g', 25),
+    ('Vitamin A', 'IU', 5000),
+    ('Vitamin C', 'mg', 60),
+    ('Vitamin D', 'µg', 20),
+    ('Vitamin B12', 'µg', 6),
+    ('Calcium', 'mg', 1000),
+    ('Iron', 'mg', 18),
+    ('Magnesium', 'mg', 400),
+    ('Potassium', 'mg', 3500),
+)
+
+# Query and JSON keys, e.g. 'saturated_fat'
+COLUMNS = tuple(name.lower().replace(' ', '_') for name, _, _ in NUTRIENTS)
+COLUMN_OF = {name: column for column, (name, _, _) in enumerate(NUTRIENTS)}
+
+# Nutrients listed under "limit these" by Spoonacular's nutrition widget;
+# the indented ones are shown as part of the line above
+BAD_NUTRIENTS = frozenset(['Calories', 'Fat', 'Saturated Fat', 'Carbohydrates', 'Net Carbohydrates', 'Sugar',
+                           'Cholesterol', 'Sodium'])
+INDENTED_NUTRIENTS = frozenset(['Saturated Fat', 'Net Carbohydrates', 'Sugar'])
+
+_DAILY_VALUES = np.array([daily for _, _, daily in NUTRIENTS], dtype=np.float32)
+_INITIAL_CAPACITY = 1024
+
+
+def nutrient_vector(recipe):
+    """
+    Per-serving nutrient row for an /information payload, or None without nutrition data
+    """
+    nutrients = ((recipe or {}).get('nutrition') or {}).get('nutrients')
+    if not nutrients:
+        return None
+    vector = np.full(len(NUTRIENTS), np.nan, dtype=np.float32)
+    for nutrient in nutrients:
+        column = COLUMN_OF.get(nutrient.get('name'))
+        if column is not None and nutrient.get('amount') is not None:
+            vector[column] = nutrient['amount']
+    return vector
+
+
+def _amount(value, unit):
+    text = f"{value:.0f}" if value >= 10 else f"{value:.1f}".rstrip('0').rstrip('.')
+    return text + unit
+
+
+class NutritionStore:
+    """
+    SQLite-backed nutrient matrix keyed by recipe ID
+
+    Rows live in a preallocated matrix that doubles when full; each worker
+    process keeps its own copy and periodically picks up rows written by
+    other workers, synced on a write version like RecipeStore's.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._ids = np.zeros(_INITIAL_CAPACITY, dtype=np.int64)
+        self._matrix = np.full((_INITIAL_CAPACITY, len(NUTRIENTS)), np.nan, dtype=np.float32)
+        self._rows = {}
+        self._size = 0
+        self._loaded = False
+        self._synced_version = -1
+        self._last_sync = 0.0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS nutrition ("
+            " id INTEGER PRIMARY KEY,"
+            " vector BLOB NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " version INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(nutrition)")}
+        if 'version' not in columns:
+            conn.execute("ALTER TABLE nutrition ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS nutrition_version ON nutrition (version)")
+
+    def _connection(self):
+        return thread_connection(self._local, self.path)
+
+    def __len__(self):
+        self._sync()
+        return self._size
+
+    def _put(self, recipe_id, vector):
+        """
+        Set a recipe's row; callers hold the lock
+        """
+        row = self._rows.get(recipe_id)
+        if row is None:
+            if self._size == len(self._ids):
+                capacity = len(self._ids) * 2
+                self._ids = np.resize(self._ids, capacity)
+                matrix = np.full((capacity, len(NUTRIENTS)), np.nan, dtype=np.float32)
+                matrix[:self._size] = self._matrix[:self._size]
+                self._matrix = matrix
+            row = self._size
+            self._size += 1
+            self._rows[recipe_id] = row
+            self._ids[row] = recipe_id
+        self._matrix[row] = vector
+
+    def _sync(self, force=False):
+        """
+        Load rows written since the last sync (by any worker) into the matrix
+        """
+        now = time.time()
+        if not force and self._loaded and now - self._last_sync < Config.RECIPE_STORE_SYNC_INTERVAL:
+            return
+
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT id, vector, version FROM nutrition WHERE version > ? ORDER BY version",
+                (self._synced_version,)
+            )
+            for recipe_id, blob, version in rows:
+                vector = np.frombuffer(blob, dtype=np.float32)
+                # Rows written with a different column list are refilled on the next fetch
+                if len(vector) == len(NUTRIENTS):
+                    self._put(recipe_id, vector)
+                self._synced_version = max(self._synced_version, version)
+            self._loaded = True
+            self._last_sync = now
+
+    def add_recipes(self, recipes):
+        """
+        Store the nutrition of every recipe that carries it; returns how many did
+        """
+        vectors = []
+        for recipe in recipes or []:
+            vector = nutrient_vector(recipe) if isinstance(recipe, dict) and recipe.get('id') else None
+            if vector is not None:
+                vectors.append((int(recipe['id']), vector))
+        if not vectors:
+            return 0
+
+        conn = self._connection()
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock before the version is read
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                (version,) = conn.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM nutrition").fetchone()
+                conn.executemany(
+                    "INSERT OR REPLACE INTO nutrition (id, vector, updated_at, version) VALUES (?, ?, ?, ?)",
+                    [(recipe_id, vector.tobytes(), now, version) for recipe_id, vector in vectors]
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            for recipe_id, vector in vectors:
+                self._put(recipe_id, vector)
+            if self._loaded and self._synced_version == version - 1:
+                self._synced_version = version
+        return len(vectors)
+
+    def vector(self, recipe_id):
+        """
+        Copy of a recipe's nutrient row, or None if it is not stored
+        """
+        self._sync()
+        with self._lock:
+            row = self._rows.get(int(recipe_id))
+            return None if row is None else self._matrix[row].copy()
+
+    def snapshot(self):
+        """
+        (recipe IDs, nutrient matrix) views of every stored row, in row order
+        """
+        self._sync()
+        with self._lock:
+            return self._ids[:self._size], self._matrix[:self._size]
+
+    def amounts(self, recipe_ids):
+        """
+        {recipe_id: {column: amount}} for the stored recipes among recipe_ids
+        """
+        self._sync()
+        with self._lock:
+            rows = {int(recipe_id): self._matrix[self._rows[int(recipe_id)]].tolist()
+                    for recipe_id in recipe_ids if int(recipe_id) in self._rows}
+        return {
+            recipe_id: {column: round(value, 2) for column, value in zip(COLUMNS, row) if value == value}
+            for recipe_id, row in rows.items()
+        }
+
+    def widget(self, recipe_id):
+        """
+        Nutrition for one recipe in the shape of Spoonacular's nutritionWidget.json
+        """
+        vector = self.vector(recipe_id)
+        if vector is None:
+            return None
+
+        percents = vector / _DAILY_VALUES * 100
+        nutrients, bad, good = [], [], []
+        for (name, unit, _), value, percent in zip(NUTRIENTS, vector.tolist(), percents.tolist()):
+            if value != value:  # NaN: not reported for this recipe
+                continue
+            nutrients.append({'name': name, 'amount': round(value, 2), 'unit': unit,
+                              'percentOfDailyNeeds': round(percent, 2)})
+            entry = {'title': name, 'amount': _amount(value, '' if name == 'Calories' else unit),
+                     'indented': name in INDENTED_NUTRIENTS, 'percentOfDailyNeeds': round(percent, 2)}
+            (bad if name in BAD_NUTRIENTS else good).append(entry)
+
+        summary = {}
+        for key, name in (('calories', 'Calories'), ('carbs', 'Carbohydrates'), ('fat', 'Fat'), ('protein', 'Protein')):
+            value = float(vector[COLUMN_OF[name]])
+            if value == value:
+                summary[key] = _amount(value, '' if name == 'Calories' else 'g')
+        return {**summary, 'bad': bad, 'good': good, 'nutrients': nutrients}
+
+    def totals(self, recipe_ids, servings=None):
+        """
+        Summed nutrients for a set of recipes, as {column: amount}
+
+        servings, if given, is a per-recipe multiplier. Returns None when none
+        of the recipes is stored; unknown amounts count as zero.
+        """
+        self._sync()
+        recipe_ids = [int(recipe_id) for recipe_id in recipe_ids]
+        with self._lock:
+            picked = [(self._rows[recipe_id], index) for index, recipe_id in enumerate(recipe_ids)
+                      if recipe_id in self._rows]
+            if not picked:
+                return None
+            rows = self._matrix[[row for row, _ in picked]]
+        if servings is not None:
+            rows = rows * np.asarray([servings[index] for _, index in picked], dtype=np.float32)[:, None]
+        sums = np.nansum(rows, axis=0, dtype=np.float64)
+        return {column: round(float(value), 2) for column, value in zip(COLUMNS, sums)}
+
+    def query(self, bounds, number=None, sort=None, descending=False):
+        """
+        IDs of recipes whose nutrients fall within bounds, as (total, ids)
+
+        bounds maps a column to a (minimum, maximum) pair, either of which may
+        be None; recipes that do not report a bounded nutrient never match.
+        Results are ordered by the sort column when given, else by ID.
+        """
+        ids, matrix = self.snapshot()
+        mask = np.ones(len(ids), dtype=bool)
+        for column, (low, high) in bounds.items():
+            values = matrix[:, COLUMNS.index(column)]
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+        matches = np.flatnonzero(mask)
+
+        if sort:
+            keys = matrix[matches, COLUMNS.index(sort)]
+            order = np.argsort(-keys if descending else keys, kind='stable')
+        else:
+            order = np.argsort(ids[matches], kind='stable')
+        matches = matches[order]
+        if number is not None:
+            matches = matches[:number]
+        return int(mask.sum()), ids[matches].tolist()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_nutrition_store():
+    """
+    Returns the process-wide nutrition store, or None when it is disabled
+    """
+    global _store
+    if not Config.NUTRITION_STORE_ENABLED:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = NutritionStore(Config.NUTRITION_STORE_PATH)
+    return _store
+
+
+def remember_nutrition(recipes):
+    """
+    Add recipes' nutrition to the store; failures are logged, never raised
+    """
+    store = get_nutrition_store()
+    if store is None:
+        return
+    try:
+        store.add_recipes(recipes)
+    except Exception as e:
+        logging.error(f"Error storing recipe nutrition: {e}")
@@ -2,9 +2,19 @@
 OpenAI API service for the cooking assistant
 Uses OpenAI's GPT models via their official API
 """
+import hashlib
 import json
+import logging
 import os
-from openai import OpenAI
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from openai import OpenAI, RateLimitError
+from config import Config
+from services.cache import MISSING, SQLiteCache, get_ttl, make_key
+from services.http_client import get_openai_http_client, get_timeout
+from services.chat_history import prepare_history
+from services.llm_cache import cached_completion, cached_stream
 
 # the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
 # do not change this unless explicitly requested by the user
@@ -13,37 +23,36 @@ MODEL_NAME = "gpt-4o"
 # Get API key from environment variables
 OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
 
+_client = None
+_client_http = None
+_client_lock = threading.Lock()
+
 
 def get_client():
     """
-    Returns an OpenAI client instance
+    Returns the shared OpenAI client instance
     Will raise ValueError if API key is not set
     """
+    global _client, _client_http
     if not OPENAI_API_KEY:
         raise ValueError("OpenAI API key not found. Please set the OPENAI_API_KEY environment variable.")
     
-    return OpenAI(api_key=OPENAI_API_KEY)
+    http_client = get_openai_http_client()
+    with _client_lock:
+        # Rebuild if the pooled HTTP client was replaced (e.g. after a fork)
+        if _client is None or _client_http is not http_client:
+            _client_http = http_client
+            _client = OpenAI(
+                api_key=OPENAI_API_KEY,
+                base_url=Config.OPENAI_BASE_URL,
+                http_client=http_client,
+                timeout=get_timeout('openai')[1],
+                max_retries=Config.HTTP_MAX_RETRIES
+            )
+        return _client
 
 
-def get_ai_response(user_message, chat_history=None):
-    """
-    Get a response from the OpenAI API for the cooking assistant
-    
-    Args:
-        user_message (str): The user's message
-        chat_history (list): Previous messages in the conversation
-    
-    Returns:
-        str: The AI's response text
-    """
-    try:
-        if not chat_history:
-            chat_history = []
-        
-        client = get_client()
-        
-        # Construct messages for the API request
-        system_prompt = """
+CHAT_SYSTEM_PROMPT = """
         You are an expert cooking assistant with deep knowledge of recipes, ingredients, cooking techniques, 
         and nutrition. Your goal is to help users with their cooking questions, meal planning, and provide 
         culinary advice.
@@ -58,46 +67,100 @@ def get_ai_response(user_message, chat_history=None):
         Be friendly, encouraging, and supportive of home cooks of all skill levels. 
         Format your answers for readability, using bullet points and sections as needed.
         """
+
+
+def _complete(messages, max_tokens=300):
+    """
+    Plain, uncached chat completion used for history summaries
+    """
+    response = get_client().chat.completions.create(
+        model=MODEL_NAME,
+        messages=messages,
+        temperature=0.2,
+        max_tokens=max_tokens
+    )
+    return response.choices[0].message.content
+
+
+def _build_chat_messages(user_message, chat_history=None):
+    """
+    Construct messages for the API request: system prompt, history, then the new message
+    """
+    messages = [
+        {"role": "system", "content": CHAT_SYSTEM_PROMPT}
+    ]
+    
+    # Add recent chat history within the token budget, older turns summarized
+    messages.extend(prepare_history(chat_history, user_message, _complete))
+    
+    # Add the user's new message
+    messages.append({"role": "user", "content": user_message})
+    return messages
+
+
+def get_ai_response(user_message, chat_history=None):
+    """
+    Get a response from the OpenAI API for the cooking assistant
+    
+    Args:
+        user_message (str): The user's message
+        chat_history (list): Previous messages in the conversation
+    
+    Returns:
+        str: The AI's response text
+    """
+    try:
+        messages = _build_chat_messages(user_message, chat_history)
         
-        messages = [
-            {"role": "system", "content": system_prompt}
-        ]
-        
-        # Add chat history
-        for msg in chat_history:
-            messages.append(msg)
-        
-        # Add the user's new message
-        messages.append({"role": "user", "content": user_message})
-        
-        # Make the API request
-        response = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=messages,
-            temperature=0.7,
-            max_tokens=800
-        )
+        def fetch():
+            # Make the API request
+            response = get_client().chat.completions.create(
+                model=MODEL_NAME,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=800
+            )
+            return response.choices[0].message.content
         
-        return response.choices[0].message.content
+        return cached_completion('openai', MODEL_NAME, messages, fetch)
     
     except Exception as e:
         return f"I apologize, but I encountered an error while processing your request: {str(e)}"
 
 
-def analyze_recipe(recipe_text):
+def stream_ai_response(user_message, chat_history=None):
     """
-    Analyze a recipe text to extract structured information
+    Stream a response from the OpenAI API for the cooking assistant
     
     Args:
-        recipe_text (str): The full recipe text including title, ingredients, and instructions
+        user_message (str): The user's message
+        chat_history (list): Previous messages in the conversation
     
-    Returns:
-        dict: Structured recipe data including title, ingredients, instructions, etc.
+    Yields:
+        str: Chunks of the AI's response text as they arrive
     """
     try:
-        client = get_client()
+        messages = _build_chat_messages(user_message, chat_history)
+        
+        def stream():
+            chunks = get_client().chat.completions.create(
+                model=MODEL_NAME,
+                messages=messages,
+                temperature=0.7,
+                max_tokens=800,
+                stream=True
+            )
+            for chunk in chunks:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
         
-        system_prompt = """
+        yield from cached_stream('openai', MODEL_NAME, messages, stream)
+    
+    except Exception as e:
+        yield f"I apologize, but I encountered an error while processing your request: {str(e)}"
+
+
+ANALYSIS_SYSTEM_PROMPT = """
         You are a recipe analysis expert. Extract structured information from recipe text.
         Provide the output as a JSON object with the following fields:
         - title: The recipe title
@@ -110,26 +173,206 @@ def analyze_recipe(recipe_text):
         - difficulty: Cooking difficulty (Easy, Medium, Hard)
         - tags: Array of recipe tags (e.g., Vegetarian, Gluten-Free, Quick)
         """
+
+# Shared pool for batch recipe analysis. Each batch keeps at most
+# Config.OPENAI_ANALYSIS_WORKERS recipes queued here, so concurrent
+# batches take turns instead of one import starving the rest.
+_analysis_executor = ThreadPoolExecutor(
+    max_workers=Config.OPENAI_ANALYSIS_WORKERS,
+    thread_name_prefix='openai-analyze'
+)
+
+
+_analysis_cache = None
+_analysis_cache_lock = threading.Lock()
+
+
+def get_analysis_cache():
+    """
+    Returns the persistent recipe analysis cache
+
+    Analyses live in their own SQLite file rather than the response cache,
+    so they survive restarts under any CACHE_BACKEND and a large import
+    never evicts hot Spoonacular responses.
+    """
+    global _analysis_cache
+    if _analysis_cache is None:
+        with _analysis_cache_lock:
+            if _analysis_cache is None:
+                _analysis_cache = SQLiteCache(
+                    Config.OPENAI_ANALYSIS_CACHE_PATH, max_entries=Config.OPENAI_ANALYSIS_CACHE_MAX_ENTRIES
+                )
+    return _analysis_cache
+
+
+class _RateLimitGate:
+    """
+    Pause shared by every analysis worker once OpenAI starts answering 429
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._until = 0.0
+
+    def wait(self):
+        delay = self._until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def back_off(self, seconds):
+        with self._lock:
+            self._until = max(self._until, time.monotonic() + seconds)
+
+
+_rate_limit_gate = _RateLimitGate()
+
+
+def _retry_after(error, attempt):
+    """
+    Seconds to pause after a RateLimitError: the Retry-After header when
+    present, exponential backoff otherwise
+    """
+    try:
+        return float(error.response.headers.get('retry-after'))
+    except (AttributeError, TypeError, ValueError):
+        return Config.HTTP_BACKOFF_FACTOR * (2 ** attempt)
+
+
+def _normalize_recipe_text(recipe_text):
+    """
+    Recipe text with whitespace collapsed and blank lines dropped, so
+    copies differing only in layout share one analysis
+    """
+    lines = (' '.join(line.split()) for line in str(recipe_text or '').splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def _analysis_key(recipe_text):
+    """
+    Cache key of a normalized recipe text's analysis
+    """
+    digest = hashlib.sha256(recipe_text.encode('utf-8')).hexdigest()
+    return make_key('recipe_analysis', MODEL_NAME, digest)
+
+
+def _request_analysis(recipe_text):
+    """
+    Call OpenAI for one normalized recipe text and return the parsed JSON
+
+    Rate limit errors that outlast the client's own retries pause every
+    analysis worker and are retried up to Config.OPENAI_ANALYSIS_MAX_ATTEMPTS
+    times.
+    """
+    for attempt in range(Config.OPENAI_ANALYSIS_MAX_ATTEMPTS):
+        _rate_limit_gate.wait()
+        try:
+            # Make the API request with JSON response format
+            response = get_client().chat.completions.create(
+                model=MODEL_NAME,
+                messages=[
+                    {"role": "system", "content": ANALYSIS_SYSTEM_PROMPT},
+                    {"role": "user", "content": recipe_text}
+                ],
+                temperature=0.2,
+                max_tokens=1000,
+                response_format={"type": "json_object"}
+            )
+            return json.loads(response.choices[0].message.content)
+        except RateLimitError as e:
+            if attempt + 1 == Config.OPENAI_ANALYSIS_MAX_ATTEMPTS:
+                raise
+            delay = _retry_after(e, attempt)
+            logging.warning(f"OpenAI rate limited recipe analysis; pausing {delay:.1f}s")
+            _rate_limit_gate.back_off(delay)
+
+
+def analyze_recipe(recipe_text):
+    """
+    Analyze a recipe text to extract structured information
+    
+    Results are cached by a hash of the normalized text, so the same
+    recipe is only ever sent to OpenAI once.
+    
+    Args:
+        recipe_text (str): The full recipe text including title, ingredients, and instructions
+    
+    Returns:
+        dict: Structured recipe data including title, ingredients, instructions, etc.
+    """
+    try:
+        recipe_text = _normalize_recipe_text(recipe_text)
+        if not recipe_text:
+            return {"error": "Error analyzing recipe: no recipe text provided"}
         
-        # Make the API request with JSON response format
-        response = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": recipe_text}
-            ],
-            temperature=0.2,
-            max_tokens=1000,
-            response_format={"type": "json_object"}
-        )
-        
-        result = json.loads(response.choices[0].message.content)
+        cache = get_analysis_cache()
+        key = _analysis_key(recipe_text)
+        result = cache.get(key)
+        if result is MISSING:
+            result = _request_analysis(recipe_text)
+            cache.set(key, result, get_ttl('recipe_analysis'))
         return result
     
     except Exception as e:
         return {"error": f"Error analyzing recipe: {str(e)}"}
 
 
+def analyze_recipes(recipe_texts):
+    """
+    Analyze many recipe texts, yielding (position, result) as each finishes
+    
+    Texts with the same normalized content are analyzed once and their
+    result is yielded for every position. Cached results come first; the
+    rest run on the shared analysis pool, at most
+    Config.OPENAI_ANALYSIS_WORKERS at a time for this batch. Closing the
+    generator early leaves unstarted recipes unanalyzed.
+    
+    Args:
+        recipe_texts (list): Recipe texts, as accepted by analyze_recipe
+    
+    Yields:
+        tuple: (position in recipe_texts, analyze_recipe result)
+    """
+    positions = {}
+    texts = {}
+    for position, recipe_text in enumerate(recipe_texts):
+        recipe_text = _normalize_recipe_text(recipe_text)
+        key = _analysis_key(recipe_text)
+        positions.setdefault(key, []).append(position)
+        texts[key] = recipe_text
+    
+    cache = get_analysis_cache()
+    pending = []
+    for key in positions:
+        result = cache.get(key) if texts[key] else MISSING
+        if result is MISSING:
+            pending.append(key)
+            continue
+        for position in positions[key]:
+            yield position, result
+    
+    pending = iter(pending)
+    in_flight = {}
+    
+    def submit_next():
+        key = next(pending, None)
+        if key is not None:
+            in_flight[_analysis_executor.submit(analyze_recipe, texts[key])] = key
+    
+    for _ in range(Config.OPENAI_ANALYSIS_WORKERS):
+        submit_next()
+    try:
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = in_flight.pop(future)
+                submit_next()
+                for position in positions[key]:
+                    yield position, future.result()
+    finally:
+        for future in in_flight:
+            future.cancel()
+
+
 def generate_meal_suggestions(preferences, diet_restrictions=None, ingredient_list=None):
     """
     Generate meal suggestions based on user preferences and available ingredients
@@ -1,14 +1,17 @@
+import json
 import requests
 import logging
 from config import Config
+from services.http_client import get_session, get_timeout
+from services.chat_history import prepare_history
+from services.llm_cache import cached_completion, cached_stream
 
-def get_ai_response(user_message, chat_history=None):
+MODEL_NAME = "openai/gpt-3.5-turbo"  # Using GPT-3.5 Turbo through OpenRouter
+
+def _build_messages(user_message, chat_history=None):
     """
-    Get a response from the OpenRouter API for the cooking assistant
+    Build the chat completion messages: system prompt, history, then the new message
     """
-    if chat_history is None:
-        chat_history = []
-    
     # Prepare the system message to establish the AI's role
     system_message = {
         "role": "system",
@@ -21,41 +24,50 @@ def get_ai_response(user_message, chat_history=None):
         )
     }
     
-    # Format the chat history
-    formatted_history = []
-    for message in chat_history:
-        if 'user' in message:
-            formatted_history.append({"role": "user", "content": message['user']})
-        if 'assistant' in message:
-            formatted_history.append({"role": "assistant", "content": message['assistant']})
+    # Recent turns within the token budget, older ones folded into a summary
+    formatted_history = prepare_history(chat_history, user_message, _fetch_completion)
     
     # Add the current user message
     formatted_history.append({"role": "user", "content": user_message})
     
     # Prepare the full messages array with the system message first
-    messages = [system_message] + formatted_history
-    
-    # Make the API request
-    headers = {
+    return [system_message] + formatted_history
+
+def _headers():
+    return {
         "Authorization": f"Bearer {Config.OPENROUTER_API_KEY}",
         "Content-Type": "application/json"
     }
+
+def get_ai_response(user_message, chat_history=None):
+    """
+    Get a response from the OpenRouter API for the cooking assistant
+
+    Identical prompts are answered from the prompt cache.
+    """
+    messages = _build_messages(user_message, chat_history)
+    return cached_completion('openrouter', MODEL_NAME, messages, lambda: _fetch_completion(messages))
+
+def _fetch_completion(messages):
+    # Make the API request
+    headers = _headers()
     
     data = {
-        "model": "openai/gpt-3.5-turbo",  # Using GPT-3.5 Turbo through OpenRouter
+        "model": MODEL_NAME,
         "messages": messages
     }
     
     try:
-        response = requests.post(
+        response = get_session('openrouter').post(
             Config.OPENROUTER_API_URL,
             headers=headers,
-            json=data
+            json=data,
+            timeout=get_timeout('openrouter')
         )
         response.raise_for_status()
         
         response_data = response.json()
-        logging.debug(f"AI Response: {response_data}")
+        logging.debug(f"AI response received ({len(response.content)} bytes)")
         
         # Extract and return the assistant's message
         if "choices" in response_data and len(response_data["choices"]) > 0:
@@ -66,3 +78,52 @@ def get_ai_response(user_message, chat_history=None):
     except requests.exceptions.RequestException as e:
         logging.error(f"Error getting AI response: {e}")
         raise Exception(f"Error getting AI response: {e}")
+
+def stream_ai_response(user_message, chat_history=None):
+    """
+    Stream a response from the OpenRouter API, yielding text chunks as they arrive
+    """
+    messages = _build_messages(user_message, chat_history)
+    return cached_stream('openrouter', MODEL_NAME, messages, lambda: _stream_completion(messages))
+
+def _stream_completion(messages):
+    data = {
+        "model": MODEL_NAME,
+        "messages": messages,
+        "stream": True
+    }
+    
+    try:
+        response = get_session('openrouter').post(
+            Config.OPENROUTER_API_URL,
+            headers=_headers(),
+            json=data,
+            timeout=get_timeout('openrouter'),
+            stream=True
+        )
+        response.raise_for_status()
+        
+        # SSE is always UTF-8; requests would otherwise assume ISO-8859-1 for text/*
+        response.encoding = 'utf-8'
+        
+        with response:
+            for line in response.iter_lines(decode_unicode=True):
+                # Skip keep-alive comments (": OPENROUTER PROCESSING") and blank lines
+                if not line or not line.startswith("data:"):
+                    continue
+                
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                
+                chunk = json.loads(payload)
+                if "error" in chunk:
+                    raise Exception(f"AI stream error: {chunk['error']}")
+                
+                choices = chunk.get("choices") or []
+                content = choices[0].get("delta", {}).get("content") if choices else None
+                if content:
+                    yield content
+    except requests.exceptions.RequestException as e:
+        logging.error(f"Error streaming AI response: {e}")
+        raise Exception(f"Error getting AI response: {e}")
@@ -0,0 +1,164 @@
+"""
+"Cook with what I have" matching over the local recipe corpus
+Every indexed recipe's ingredients are laid out as one sparse recipe x
+ingredient matrix (CSR-style NumPy arrays). A pantry becomes a boolean mask
+over ingredient columns, so counting each recipe's used and missing
+ingredients is a single pass over the matrix however large the pantry is.
+"""
+import threading
+import time
+import weakref
+import numpy as np
+from config import Config
+from services.recipe_store import get_recipe_store, tokenize
+
+# Ingredients assumed to be in every kitchen; with ignore_pantry they are
+# neither used nor missing. Matched by exact name, so 'pepper' leaves
+# 'bell pepper' and 'sugar' leaves 'brown sugar' counted.
+PANTRY_STAPLES = ('salt', 'black pepper', 'pepper', 'water', 'olive oil', 'vegetable oil', 'oil', 'sugar', 'flour')
+
+RANKINGS = ('coverage', 'missing')
+
+
+class _Matrix:
+    """
+    Snapshot of a RecipeIndex's ingredient data as NumPy arrays
+
+    entry_docs/entry_columns list every (document, ingredient) pair, and
+    token_columns maps a name word to the ingredient columns containing it.
+    """
+
+    def __init__(self, index):
+        self.version, self.names, self.doc_ingredients = index.ingredient_snapshot()
+        self.size = len(self.doc_ingredients)
+        self.columns = len(self.names)
+
+        lengths = np.fromiter((len(columns or ()) for columns in self.doc_ingredients), dtype=np.int64, count=self.size)
+        self.entry_docs = np.repeat(np.arange(self.size, dtype=np.int64), lengths)
+        self.entry_columns = np.fromiter(
+            (column for columns in self.doc_ingredients for column in columns or ()),
+            dtype=np.int64, count=int(lengths.sum())
+        )
+
+        self.token_columns = {}
+        for name, column in self.names.items():
+            for token in name.split():
+                self.token_columns.setdefault(token, set()).add(column)
+        self.built_at = time.monotonic()
+
+    def columns_for(self, item):
+        """
+        Ingredient columns a pantry item covers: every name containing all of
+        its words, so 'tomato' covers 'cherry tomato'
+        """
+        columns = None
+        for token in tokenize(item):
+            found = self.token_columns.get(token, set())
+            columns = found if columns is None else columns & found
+        return columns or set()
+
+    def mask(self, items):
+        mask = np.zeros(self.columns, dtype=bool)
+        for item in items:
+            mask[list(self.columns_for(item))] = True
+        return mask
+
+    def exact_mask(self, names):
+        """
+        Mask of the ingredient columns whose normalized name is one of names
+        """
+        mask = np.zeros(self.columns, dtype=bool)
+        for name in names:
+            column = self.names.get(' '.join(tokenize(name)))
+            if column is not None:
+                mask[column] = True
+        return mask
+
+
+# Keyed by the index itself, so a matrix goes away with its index and a new
+# index can never pick up a dead one's matrix through a reused id()
+_matrices = weakref.WeakKeyDictionary()
+_matrices_lock = threading.Lock()
+
+
+def _matrix(index):
+    """
+    The ingredient matrix for an index, rebuilt at most every
+    Config.RECIPE_STORE_SYNC_INTERVAL seconds while the index keeps changing
+    """
+    matrix = _matrices.get(index)
+    if matrix is not None and (matrix.version == index.version
+                               or time.monotonic() - matrix.built_at < Config.RECIPE_STORE_SYNC_INTERVAL):
+        return matrix
+    with _matrices_lock:
+        matrix = _matrices.get(index)
+        if matrix is None or matrix.version != index.version:
+            matrix = _matrices[index] = _Matrix(index)
+    return matrix
+
+
+def _filter(index, size, diet, intolerances):
+    allowed = np.ones(size, dtype=bool)
+    names = [f"diet:{diet}"] if diet else []
+    names += [f"free:{name.strip()}" for name in intolerances.split(',') if name.strip()]
+    for name in names:
+        flags = index.filter_flags.get(name)
+        if flags is None:
+            continue
+        allowed &= np.frombuffer(bytes(flags[:size]), dtype=np.uint8).astype(bool)
+    return allowed
+
+
+def find_by_ingredients(ingredients, number=12, offset=0, ranking='coverage', ignore_pantry=True,
+                        diet='', intolerances='', index=None):
+    """
+    Rank local recipes by how much of them a pantry covers, as (total, results)
+
+    'coverage' ranking puts the largest share of a recipe's ingredients
+    first, 'missing' the fewest ingredients still to buy; ties go to the
+    other measure. Only recipes using at least one pantry ingredient are
+    returned. Each result is a recipe card with usedIngredients,
+    missedIngredients and their counts, as in Spoonacular's findByIngredients.
+    """
+    if index is None:
+        store = get_recipe_store()
+        if store is None:
+            return 0, []
+        index = store.current_index()
+    matrix = _matrix(index)
+    if not matrix.size or not matrix.columns:
+        return 0, []
+
+    have = matrix.mask(ingredients)
+    counted = np.ones(matrix.columns, dtype=bool)
+    if ignore_pantry:
+        counted &= ~matrix.exact_mask(PANTRY_STAPLES)
+    have &= counted
+
+    # One pass over every (recipe, ingredient) pair
+    entry_counted = counted[matrix.entry_columns]
+    totals = np.bincount(matrix.entry_docs, weights=entry_counted, minlength=matrix.size)
+    used = np.bincount(matrix.entry_docs, weights=have[matrix.entry_columns], minlength=matrix.size)
+    missing = totals - used
+
+    candidates = np.flatnonzero((used > 0) & _filter(index, matrix.size, diet, intolerances))
+    if ranking == 'missing':
+        order = np.lexsort((-used[candidates], missing[candidates]))
+    else:
+        coverage = used[candidates] / totals[candidates]
+        order = np.lexsort((missing[candidates], -coverage))
+    page = candidates[order[offset:offset + number]]
+
+    results = []
+    for doc in page:
+        columns = matrix.doc_ingredients[doc] or ()
+        used_names = [index.ingredient_names[column] for column in columns if have[column]]
+        missed_names = [index.ingredient_names[column] for column in columns if counted[column] and not have[column]]
+        results.append({
+            **index.cards[doc],
+            'usedIngredients': used_names,
+            'missedIngredients': missed_names,
+            'usedIngredientCount': len(used_names),
+            'missedIngredientCount': len(missed_names),
+        })
+    return len(candidates), results
@@ -0,0 +1,229 @@
+"""
+Spoonacular quota accounting
+Records the points each upstream call costs (from the X-API-Quota-* response
+headers) in a SQLite file shared by every worker, and decides how far to
+degrade as the daily budget runs out: first skip optional enrichments
+(similar recipes, videos), then prefer stale cached responses, and finally
+stop calling upstream until the quota resets at midnight UTC.
+"""
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+import requests
+from config import Config
+from services.sqlite_connections import thread_connection
+
+NORMAL = 'normal'
+SKIP_OPTIONAL = 'skip_optional'
+PREFER_STALE = 'prefer_stale'
+EXHAUSTED = 'exhausted'
+
+_NUMERIC_SEGMENT = re.compile(r'/\d+(?=/|$)')
+
+
+class QuotaExceededError(requests.exceptions.RequestException):
+    """
+    Raised instead of calling Spoonacular when the daily quota is spent
+    """
+
+
+def endpoint_name(path):
+    """
+    Path with recipe IDs replaced, e.g. /recipes/{id}/information
+    """
+    return _NUMERIC_SEGMENT.sub('/{id}', path)
+
+
+def _today():
+    return datetime.now(timezone.utc).strftime('%Y-%m-%d')
+
+
+def _header_float(response, name):
+    try:
+        return float(response.headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+class QuotaTracker:
+    """
+    Daily quota state and per-endpoint point costs, shared through SQLite
+
+    Reads are served from a per-process copy refreshed at most every
+    Config.QUOTA_REFRESH_INTERVAL seconds, so checking the budget stays
+    off the database on the hot path.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._state = None
+        self._state_read_at = 0.0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS quota_state ("
+            " day TEXT PRIMARY KEY,"
+            " used REAL,"
+            " remaining REAL,"
+            " updated_at REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS quota_endpoints ("
+            " day TEXT NOT NULL,"
+            " endpoint TEXT NOT NULL,"
+            " calls INTEGER NOT NULL,"
+            " points REAL NOT NULL,"
+            " PRIMARY KEY (day, endpoint))"
+        )
+
+    def _connection(self):
+        return thread_connection(self._local, self.path)
+
+    def record(self, path, response):
+        """
+        Account for one upstream response; a 402 marks the quota as spent
+        """
+        used = _header_float(response, 'X-API-Quota-Used')
+        remaining = _header_float(response, 'X-API-Quota-Left')
+        cost = _header_float(response, 'X-API-Quota-Request')
+        if response.status_code == 402:
+            remaining = 0.0
+
+        day = _today()
+        try:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if cost is None and used is not None:
+                    row = conn.execute("SELECT used FROM quota_state WHERE day = ?", (day,)).fetchone()
+                    if row and row[0] is not None:
+                        cost = max(0.0, used - row[0])
+                if used is not None or remaining is not None:
+                    conn.execute(
+                        "INSERT INTO quota_state (day, used, remaining, updated_at) VALUES (?, ?, ?, ?)"
+                        " ON CONFLICT (day) DO UPDATE SET"
+                        " used = COALESCE(excluded.used, used),"
+                        " remaining = COALESCE(excluded.remaining, remaining),"
+                        " updated_at = excluded.updated_at",
+                        (day, used, remaining, time.time())
+                    )
+                conn.execute(
+                    "INSERT INTO quota_endpoints (day, endpoint, calls, points) VALUES (?, ?, 1, ?)"
+                    " ON CONFLICT (day, endpoint) DO UPDATE SET"
+                    " calls = calls + 1, points = points + excluded.points",
+                    (day, endpoint_name(path), cost or 0.0)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            logging.error(f"Error recording Spoonacular quota: {e}")
+            return
+
+        with self._lock:
+            if remaining is not None:
+                self._state = {'day': day, 'used': used, 'remaining': remaining}
+                self._state_read_at = time.monotonic()
+
+    def state(self):
+        """
+        Returns today's {'day', 'used', 'remaining'}; unknown values are None
+        """
+        now = time.monotonic()
+        day = _today()
+        with self._lock:
+            if self._state and self._state['day'] == day and now - self._state_read_at < Config.QUOTA_REFRESH_INTERVAL:
+                return dict(self._state)
+
+        state = {'day': day, 'used': None, 'remaining': None}
+        try:
+            row = self._connection().execute(
+                "SELECT used, remaining FROM quota_state WHERE day = ?", (day,)
+            ).fetchone()
+            if row:
+                state['used'], state['remaining'] = row
+        except sqlite3.Error as e:
+            logging.error(f"Error reading Spoonacular quota: {e}")
+
+        with self._lock:
+            self._state = state
+            self._state_read_at = now
+        return dict(state)
+
+    def level(self):
+        """
+        Current degradation level, from NORMAL to EXHAUSTED
+        """
+        remaining = self.state()['remaining']
+        if remaining is None:
+            return NORMAL
+        if remaining <= 0:
+            return EXHAUSTED
+        if remaining < Config.QUOTA_STALE_RESERVE:
+            return PREFER_STALE
+        if remaining < Config.QUOTA_OPTIONAL_RESERVE:
+            return SKIP_OPTIONAL
+        return NORMAL
+
+    def allow(self, optional=False):
+        """
+        Whether an upstream call may be made at the current level
+        """
+        level = self.level()
+        if optional:
+            return level == NORMAL
+        return level != EXHAUSTED
+
+    def prefer_stale(self):
+        return self.level() in (PREFER_STALE, EXHAUSTED)
+
+    def endpoint_costs(self):
+        """
+        Today's {endpoint: {'calls', 'points'}} across every worker
+        """
+        try:
+            rows = self._connection().execute(
+                "SELECT endpoint, calls, points FROM quota_endpoints WHERE day = ? ORDER BY points DESC",
+                (_today(),)
+            ).fetchall()
+        except sqlite3.Error as e:
+            logging.error(f"Error reading Spoonacular quota: {e}")
+            return {}
+        return {endpoint: {'calls': calls, 'points': points} for endpoint, calls, points in rows}
+
+    def snapshot(self):
+        state = self.state()
+        state['level'] = self.level()
+        state['endpoints'] = self.endpoint_costs()
+        return state
+
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+
+def get_quota_tracker():
+    """
+    Returns the process-wide quota tracker
+    """
+    global _tracker
+    if _tracker is None:
+        with _tracker_lock:
+            if _tracker is None:
+                _tracker = QuotaTracker(Config.QUOTA_DB_PATH)
+    return _tracker
+
+
+def quota_stats():
+    return get_quota_tracker().snapshot()
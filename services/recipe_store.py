@@ -0,0 +1,533 @@
+"""
+Local recipe corpus and search index
+Every recipe received from Spoonacular is persisted to SQLite and indexed in
+memory (title, ingredients, cuisines, diets) so searches can be answered
+locally before falling back to the API. Diet and intolerance filters are
+precomputed as bitsets over the corpus.
+"""
+import bisect
+import heapq
+import json
+import logging
+import os
+import re
+import threading
+import time
+from config import Config
+from services.sqlite_connections import thread_connection
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_TAGS = re.compile(r"<[^>]+>")
+STOPWORDS = frozenset(['a', 'an', 'and', 'the', 'of', 'with', 'in', 'on', 'for', 'to', 'recipe', 'recipes'])
+
+# Relevance weight of a query term matching each field
+FIELD_WEIGHTS = (('title', 3), ('ingredients', 2), ('tags', 1))
+
+# Vocabulary words a trailing partial query word may expand to
+MAX_PREFIX_EXPANSIONS = 50
+
+# Fields kept in memory for rendering recipe_card.html
+CARD_FIELDS = ('id', 'title', 'image', 'readyInMinutes', 'servings', 'vegetarian', 'vegan', 'glutenFree', 'dairyFree')
+
+# Ingredient keywords (matched against names and aisles) for each intolerance
+INTOLERANCE_KEYWORDS = {
+    'dairy': ('milk', 'cheese', 'butter', 'cream', 'yogurt', 'parmesan', 'cheddar', 'mozzarella', 'ghee', 'whey'),
+    'egg': ('egg',),
+    'gluten': ('flour', 'wheat', 'bread', 'pasta', 'barley', 'rye', 'couscous', 'noodle', 'breadcrumb', 'seitan'),
+    'grain': ('flour', 'wheat', 'bread', 'pasta', 'rice', 'oat', 'barley', 'rye', 'corn', 'quinoa', 'couscous', 'noodle'),
+    'peanut': ('peanut',),
+    'seafood': ('seafood', 'fish', 'salmon', 'tuna', 'shrimp', 'prawn', 'crab', 'lobster', 'cod', 'anchov', 'clam',
+                'mussel', 'oyster', 'scallop', 'squid'),
+    'tree-nut': ('almond', 'walnut', 'cashew', 'pecan', 'pistachio', 'hazelnut', 'macadamia', 'brazil nut', 'pine nut'),
+    'soy': ('soy', 'tofu', 'edamame', 'tempeh', 'miso'),
+}
+
+# Predicates over a recipe for each diet offered by the search form
+DIET_RULES = {
+    'vegetarian': lambda recipe, diets: recipe.get('vegetarian') or 'lacto ovo vegetarian' in diets,
+    'vegan': lambda recipe, diets: recipe.get('vegan') or 'vegan' in diets,
+    'gluten-free': lambda recipe, diets: recipe.get('glutenFree') or 'gluten free' in diets,
+    'dairy-free': lambda recipe, diets: recipe.get('dairyFree') or 'dairy free' in diets,
+    'ketogenic': lambda recipe, diets: 'ketogenic' in diets,
+    'paleo': lambda recipe, diets: 'paleolithic' in diets or 'paleo' in diets,
+    'pescetarian': lambda recipe, diets: 'pescatarian' in diets or 'pescetarian' in diets or recipe.get('vegetarian'),
+}
+
+
+def tokenize(text):
+    """
+    Lowercase word tokens with stopwords removed and plurals folded
+    """
+    tokens = []
+    for token in _TOKEN.findall(str(text or '').lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 4 and token.endswith('ies'):
+            token = token[:-3] + 'y'
+        elif len(token) > 4 and token.endswith('oes'):
+            token = token[:-2]
+        elif len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def recipe_ingredients(recipe):
+    """
+    Returns a recipe's ingredient dicts, or None if it carries no ingredient data
+    """
+    if recipe.get('extendedIngredients'):
+        return recipe['extendedIngredients']
+    # complexSearch with fillIngredients returns these instead
+    filled = (recipe.get('usedIngredients') or []) + (recipe.get('missedIngredients') or [])
+    return filled or None
+
+
+def card(recipe):
+    """
+    Compact subset of a recipe for search result cards
+    """
+    summary = _TAGS.sub('', recipe.get('summary') or '')
+    data = {field: recipe.get(field) for field in CARD_FIELDS}
+    data['summary'] = summary[:200]
+    return data
+
+
+def _bits_to_int(flags):
+    """
+    Pack a bytearray of 0/1 flags (one per document) into an int bitset
+    """
+    if not flags:
+        return 0
+    return int(bytes(flags).translate(_FLAG_DIGITS)[::-1], 2)
+
+
+_FLAG_DIGITS = bytes.maketrans(b'\x00\x01', b'01')
+
+
+class RecipeIndex:
+    """
+    In-memory inverted index over recipes
+
+    Text postings map a token to the set of document numbers containing it,
+    per field. Each diet and intolerance filter is a bytearray of per-document
+    flags, packed into an int bitset on demand so that combining filters is a
+    single AND. Ingredient names are numbered so each document's ingredients
+    can be kept as a tuple of columns (see services.pantry).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.doc_ids = []
+        self.doc_of = {}
+        self.cards = []
+        self.doc_tokens = []
+        # Normalized ingredient name -> column, and each document's columns
+        # (None without ingredient data), for pantry matching
+        self.ingredient_columns = {}
+        self.ingredient_names = []
+        self.doc_ingredients = []
+        # Bumped on every change so derived structures know to rebuild
+        self.version = 0
+        self.postings = {field: {} for field, _ in FIELD_WEIGHTS}
+        self._vocabulary = None
+        self.filter_flags = {name: bytearray() for name in self.filter_names()}
+        self._filter_masks = {}
+
+    @staticmethod
+    def filter_names():
+        return [f"diet:{diet}" for diet in DIET_RULES] + [f"free:{name}" for name in INTOLERANCE_KEYWORDS]
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def __contains__(self, recipe_id):
+        return recipe_id in self.doc_of
+
+    def add(self, recipe):
+        """
+        Index a recipe, replacing any earlier version with the same ID
+        """
+        recipe_id = recipe.get('id')
+        if recipe_id is None or not recipe.get('title'):
+            return
+
+        with self._lock:
+            doc = self.doc_of.get(recipe_id)
+            if doc is None:
+                doc = len(self.doc_ids)
+                self.doc_ids.append(recipe_id)
+                self.doc_of[recipe_id] = doc
+                self.cards.append(None)
+                self.doc_tokens.append(None)
+                self.doc_ingredients.append(None)
+                for flags in self.filter_flags.values():
+                    flags.append(0)
+            else:
+                self._unindex(doc)
+
+            ingredients = recipe_ingredients(recipe)
+            ingredient_text = ' '.join(
+                f"{ingredient.get('nameClean') or ingredient.get('name') or ''}" for ingredient in ingredients or []
+            )
+            diets = [diet.lower() for diet in recipe.get('diets') or []]
+            tags = ' '.join((recipe.get('cuisines') or []) + diets + (recipe.get('dishTypes') or []))
+
+            tokens = {
+                'title': set(tokenize(recipe['title'])),
+                'ingredients': set(tokenize(ingredient_text)),
+                'tags': set(tokenize(tags)),
+            }
+            for field, field_tokens in tokens.items():
+                postings = self.postings[field]
+                for token in field_tokens:
+                    postings.setdefault(token, set()).add(doc)
+            self.doc_tokens[doc] = tokens
+            self.cards[doc] = card(recipe)
+            if ingredients is not None:
+                self.doc_ingredients[doc] = self._ingredient_columns(ingredients)
+
+            for diet, rule in DIET_RULES.items():
+                self.filter_flags[f"diet:{diet}"][doc] = 1 if rule(recipe, diets) else 0
+
+            haystack = None
+            if ingredients is not None:
+                haystack = ' '.join(
+                    f"{ingredient.get('name') or ''} {ingredient.get('aisle') or ''}".lower() for ingredient in ingredients
+                )
+            for name, keywords in INTOLERANCE_KEYWORDS.items():
+                # Without ingredient data a recipe is never assumed to be free of anything
+                free = haystack is not None and not any(keyword in haystack for keyword in keywords)
+                if name == 'dairy' and recipe.get('dairyFree') is not None:
+                    free = bool(recipe['dairyFree'])
+                if name == 'gluten' and recipe.get('glutenFree') is not None:
+                    free = bool(recipe['glutenFree'])
+                self.filter_flags[f"free:{name}"][doc] = 1 if free else 0
+
+            self._vocabulary = None
+            self._filter_masks.clear()
+            self.version += 1
+
+    def _ingredient_columns(self, ingredients):
+        columns = set()
+        for ingredient in ingredients:
+            name = ' '.join(tokenize(ingredient.get('nameClean') or ingredient.get('name')))
+            if not name:
+                continue
+            column = self.ingredient_columns.get(name)
+            if column is None:
+                column = self.ingredient_columns[name] = len(self.ingredient_names)
+                self.ingredient_names.append(ingredient.get('nameClean') or ingredient.get('name'))
+            columns.add(column)
+        return tuple(sorted(columns))
+
+    def ingredient_snapshot(self):
+        """
+        Consistent (version, ingredient name -> column, per-document columns)
+        """
+        with self._lock:
+            return self.version, dict(self.ingredient_columns), list(self.doc_ingredients)
+
+    def feature_snapshot(self):
+        """
+        Consistent (version, recipe IDs, per-document ingredient columns,
+        per-document tag tokens, {diet: per-document flags})
+
+        A re-indexed recipe gets new column and token objects, so derived
+        indexes can spot replaced documents by identity.
+        """
+        with self._lock:
+            return (
+                self.version, list(self.doc_ids), list(self.doc_ingredients),
+                [tokens and tokens['tags'] for tokens in self.doc_tokens],
+                {diet: bytes(self.filter_flags[f"diet:{diet}"]) for diet in DIET_RULES},
+            )
+
+    def _unindex(self, doc):
+        tokens = self.doc_tokens[doc] or {}
+        for field, field_tokens in tokens.items():
+            postings = self.postings[field]
+            for token in field_tokens:
+                docs = postings.get(token)
+                if docs is not None:
+                    docs.discard(doc)
+                    if not docs:
+                        del postings[token]
+
+    def _vocabulary_list(self):
+        if self._vocabulary is None:
+            words = set()
+            for postings in self.postings.values():
+                words.update(postings)
+            self._vocabulary = sorted(words)
+        return self._vocabulary
+
+    def _expand_prefix(self, prefix):
+        vocabulary = self._vocabulary_list()
+        start = bisect.bisect_left(vocabulary, prefix)
+        words = []
+        for word in vocabulary[start:start + MAX_PREFIX_EXPANSIONS]:
+            if not word.startswith(prefix):
+                break
+            words.append(word)
+        return words
+
+    def filter_mask(self, name):
+        mask = self._filter_masks.get(name)
+        if mask is None:
+            mask = _bits_to_int(self.filter_flags[name])
+            self._filter_masks[name] = mask
+        return mask
+
+    def search(self, query, diet='', intolerances='', offset=0, number=12, prefix=False):
+        """
+        Returns (total matches, cards for the requested page)
+
+        Every query word must match some field. Only as-you-type suggestions
+        should pass prefix=True, which lets the last word also match longer
+        vocabulary words: a submitted "egg" must not find eggplant.
+        """
+        with self._lock:
+            terms = [[token] for token in tokenize(query)]
+            if prefix and terms and query and query[-1].isalnum():
+                last = terms[-1][0]
+                terms[-1] = sorted(set([last] + self._expand_prefix(last)))
+            if not terms:
+                return 0, []
+
+            # Per term and field, the documents matching any of the term's words
+            term_fields = []
+            for words in terms:
+                fields = []
+                for field, weight in FIELD_WEIGHTS:
+                    docs = set()
+                    for word in words:
+                        docs |= self.postings[field].get(word, set())
+                    fields.append((weight, docs))
+                term_fields.append(fields)
+
+            term_docs = sorted((set().union(*(docs for _, docs in fields)) for fields in term_fields), key=len)
+            candidates = set.intersection(*term_docs)
+
+            filters = []
+            if diet:
+                filters.append(f"diet:{diet}")
+            for intolerance in (intolerances or '').split(','):
+                intolerance = intolerance.strip()
+                if intolerance:
+                    filters.append(f"free:{intolerance}")
+            if filters and candidates:
+                mask = -1
+                for name in filters:
+                    if name not in self.filter_flags:
+                        # A filter we cannot evaluate locally; let upstream answer
+                        return 0, []
+                    mask &= self.filter_mask(name)
+                allowed = mask.to_bytes((len(self.doc_ids) + 7) // 8, 'little') if mask > 0 else b''
+                candidates = {
+                    doc for doc in candidates
+                    if (doc >> 3) < len(allowed) and allowed[doc >> 3] >> (doc & 7) & 1
+                }
+
+            # A term scores the weight of the best field it matches in
+            scores = dict.fromkeys(candidates, 0)
+            for fields in term_fields:
+                best = {}
+                for weight, docs in sorted(fields, key=lambda item: item[0]):
+                    best.update(dict.fromkeys(docs & candidates, weight))
+                for doc, weight in best.items():
+                    scores[doc] += weight
+
+            ranked = heapq.nlargest(offset + number, candidates, key=lambda doc: (scores[doc], -doc))
+            return len(candidates), [self.cards[doc] for doc in ranked[offset:offset + number]]
+
+
+def _merge(existing, incoming):
+    """
+    Merge two payloads for the same recipe, keeping the richer ingredient data
+    """
+    merged = {**existing, **incoming}
+    if existing.get('extendedIngredients') and not incoming.get('extendedIngredients'):
+        merged['extendedIngredients'] = existing['extendedIngredients']
+    if existing.get('nutrition') and not incoming.get('nutrition'):
+        merged['nutrition'] = existing['nutrition']
+    # Per-request enrichments are not part of the recipe itself
+    merged.pop('similar_recipes', None)
+    merged.pop('videos', None)
+    return merged
+
+
+class RecipeStore:
+    """
+    SQLite-backed recipe corpus with an in-memory RecipeIndex
+
+    Each worker process keeps its own index and periodically picks up rows
+    written by other workers. Every write transaction stamps its rows with
+    the next version number while holding SQLite's write lock, so versions
+    become visible in order and a sync never skips a slower writer's rows.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index = RecipeIndex()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._synced_version = -1
+        self._last_sync = 0.0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        conn = self._connection()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS recipes ("
+            " id INTEGER PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " version INTEGER NOT NULL DEFAULT 0)"
+        )
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(recipes)")}
+        if 'version' not in columns:
+            conn.execute("ALTER TABLE recipes ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS recipes_version ON recipes (version)")
+
+    def _connection(self):
+        return thread_connection(self._local, self.path)
+
+    def _sync(self, force=False):
+        """
+        Load rows written since the last sync (by any worker) into the index
+        """
+        now = time.time()
+        if not force and self._loaded and now - self._last_sync < Config.RECIPE_STORE_SYNC_INTERVAL:
+            return
+
+        with self._lock:
+            rows = self._connection().execute(
+                "SELECT data, version FROM recipes WHERE version > ? ORDER BY version",
+                (self._synced_version,)
+            )
+            for data, version in rows:
+                self.index.add(json.loads(data))
+                self._synced_version = max(self._synced_version, version)
+            self._loaded = True
+            self._last_sync = now
+
+    def add_recipes(self, recipes):
+        """
+        Persist and index recipes, merging with what is already stored
+
+        The index only sees the recipes once the transaction has committed.
+        """
+        recipes = [recipe for recipe in recipes or [] if isinstance(recipe, dict) and recipe.get('id') and recipe.get('title')]
+        if not recipes:
+            return
+
+        conn = self._connection()
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock before the version is read
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                (version,) = conn.execute("SELECT COALESCE(MAX(version), 0) + 1 FROM recipes").fetchone()
+                stored = []
+                for recipe in recipes:
+                    row = conn.execute("SELECT data FROM recipes WHERE id = ?", (recipe['id'],)).fetchone()
+                    merged = _merge(json.loads(row[0]), recipe) if row else _merge({}, recipe)
+                    conn.execute(
+                        "INSERT OR REPLACE INTO recipes (id, data, updated_at, version) VALUES (?, ?, ?, ?)",
+                        (merged['id'], json.dumps(merged), now, version)
+                    )
+                    stored.append(merged)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+            for merged in stored:
+                self.index.add(merged)
+            # Skip re-reading our own rows, unless another worker's came in between
+            if self._loaded and self._synced_version == version - 1:
+                self._synced_version = version
+
+    def get(self, recipe_id):
+        row = self._connection().execute("SELECT data FROM recipes WHERE id = ?", (recipe_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def iter_recipes(self, batch_size=500):
+        """
+        Yield every stored recipe without loading the whole table at once
+        """
+        last_id = -1
+        conn = self._connection()
+        while True:
+            rows = conn.execute(
+                "SELECT id, data FROM recipes WHERE id > ? ORDER BY id LIMIT ?", (last_id, batch_size)
+            ).fetchall()
+            if not rows:
+                return
+            for recipe_id, data in rows:
+                yield json.loads(data)
+            last_id = rows[-1][0]
+
+    def current_index(self):
+        """
+        The in-memory index, after picking up other workers' additions
+        """
+        self._sync()
+        return self.index
+
+    def cards(self, recipe_ids):
+        """
+        {recipe_id: card} for the indexed recipes among recipe_ids
+        """
+        self._sync()
+        index = self.index
+        return {recipe_id: index.cards[index.doc_of[recipe_id]] for recipe_id in recipe_ids if recipe_id in index}
+
+    def count(self):
+        (count,) = self._connection().execute("SELECT COUNT(*) FROM recipes").fetchone()
+        return count
+
+    def search(self, query, diet='', intolerances='', offset=0, number=12, prefix=False):
+        """
+        Returns a page of local results, or None if the corpus cannot fill it
+        """
+        self._sync()
+        total, results = self.index.search(query, diet, intolerances, offset, number, prefix)
+        if total < max(Config.LOCAL_SEARCH_MIN_RESULTS, offset + number):
+            return None
+        return results
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_recipe_store():
+    """
+    Returns the process-wide recipe store, or None when it is disabled
+    """
+    global _store
+    if not Config.RECIPE_STORE_ENABLED:
+        return None
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = RecipeStore(Config.RECIPE_STORE_PATH)
+    return _store
+
+
+def remember_recipes(recipes):
+    """
+    Add recipes to the local corpus; failures are logged, never raised
+    """
+    store = get_recipe_store()
+    if store is None:
+        return
+    try:
+        store.add_recipes(recipes)
+    except Exception as e:
+        logging.error(f"Error storing recipes in local corpus: {e}")
@@ -0,0 +1,249 @@
+"""
+Similar-recipe recommendations from the local recipe corpus
+Each indexed recipe is described by four feature blocks: TF-IDF weighted
+ingredients, TF-IDF weighted cuisine/diet/dish type tags, diet flags and
+where its calories come from. Similarity is a weighted sum of the blocks'
+cosine similarities, scored against the whole corpus at once with NumPy.
+As the corpus changes, new recipes are appended to the existing arrays and
+re-indexed ones have just their own rows replaced.
+"""
+import threading
+import time
+import weakref
+import numpy as np
+from config import Config
+from services.nutrition_store import COLUMN_OF, get_nutrition_store
+from services.recipe_store import DIET_RULES, get_recipe_store
+
+# Share of the similarity score from each feature block
+FEATURE_WEIGHTS = {'ingredients': 0.5, 'tags': 0.2, 'diets': 0.1, 'nutrients': 0.2}
+
+# (nutrient, kcal per gram): the nutrient profile compares energy sources,
+# not portion sizes
+MACRO_ENERGY = (('Protein', 4), ('Carbohydrates', 4), ('Fat', 9), ('Sugar', 4), ('Fiber', 2))
+
+_MACRO_COLUMNS = [COLUMN_OF[name] for name, _ in MACRO_ENERGY]
+_MACRO_FACTORS = np.array([factor for _, factor in MACRO_ENERGY], dtype=np.float32)
+
+
+def _normalized(rows):
+    norms = np.linalg.norm(rows, axis=1, keepdims=True)
+    return np.divide(rows, norms, out=np.zeros_like(rows), where=norms > 0)
+
+
+class _SparseBlock:
+    """
+    Binary document x term matrix scored by TF-IDF cosine similarity
+
+    entry_docs/entry_terms list every (document, term) pair. Blocks are
+    never modified: updated() returns a new block, so readers can keep
+    using the old one while it is built.
+    """
+
+    def __init__(self, terms=None, doc_terms=None, entry_docs=None, entry_terms=None):
+        self.terms = terms or {}
+        self.doc_terms = doc_terms or []
+        self.entry_docs = np.zeros(0, dtype=np.int64) if entry_docs is None else entry_docs
+        self.entry_terms = np.zeros(0, dtype=np.int64) if entry_terms is None else entry_terms
+
+        size = len(self.doc_terms)
+        frequencies = np.bincount(self.entry_terms, minlength=len(self.terms))
+        self.idf = np.log((1 + size) / (1 + frequencies)) + 1
+        self.norms = np.sqrt(np.bincount(self.entry_docs, weights=self.idf[self.entry_terms] ** 2, minlength=size))
+
+    def updated(self, documents):
+        """
+        A block with the documents in {doc: term collection or None} replaced,
+        or appended when doc is past the end
+        """
+        terms = dict(self.terms)
+        doc_terms = list(self.doc_terms)
+        replaced = [doc for doc in documents if doc < len(doc_terms)]
+        entry_docs, entry_terms = [], []
+        for doc, document in sorted(documents.items()):
+            columns = sorted({terms.setdefault(term, len(terms)) for term in document or ()})
+            entry_docs.extend([doc] * len(columns))
+            entry_terms.extend(columns)
+            if doc < len(doc_terms):
+                doc_terms[doc] = np.array(columns, dtype=np.int64)
+            else:
+                doc_terms.append(np.array(columns, dtype=np.int64))
+        kept = ~np.isin(self.entry_docs, replaced) if replaced else slice(None)
+        return _SparseBlock(
+            terms, doc_terms,
+            np.concatenate([self.entry_docs[kept], np.array(entry_docs, dtype=np.int64)]),
+            np.concatenate([self.entry_terms[kept], np.array(entry_terms, dtype=np.int64)]),
+        )
+
+    def scores(self, doc):
+        """
+        Cosine similarity of every document to document doc
+        """
+        columns = self.doc_terms[doc]
+        size = len(self.doc_terms)
+        if not len(columns) or not self.norms[doc]:
+            return np.zeros(size)
+        weights = np.zeros(len(self.terms))
+        weights[columns] = self.idf[columns] ** 2
+        dots = np.bincount(self.entry_docs, weights=weights[self.entry_terms], minlength=size)
+        denominators = self.norms * self.norms[doc]
+        return np.divide(dots, denominators, out=np.zeros(size), where=denominators > 0)
+
+
+def _changes(sources, documents):
+    """
+    {doc: features} of the documents that are new or differ from sources
+    """
+    return {
+        doc: document for doc, document in enumerate(documents)
+        if doc >= len(sources) or (document is not sources[doc] and document != sources[doc])
+    }
+
+
+class _State:
+    def __init__(self, version, doc_ids, ingredient_sources, tag_sources, ingredients, tags, diets, nutrients):
+        self.version = version
+        self.doc_ids = doc_ids
+        self.doc_of = {recipe_id: doc for doc, recipe_id in enumerate(doc_ids)}
+        # The RecipeIndex features each row was built from, to spot changed recipes
+        self.ingredient_sources = ingredient_sources
+        self.tag_sources = tag_sources
+        self.ingredients = ingredients
+        self.tags = tags
+        self.diets = diets
+        self.nutrients = nutrients
+        self.built_at = time.monotonic()
+
+
+class SimilarityIndex:
+    """
+    Nearest-neighbour index over a RecipeIndex's documents
+
+    Document numbers match the RecipeIndex's. update() swaps in a new state
+    in one assignment, so queries never see a half-built index.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.state = _State(None, [], [], [], _SparseBlock(), _SparseBlock(),
+                            np.zeros((0, len(DIET_RULES)), dtype=np.float32),
+                            np.zeros((0, len(MACRO_ENERGY)), dtype=np.float32))
+
+    def __len__(self):
+        return len(self.state.doc_ids)
+
+    def update(self, index, nutrition=None):
+        """
+        Catch up with index: append recipes added since the last update and
+        replace the rows of re-indexed ones whose features changed
+        """
+        with self._lock:
+            version, doc_ids, doc_ingredients, doc_tags, diet_flags = index.feature_snapshot()
+            state = self.state
+            if version == state.version:
+                return
+
+            ingredients, tags = state.ingredients, state.tags
+            ingredient_sources, tag_sources = state.ingredient_sources, state.tag_sources
+            if len(state.doc_ids) > len(doc_ids):
+                ingredients, tags = _SparseBlock(), _SparseBlock()
+                ingredient_sources, tag_sources = [], []
+
+            diets = np.stack(
+                [np.frombuffer(flags, dtype=np.uint8) for flags in diet_flags.values()], axis=1
+            ).astype(np.float32) if doc_ids else np.zeros((0, len(DIET_RULES)), dtype=np.float32)
+
+            self.state = _State(
+                version, doc_ids, doc_ingredients, doc_tags,
+                ingredients.updated(_changes(ingredient_sources, doc_ingredients)),
+                tags.updated(_changes(tag_sources, doc_tags)),
+                _normalized(diets),
+                self._nutrient_profiles(doc_ids, nutrition),
+            )
+
+    @staticmethod
+    def _nutrient_profiles(doc_ids, nutrition):
+        """
+        Unit rows of energy per macronutrient, zero for recipes without nutrition
+        """
+        profiles = np.zeros((len(doc_ids), len(MACRO_ENERGY)), dtype=np.float32)
+        if nutrition is None or not doc_ids:
+            return profiles
+        stored_ids, matrix = nutrition.snapshot()
+        if not len(stored_ids):
+            return profiles
+
+        ids = np.array(doc_ids, dtype=np.int64)
+        order = np.argsort(ids)
+        positions = np.minimum(np.searchsorted(ids[order], stored_ids), len(ids) - 1)
+        found = ids[order][positions] == stored_ids
+        energy = np.nan_to_num(matrix[found][:, _MACRO_COLUMNS]) * _MACRO_FACTORS
+        profiles[order[positions[found]]] = energy
+        return _normalized(profiles)
+
+    def similar(self, recipe_id, number):
+        """
+        [(recipe_id, score)] of the number most similar recipes, best first,
+        or None if recipe_id is not indexed
+        """
+        state = self.state
+        doc = state.doc_of.get(recipe_id)
+        if doc is None:
+            return None
+
+        scores = FEATURE_WEIGHTS['ingredients'] * state.ingredients.scores(doc)
+        scores += FEATURE_WEIGHTS['tags'] * state.tags.scores(doc)
+        scores += FEATURE_WEIGHTS['diets'] * (state.diets @ state.diets[doc])
+        scores += FEATURE_WEIGHTS['nutrients'] * (state.nutrients @ state.nutrients[doc])
+        scores[doc] = 0
+
+        number = min(number, int(np.count_nonzero(scores > 0)))
+        if number <= 0:
+            return []
+        top = np.argpartition(-scores, number - 1)[:number]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(state.doc_ids[neighbour], float(scores[neighbour])) for neighbour in top]
+
+
+# Keyed by the RecipeIndex itself, like services.pantry's matrices, so a
+# dead index's state is dropped rather than inherited through a reused id()
+_indexes = weakref.WeakKeyDictionary()
+_indexes_lock = threading.Lock()
+
+
+def _similarity_index(index, recipe_id):
+    """
+    The similarity index for a RecipeIndex, updated at most every
+    Config.RECIPE_STORE_SYNC_INTERVAL seconds unless recipe_id is missing
+    from it
+    """
+    similarity = _indexes.get(index)
+    if similarity is None:
+        with _indexes_lock:
+            similarity = _indexes.setdefault(index, SimilarityIndex())
+    state = similarity.state
+    if state.version != index.version and (
+            recipe_id not in state.doc_of
+            or time.monotonic() - state.built_at >= Config.RECIPE_STORE_SYNC_INTERVAL):
+        similarity.update(index, get_nutrition_store())
+    return similarity
+
+
+def similar_recipes(recipe_id, number, index=None):
+    """
+    Cards of the number recipes most similar to recipe_id, or None when the
+    local corpus cannot answer: the recipe is not indexed, or the corpus is
+    smaller than Config.LOCAL_SIMILAR_MIN_CORPUS
+    """
+    if index is None:
+        store = get_recipe_store()
+        if store is None:
+            return None
+        index = store.current_index()
+    if len(index) < Config.LOCAL_SIMILAR_MIN_CORPUS or recipe_id not in index:
+        return None
+
+    neighbours = _similarity_index(index, recipe_id).similar(recipe_id, number)
+    if neighbours is None or len(neighbours) < number:
+        return None
+    return [index.cards[index.doc_of[neighbour]] for neighbour, _ in neighbours]
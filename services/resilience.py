@@ -0,0 +1,151 @@
+"""
+Resilience helpers for upstream calls
+Per-endpoint circuit breakers that stop calling an upstream that keeps
+failing, and a background revalidator that refreshes stale cache entries
+while the stale value is served.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from config import Config
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """
+    Raised instead of calling an upstream endpoint whose circuit is open
+    """
+
+
+class CachedFailureError(requests.exceptions.RequestException):
+    """
+    Raised for a call that recently failed and is negatively cached
+    """
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+
+    After Config.CIRCUIT_FAILURE_THRESHOLD failures in a row the circuit
+    opens and calls are refused for Config.CIRCUIT_RESET_TIMEOUT seconds;
+    then a single trial call is let through, closing the circuit again if
+    it succeeds. allow() hands out a ticket for each call it lets through;
+    only the trial call's ticket ends the trial when passed to release().
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.trips = 0
+        self.rejected = 0
+        self._trial = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        A ticket for the call (always truthy), or None if the circuit refuses it
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= Config.CIRCUIT_RESET_TIMEOUT:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and self._trial is None:
+                self._trial = object()
+                return self._trial
+            self.rejected += 1
+            return None
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= Config.CIRCUIT_FAILURE_THRESHOLD:
+                if self.state != OPEN:
+                    self.trips += 1
+                    logging.warning(f"Opening circuit for {self.name} after {self.failures} failures")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def release(self, ticket):
+        """
+        End a call allowed by allow(), whatever became of it; callers do this
+        in a finally so an unexpected error in the trial call cannot leave
+        the circuit half-open with no further trial ever let through. Other
+        calls' tickets leave a running trial alone.
+        """
+        with self._lock:
+            if ticket is self._trial:
+                self._trial = None
+
+    def snapshot(self):
+        with self._lock:
+            return {'state': self.state, 'failures': self.failures, 'trips': self.trips, 'rejected': self.rejected}
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """
+    Returns the process-wide circuit breaker for an upstream endpoint
+    """
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name))
+    return breaker
+
+
+def breaker_stats():
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+
+class Revalidator:
+    """
+    Runs cache refreshes in the background, at most one per key at a time
+    """
+
+    def __init__(self, max_workers):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='revalidate')
+        self._pending = set()
+        self._lock = threading.Lock()
+
+    def submit(self, key, refresh):
+        """
+        Schedule refresh() unless one is already pending for key
+        """
+        with self._lock:
+            if key in self._pending:
+                return False
+            self._pending.add(key)
+
+        def run():
+            try:
+                refresh()
+            except Exception as e:
+                logging.warning(f"Background refresh of {key} failed: {e}")
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+
+        self._executor.submit(run)
+        return True
+
+
+revalidator = Revalidator(Config.REVALIDATION_WORKERS)
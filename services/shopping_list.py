@@ -0,0 +1,298 @@
+"""
+Server-side shopping list store
+Each recipe's ingredient breakdown is fetched once and kept in the database;
+lists keep running per-ingredient totals that are updated as recipes are
+added or removed, so reading a list costs no upstream calls. Totals are
+changed with single UPDATE/upsert statements so concurrent requests for one
+list never lose an increment. Lists belong to a session and are deleted
+once that session has expired.
+"""
+import itertools
+import logging
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, RecipeIngredients, ShoppingList, ShoppingListItem, ShoppingListRecipe
+from services.quota import QuotaExceededError, get_quota_tracker
+from services.spoonacular import hydrate_recipes
+
+DEFAULT_AISLE = 'Other'
+
+# Only look for lists of expired sessions every N new lists, to keep it off the hot path
+PURGE_INTERVAL = 256
+
+# Lists deleted per statement, well under SQLite's bound parameter limit
+PURGE_BATCH_SIZE = 500
+
+_created = itertools.count(1)
+
+
+def init_schema():
+    """
+    Add the columns newer versions need to a shopping_lists table created by
+    an older one; db.create_all() only creates missing tables
+    """
+    columns = {column['name'] for column in inspect(db.engine).get_columns(ShoppingList.__tablename__)}
+    if 'session_id' not in columns:
+        with db.engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE {ShoppingList.__tablename__} ADD COLUMN session_id VARCHAR(64)"))
+
+
+def _insert(model):
+    """
+    INSERT statement for model supporting ON CONFLICT on the database in use
+    """
+    if db.engine.dialect.name == 'postgresql':
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+def summarize_ingredients(recipe):
+    """
+    Combine a recipe's extendedIngredients by (aisle, name, unit)
+    """
+    combined = OrderedDict()
+    for ingredient in recipe.get('extendedIngredients') or []:
+        us = (ingredient.get('measures') or {}).get('us') or {}
+        name = ingredient.get('nameClean') or ingredient.get('name') or ''
+        if not name:
+            continue
+        aisle = ingredient.get('aisle') or DEFAULT_AISLE
+        unit = us.get('unitShort', ingredient.get('unit', '')) or ''
+        amount = us.get('amount', ingredient.get('amount', 0)) or 0
+
+        key = (aisle, name.lower(), unit)
+        if key in combined:
+            combined[key]['amount'] += amount
+        else:
+            combined[key] = {
+                'ingredient_id': ingredient.get('id'),
+                'name': name.lower(),
+                'aisle': aisle,
+                'unit': unit,
+                'amount': amount,
+            }
+    return list(combined.values())
+
+
+def get_recipe_ingredients(recipe_id):
+    """
+    Returns the stored ingredient breakdown for a recipe, fetching it on first use
+    """
+    stored = db.session.get(RecipeIngredients, recipe_id)
+    if stored is not None:
+        return stored
+
+    recipe = hydrate_recipes([recipe_id]).get(recipe_id)
+    if recipe is None:
+        if not get_quota_tracker().allow():
+            raise QuotaExceededError(f"Recipe {recipe_id} unavailable: Spoonacular quota is spent")
+        raise Exception(f"Error getting recipe info for shopping list: recipe {recipe_id} unavailable")
+
+    # Another request may store the same recipe first; either copy will do
+    db.session.execute(_insert(RecipeIngredients).values(
+        recipe_id=recipe_id,
+        title=recipe.get('title'),
+        image=recipe.get('image'),
+        ingredients=summarize_ingredients(recipe),
+        fetched_at=datetime.utcnow(),
+    ).on_conflict_do_nothing(index_elements=['recipe_id']))
+    return db.session.get(RecipeIngredients, recipe_id)
+
+
+def create_list(session_id):
+    """
+    Create an empty list owned by a session and return its ID
+    """
+    shopping_list = ShoppingList(id=uuid.uuid4().hex, session_id=session_id)
+    db.session.add(shopping_list)
+    db.session.commit()
+    if next(_created) % PURGE_INTERVAL == 0:
+        try:
+            purge_expired_lists()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error purging expired shopping lists: {e}")
+    return shopping_list.id
+
+
+def purge_expired_lists():
+    """
+    Delete the lists whose session has expired and return how many there were
+
+    A session lives at least the session lifetime after it was last written,
+    and it was written when its list was created, so only lists older than
+    that are looked up in the session store. Lists from before lists knew
+    their session go once they have not changed for a whole lifetime. Does
+    nothing with cookie sessions, which the server cannot look up.
+    """
+    store = getattr(current_app.session_interface, 'store', None)
+    if store is None:
+        return 0
+
+    cutoff = datetime.utcnow() - current_app.permanent_session_lifetime
+    candidates = (db.session.query(ShoppingList.id, ShoppingList.session_id, ShoppingList.updated_at)
+                  .filter(ShoppingList.created_at < cutoff)
+                  .all())
+    expired = []
+    for list_id, session_id, updated_at in candidates:
+        if session_id:
+            if store.get(session_id) is None:
+                expired.append(list_id)
+        elif updated_at < cutoff:
+            expired.append(list_id)
+
+    for i in range(0, len(expired), PURGE_BATCH_SIZE):
+        batch = expired[i:i + PURGE_BATCH_SIZE]
+        for model in (ShoppingListItem, ShoppingListRecipe):
+            model.query.filter(model.list_id.in_(batch)).delete(synchronize_session=False)
+        ShoppingList.query.filter(ShoppingList.id.in_(batch)).delete(synchronize_session=False)
+        db.session.commit()
+    if expired:
+        logging.info(f"Purged {len(expired)} shopping lists of expired sessions")
+    return len(expired)
+
+
+def list_exists(list_id):
+    return bool(list_id) and db.session.get(ShoppingList, list_id) is not None
+
+
+def get_recipe_ids(list_id):
+    rows = (ShoppingListRecipe.query
+            .filter_by(list_id=list_id)
+            .order_by(ShoppingListRecipe.added_at)
+            .all())
+    return [row.recipe_id for row in rows]
+
+
+def add_recipe(list_id, recipe_id):
+    """
+    Add a recipe to a list and fold its ingredients into the running totals
+
+    Returns False if the recipe was already on the list.
+    """
+    if db.session.get(ShoppingListRecipe, (list_id, recipe_id)) is not None:
+        return False
+
+    breakdown = get_recipe_ingredients(recipe_id)
+    added = db.session.execute(_insert(ShoppingListRecipe).values(
+        list_id=list_id, recipe_id=recipe_id, added_at=datetime.utcnow()
+    ).on_conflict_do_nothing(index_elements=['list_id', 'recipe_id']))
+    if added.rowcount == 0:
+        # A concurrent request added it first
+        db.session.commit()
+        return False
+
+    items = _item_totals(list_id, breakdown.ingredients)
+    if items:
+        insert = _insert(ShoppingListItem).values(items)
+        db.session.execute(insert.on_conflict_do_update(
+            index_elements=['list_id', 'aisle', 'name', 'unit'],
+            set_={
+                'amount': ShoppingListItem.amount + insert.excluded.amount,
+                'recipe_count': ShoppingListItem.recipe_count + 1,
+            },
+        ))
+
+    _touch(list_id)
+    db.session.commit()
+    return True
+
+
+def _item_totals(list_id, ingredients):
+    """
+    A recipe's ingredients as shopping_list_items rows, one per item key
+
+    Breakdowns stored by older versions may repeat a key, which one upsert
+    statement cannot touch twice and which must only count the recipe once.
+    """
+    items = OrderedDict()
+    for ingredient in ingredients:
+        key = (ingredient['aisle'], ingredient['name'], ingredient['unit'])
+        if key in items:
+            items[key]['amount'] += ingredient['amount']
+            continue
+        items[key] = {
+            'list_id': list_id,
+            'aisle': ingredient['aisle'],
+            'name': ingredient['name'],
+            'unit': ingredient['unit'],
+            'ingredient_id': ingredient.get('ingredient_id'),
+            'amount': ingredient['amount'],
+            'recipe_count': 1,
+        }
+    return list(items.values())
+
+
+def remove_recipe(list_id, recipe_id):
+    """
+    Remove a recipe from a list and subtract its ingredients from the running totals
+
+    Returns False if the recipe was not on the list.
+    """
+    removed = (ShoppingListRecipe.query
+               .filter_by(list_id=list_id, recipe_id=recipe_id)
+               .delete(synchronize_session=False))
+    if removed == 0:
+        db.session.rollback()
+        return False
+
+    breakdown = db.session.get(RecipeIngredients, recipe_id)
+    for item in _item_totals(list_id, breakdown.ingredients if breakdown else []):
+        (ShoppingListItem.query
+         .filter_by(list_id=list_id, aisle=item['aisle'], name=item['name'], unit=item['unit'])
+         .update({
+             ShoppingListItem.amount: ShoppingListItem.amount - item['amount'],
+             ShoppingListItem.recipe_count: ShoppingListItem.recipe_count - 1,
+         }, synchronize_session=False))
+    ShoppingListItem.query.filter(
+        ShoppingListItem.list_id == list_id, ShoppingListItem.recipe_count <= 0
+    ).delete(synchronize_session=False)
+
+    _touch(list_id)
+    db.session.commit()
+    return True
+
+
+def clear_list(list_id):
+    ShoppingListItem.query.filter_by(list_id=list_id).delete()
+    ShoppingListRecipe.query.filter_by(list_id=list_id).delete()
+    _touch(list_id)
+    db.session.commit()
+
+
+def get_shopping_list(list_id):
+    """
+    Returns the list in the shape of Spoonacular's shopping-list/compute
+    response, plus the IDs of the recipes it was built from
+    """
+    items = (ShoppingListItem.query
+             .filter_by(list_id=list_id)
+             .order_by(ShoppingListItem.aisle, ShoppingListItem.name)
+             .all())
+
+    aisles = OrderedDict()
+    for index, item in enumerate(items):
+        measure = {'amount': round(max(item.amount, 0.0), 2), 'unit': item.unit}
+        aisles.setdefault(item.aisle, []).append({
+            'id': item.ingredient_id or index,
+            'name': item.name,
+            'aisle': item.aisle,
+            'measures': {'original': measure, 'us': measure},
+        })
+
+    return {
+        'recipe_ids': get_recipe_ids(list_id),
+        'aisles': [{'aisle': aisle, 'items': entries} for aisle, entries in aisles.items()],
+    }
+
+
+def _touch(list_id):
+    shopping_list = db.session.get(ShoppingList, list_id)
+    if shopping_list is not None:
+        shopping_list.updated_at = db.func.now()
+    else:
+        logging.warning(f"Shopping list {list_id} not found")
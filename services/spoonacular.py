@@ -1,23 +1,207 @@
+import copy
+import os
 import requests
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from config import Config
+from services.cache import MISSING, get_cache, get_ttl, make_key
+from services.http_client import get_session, get_timeout
+from services.meal_planner import plan_locally
+from services.nutrition_store import get_nutrition_store, remember_nutrition
+from services.quota import QuotaExceededError, endpoint_name, get_quota_tracker
+from services.recipe_store import get_recipe_store, remember_recipes
+from services.recommender import similar_recipes as similar_recipes_locally
+from services.resilience import CachedFailureError, CircuitOpenError, get_breaker, revalidator
 
-SPOONACULAR_BASE_URL = "https://api.spoonacular.com"
+SPOONACULAR_BASE_URL = os.environ.get("SPOONACULAR_BASE_URL", "https://api.spoonacular.com")
+SPOONACULAR_IMAGE_URL = "https://img.spoonacular.com/recipes"
 
-def search_recipes(query, diet='', intolerances=''):
+# Videos shown on a recipe page
+RECIPE_VIDEOS = 3
+
+# Shared pool for optional enrichment lookups (similar recipes, videos).
+# Tasks here must never wait on other tasks in the same pool.
+_enrichment_executor = ThreadPoolExecutor(
+    max_workers=Config.SPOONACULAR_ENRICHMENT_WORKERS,
+    thread_name_prefix='spoonacular-enrich'
+)
+
+# Bounded pool for bulk recipe hydration (meal plans)
+_hydration_executor = ThreadPoolExecutor(
+    max_workers=Config.SPOONACULAR_HYDRATION_WORKERS,
+    thread_name_prefix='spoonacular-hydrate'
+)
+
+def _result_before(future, deadline, default, label):
+    """
+    Wait for an enrichment future until the monotonic deadline
+
+    Returns the default when the deadline passes or the task fails. A task
+    that misses the deadline keeps running in the background, so its result
+    still lands in the response cache for the next request.
+    """
+    try:
+        return future.result(timeout=max(0, deadline - time.monotonic()))
+    except FutureTimeoutError:
+        logging.warning(f"Dropping {label}: not ready within the enrichment deadline")
+    except Exception as e:
+        logging.error(f"Error getting {label}: {e}")
+    return default
+
+def _send(method, path, **kwargs):
+    """
+    Make one Spoonacular call through the quota check and circuit breaker
+
+    Raises QuotaExceededError or CircuitOpenError without calling upstream
+    when either refuses the call, and HTTPError for error responses.
+    """
+    optional = kwargs.pop('optional', False)
+    quota = get_quota_tracker()
+    if not quota.allow(optional):
+        raise QuotaExceededError(f"Skipping {path}: Spoonacular quota is low ({quota.level()})")
+    
+    breaker = get_breaker(f"spoonacular:{endpoint_name(path)}")
+    ticket = breaker.allow()
+    if not ticket:
+        raise CircuitOpenError(f"Skipping {path}: circuit is open after repeated failures")
+    
+    try:
+        response = get_session('spoonacular').request(
+            method,
+            f"{SPOONACULAR_BASE_URL}{path}",
+            params={**kwargs.pop('params', {}), 'apiKey': Config.SPOONACULAR_API_KEY},
+            timeout=get_timeout('spoonacular'),
+            **kwargs
+        )
+        # Client errors are the caller's problem, not a sign the upstream is down
+        if response.status_code >= 500 or response.status_code == 429:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+    except requests.exceptions.RequestException:
+        breaker.record_failure()
+        raise
+    finally:
+        breaker.release(ticket)
+    
+    quota.record(path, response)
+    if response.status_code == 402:
+        raise QuotaExceededError(f"Spoonacular daily quota exceeded ({path})", response=response)
+    response.raise_for_status()
+    return response
+
+def _is_empty(data):
+    """
+    Whether a response holds no results (no videos, no similar recipes...)
+    """
+    if isinstance(data, dict):
+        for field in ('results', 'videos'):
+            if field in data:
+                return not data[field]
+    return not data
+
+def _negative_key(key):
+    return make_key('negative', key)
+
+def _remember_failure(key, error):
+    """
+    Negatively cache a failed call so it is not retried on every request
+    """
+    response = getattr(error, 'response', None)
+    status = response.status_code if response is not None else None
+    kind = 'not_found' if status == 404 else 'error'
+    get_cache().set(_negative_key(key), {'status': status, 'error': str(error)}, Config.NEGATIVE_CACHE_TTLS[kind])
+
+def _fetch_json(path, params, namespace=None, key=None, extract_recipes=None, optional=False):
+    """
+    Call upstream and store the response; see _get_json
+    """
+    data = _send('GET', path, params=params, optional=optional).json()
+    
+    if key:
+        ttl = get_ttl(namespace)
+        if _is_empty(data):
+            ttl = min(ttl, Config.NEGATIVE_CACHE_TTLS['empty'])
+        cache = get_cache()
+        cache.set(key, data, ttl)
+        cache.delete(_negative_key(key))
+    if extract_recipes:
+        recipes = extract_recipes(data)
+        remember_recipes(recipes)
+        remember_nutrition(recipes)
+    return data
+
+def _get_json(path, params, namespace=None, extract_recipes=None, optional=False):
+    """
+    GET a Spoonacular endpoint and return the decoded JSON body
+
+    When a cache namespace is given the response is served from, and stored
+    in, the shared response cache using that namespace's TTL. The API key is
+    never part of the cache key. extract_recipes(data), if given, picks the
+    recipes out of a freshly fetched response for the local recipe corpus.
+
+    An expired entry still within the stale grace period is returned right
+    away and refreshed in the background. Failed calls are negatively
+    cached for a short while and re-raised as CachedFailureError.
+
+    As the daily quota runs low, optional calls are refused first, then
+    stale cached responses are preferred over calling upstream; a refused
+    call raises QuotaExceededError.
     """
-    Search for recipes using the Spoonacular API
+    if not namespace:
+        return _fetch_json(path, params, extract_recipes=extract_recipes, optional=optional)
+    
+    cache = get_cache()
+    key = make_key(namespace, path, params)
+    cached = cache.get(key)
+    if cached is not MISSING:
+        return cached
+    
+    fetch = lambda: _fetch_json(path, params, namespace, key, extract_recipes, optional)
+    stale, _ = cache.get_stale(key)
+    if stale is not MISSING:
+        # Low on quota: keep serving stale without spending points on a refresh
+        if not get_quota_tracker().prefer_stale():
+            revalidator.submit(key, fetch)
+        return stale
+    
+    failure, _ = cache.get_with_expiry(_negative_key(key))
+    if failure is not MISSING:
+        raise CachedFailureError(f"{path} failed recently ({failure['error']})")
+    
+    try:
+        return fetch()
+    except (QuotaExceededError, CircuitOpenError):
+        raise
+    except requests.exceptions.RequestException as e:
+        _remember_failure(key, e)
+        raise
+
+def search_recipes(query, diet='', intolerances='', offset=0, number=12, use_local=True):
     """
-    endpoint = f"{SPOONACULAR_BASE_URL}/recipes/complexSearch"
+    Search for recipes, answering from the local recipe corpus when it has
+    enough matches and from the Spoonacular API otherwise
+    """
+    store = get_recipe_store() if use_local else None
+    if store is not None:
+        try:
+            results = store.search(query, diet, intolerances, offset, number)
+            if results is not None:
+                return results
+        except Exception as e:
+            logging.error(f"Error searching local recipe corpus: {e}")
     
     params = {
-        'apiKey': Config.SPOONACULAR_API_KEY,
         'query': query,
         'addRecipeInformation': True,
         'fillIngredients': True,
-        'number': 12,  # Number of results to return
+        'number': number,  # Number of results to return
     }
     
+    if offset:
+        params['offset'] = offset
+    
     if diet:
         params['diet'] = diet
     
@@ -25,61 +209,105 @@ def search_recipes(query, diet='', intolerances=''):
         params['intolerances'] = intolerances
     
     try:
-        response = requests.get(endpoint, params=params)
-        response.raise_for_status()
-        return response.json().get('results', [])
+        data = _get_json(
+            '/recipes/complexSearch', params, namespace='search',
+            extract_recipes=lambda data: data.get('results', [])
+        )
+        return data.get('results', [])
+    except QuotaExceededError:
+        raise
     except requests.exceptions.RequestException as e:
         logging.error(f"Error searching recipes: {e}")
         raise Exception(f"Error searching recipes: {e}")
 
-def get_recipe_info(recipe_id):
+def get_recipe_info(recipe_id, enrich=True):
     """
     Get detailed information about a specific recipe
+
+    With enrich=False only the /information data is returned, and callers
+    load similar recipes and videos separately. Otherwise similar recipes
+    are fetched concurrently with the main lookup and videos as soon as the
+    title is known. Both are optional: whatever is not ready by
+    Config.RECIPE_ENRICHMENT_DEADLINE seconds after the call started is
+    left out rather than holding up the page.
     """
-    endpoint = f"{SPOONACULAR_BASE_URL}/recipes/{recipe_id}/information"
+    deadline = time.monotonic() + Config.RECIPE_ENRICHMENT_DEADLINE
     
-    params = {
-        'apiKey': Config.SPOONACULAR_API_KEY,
-        'includeNutrition': True
-    }
+    # Optional enrichments are the first thing dropped when quota runs low
+    enrich = enrich and get_quota_tracker().allow(optional=True)
+    
+    # Local recommendations need no upstream call; otherwise similar recipes
+    # only need the ID, so start them before the main fetch
+    local_similar = _local_similar_recipes(recipe_id, Config.SIMILAR_RECIPES) if enrich else None
+    similar_future = None
+    if enrich and local_similar is None:
+        similar_future = _enrichment_executor.submit(get_similar_recipes, recipe_id)
     
     try:
-        response = requests.get(endpoint, params=params)
-        response.raise_for_status()
-        recipe_data = response.json()
-        
-        # Get similar recipes
-        similar_recipes = get_similar_recipes(recipe_id)
-        recipe_data['similar_recipes'] = similar_recipes
-        
-        # Get video data for recipe if available
-        try:
-            videos = get_recipe_videos(recipe_data['title'])
-            if videos and len(videos) > 0:
-                recipe_data['videos'] = videos
-        except Exception as e:
-            logging.error(f"Error getting recipe videos: {e}")
-        
-        return recipe_data
+        # Copy so the enrichments below never mutate the cached response
+        recipe_data = dict(_fetch_information(recipe_id))
     except requests.exceptions.RequestException as e:
+        if similar_future:
+            similar_future.cancel()
+        if isinstance(e, QuotaExceededError):
+            raise
         logging.error(f"Error getting recipe info: {e}")
         raise Exception(f"Error getting recipe info: {e}")
+    
+    if not enrich:
+        return recipe_data
+    
+    # Same count as /api/recipe-videos so both share one cache entry
+    videos_future = _enrichment_executor.submit(get_recipe_videos, recipe_data['title'], RECIPE_VIDEOS)
+    
+    if similar_future:
+        recipe_data['similar_recipes'] = _result_before(similar_future, deadline, [], 'similar recipes')
+    else:
+        recipe_data['similar_recipes'] = local_similar
+    
+    # Get video data for recipe if available
+    videos = _result_before(videos_future, deadline, [], 'recipe videos')
+    if videos and len(videos) > 0:
+        recipe_data['videos'] = videos
+    
+    return recipe_data
+
+def _local_similar_recipes(recipe_id, number):
+    """
+    Similar recipes from the local corpus, or None to ask upstream
+    """
+    if not Config.LOCAL_SIMILAR_RECIPES_ENABLED:
+        return None
+    try:
+        return similar_recipes_locally(recipe_id, number)
+    except Exception as e:
+        logging.error(f"Error recommending similar recipes locally: {e}")
+        return None
 
-def get_similar_recipes(recipe_id, number=3):
+def get_similar_recipes(recipe_id, number=None):
     """
     Get similar recipes to the one specified
+
+    Recommended from the local corpus when it can (see services.recommender),
+    otherwise from the /similar endpoint. That only returns an image type,
+    so each result gets its image URL filled in.
     """
-    endpoint = f"{SPOONACULAR_BASE_URL}/recipes/{recipe_id}/similar"
+    number = number or Config.SIMILAR_RECIPES
+    local_similar = _local_similar_recipes(recipe_id, number)
+    if local_similar is not None:
+        return local_similar
     
     params = {
-        'apiKey': Config.SPOONACULAR_API_KEY,
         'number': number
     }
     
     try:
-        response = requests.get(endpoint, params=params)
-        response.raise_for_status()
-        return response.json()
+        similar = _get_json(f'/recipes/{recipe_id}/similar', params, namespace='similar', optional=True)
+        results = []
+        for recipe in similar:
+            image = recipe.get('image') or f"{SPOONACULAR_IMAGE_URL}/{recipe['id']}-312x231.{recipe.get('imageType') or 'jpg'}"
+            results.append({**recipe, 'image': image})
+        return results
     except requests.exceptions.RequestException as e:
         logging.error(f"Error getting similar recipes: {e}")
         return []
@@ -88,30 +316,137 @@ def get_recipe_videos(query, number=1):
     """
     Get YouTube videos related to a recipe
     """
-    endpoint = f"{SPOONACULAR_BASE_URL}/food/videos/search"
-    
     params = {
-        'apiKey': Config.SPOONACULAR_API_KEY,
         'query': query,
         'number': number
     }
     
     try:
-        response = requests.get(endpoint, params=params)
-        response.raise_for_status()
-        return response.json().get('videos', [])
+        data = _get_json('/food/videos/search', params, namespace='videos', optional=True)
+        return data.get('videos', [])
     except requests.exceptions.RequestException as e:
         logging.error(f"Error getting recipe videos: {e}")
         return []
 
+def _information_key(recipe_id):
+    """
+    Cache key of a recipe's /information response, shared by the single and bulk lookups
+    """
+    return make_key('information', f'/recipes/{recipe_id}/information', {'includeNutrition': True})
+
+def _fetch_information_bulk(recipe_ids):
+    """
+    Fetch /information for several recipes in one informationBulk call and cache each one
+    """
+    params = {
+        'ids': ','.join(str(recipe_id) for recipe_id in recipe_ids),
+        'includeNutrition': True
+    }
+    cache = get_cache()
+    ttl = get_ttl('information')
+    recipes = {}
+    for recipe in _get_json('/recipes/informationBulk', params, extract_recipes=list):
+        cache.set(_information_key(recipe['id']), recipe, ttl)
+        recipes[recipe['id']] = recipe
+    return recipes
+
+def _fetch_information(recipe_id):
+    return _get_json(
+        f'/recipes/{recipe_id}/information', {'includeNutrition': True}, namespace='information',
+        extract_recipes=lambda recipe: [recipe]
+    )
+
+def hydrate_recipes(recipe_ids):
+    """
+    Get /information data for many recipes at once
+
+    Duplicate IDs are fetched once, cached recipes cost nothing, and the rest
+    go out as informationBulk chunks on a bounded thread pool. Recipes a bulk
+    chunk failed to return are retried one by one. Returns a dict mapping
+    recipe ID to its data; recipes that could not be fetched are left out.
+    Stale cached recipes are used as-is and refreshed in the background
+    (unless quota is low).
+    """
+    cache = get_cache()
+    recipes = {}
+    pending = []
+    stale_ids = []
+    for recipe_id in dict.fromkeys(int(recipe_id) for recipe_id in recipe_ids):
+        cached = cache.get(_information_key(recipe_id))
+        if cached is MISSING:
+            cached, _ = cache.get_stale(_information_key(recipe_id))
+            if cached is not MISSING:
+                stale_ids.append(recipe_id)
+        if cached is MISSING:
+            pending.append(recipe_id)
+        else:
+            recipes[recipe_id] = cached
+    
+    if stale_ids and not get_quota_tracker().prefer_stale():
+        chunk_size = Config.SPOONACULAR_BULK_CHUNK_SIZE
+        for i in range(0, len(stale_ids), chunk_size):
+            chunk = stale_ids[i:i + chunk_size]
+            revalidator.submit(make_key('information_bulk', chunk), lambda chunk=chunk: _fetch_information_bulk(chunk))
+    
+    if not pending:
+        return recipes
+    
+    chunk_size = Config.SPOONACULAR_BULK_CHUNK_SIZE
+    bulk_futures = []
+    for i in range(0, len(pending), chunk_size):
+        chunk = pending[i:i + chunk_size]
+        bulk_futures.append((chunk, _hydration_executor.submit(_fetch_information_bulk, chunk)))
+    
+    for chunk, future in bulk_futures:
+        try:
+            recipes.update(future.result())
+        except Exception as e:
+            logging.error(f"Error getting bulk recipe info for {chunk}: {e}")
+    
+    single_futures = []
+    for recipe_id in pending:
+        if recipe_id not in recipes:
+            single_futures.append((recipe_id, _hydration_executor.submit(_fetch_information, recipe_id)))
+    
+    for recipe_id, future in single_futures:
+        try:
+            recipes[recipe_id] = future.result()
+        except Exception as e:
+            logging.error(f"Error getting recipe details for meal plan: {e}")
+    
+    return recipes
+
+def _plan_meals(meal_plan_data):
+    """
+    Returns every meal dict in a day or week meal plan response
+    """
+    if 'meals' in meal_plan_data:
+        return list(meal_plan_data['meals'])
+    meals = []
+    for day in meal_plan_data.get('week', {}).values():
+        meals.extend(day.get('meals', []))
+    return meals
+
 def generate_meal_plan(time_frame='day', target_calories=2000, diet='', exclude=''):
     """
     Generate a meal plan based on user preferences
+
+    Every meal, for day and week plans alike, gets its recipe information
+    attached as 'details' (None when it could not be fetched). Plans are
+    built locally from the recipe corpus when it can support them (see
+    services.meal_planner) and by Spoonacular otherwise. Upstream plans are
+    random, so they are never served from cache, but the last plan for the
+    same preferences is kept to fall back on if the upstream call fails.
     """
-    endpoint = f"{SPOONACULAR_BASE_URL}/mealplanner/generate"
+    if Config.LOCAL_MEAL_PLANS_ENABLED:
+        try:
+            meal_plan_data = plan_locally(time_frame, target_calories, diet, exclude)
+            if meal_plan_data is not None:
+                return meal_plan_data
+        except Exception as e:
+            logging.error(f"Error planning meals locally: {e}")
     
     params = {
-        'apiKey': Config.SPOONACULAR_API_KEY,
         'timeFrame': time_frame,
         'targetCalories': target_calories,
     }
@@ -122,27 +457,52 @@ def generate_meal_plan(time_frame='day', target_calories=2000, diet='', exclude=
     if exclude:
         params['exclude'] = exclude
     
+    cache = get_cache()
+    fallback_key = make_key('mealplan', params)
     try:
-        response = requests.get(endpoint, params=params)
-        response.raise_for_status()
-        
-        meal_plan_data = response.json()
-        
-        # If we have a day meal plan, get detailed recipe info for each meal
-        if time_frame == 'day' and 'meals' in meal_plan_data:
-            for i, meal in enumerate(meal_plan_data['meals']):
-                recipe_id = meal['id']
-                try:
-                    recipe_details = get_recipe_info(recipe_id)
-                    meal_plan_data['meals'][i]['details'] = recipe_details
-                except Exception as e:
-                    logging.error(f"Error getting recipe details for meal plan: {e}")
-                    meal_plan_data['meals'][i]['details'] = None
-        
-        return meal_plan_data
+        meal_plan_data = _get_json('/mealplanner/generate', params)
+        # Stored already expired: only ever read back through get_stale()
+        cache.set(fallback_key, copy.deepcopy(meal_plan_data), 0)
     except requests.exceptions.RequestException as e:
-        logging.error(f"Error generating meal plan: {e}")
-        raise Exception(f"Error generating meal plan: {e}")
+        meal_plan_data, _ = cache.get_stale(fallback_key)
+        if meal_plan_data is MISSING:
+            if isinstance(e, QuotaExceededError):
+                raise
+            logging.error(f"Error generating meal plan: {e}")
+            raise Exception(f"Error generating meal plan: {e}")
+        logging.warning(f"Serving the previous meal plan after upstream error: {e}")
+        meal_plan_data = copy.deepcopy(meal_plan_data)
+    
+    meals = _plan_meals(meal_plan_data)
+    details = hydrate_recipes(meal['id'] for meal in meals)
+    for meal in meals:
+        meal['details'] = details.get(int(meal['id']))
+    
+    _fill_plan_nutrients(meal_plan_data)
+    return meal_plan_data
+
+def _plan_nutrients(meals):
+    """
+    Per-serving calories and macros summed over meals, from the nutrition store
+    """
+    store = get_nutrition_store()
+    if store is None or not meals:
+        return None
+    totals = store.totals([meal['id'] for meal in meals])
+    if totals is None:
+        return None
+    return {key: totals[key] for key in ('calories', 'protein', 'fat', 'carbohydrates')}
+
+def _fill_plan_nutrients(meal_plan_data):
+    """
+    Add nutrient totals to a meal plan (and each of its days) that lacks them
+    """
+    days = meal_plan_data.get('week', {}).values() if 'week' in meal_plan_data else [meal_plan_data]
+    for day in days:
+        if not day.get('nutrients'):
+            nutrients = _plan_nutrients(day.get('meals'))
+            if nutrients:
+                day['nutrients'] = nutrients
 
 def generate_shopping_list(recipe_ids):
     """
@@ -151,8 +511,6 @@ def generate_shopping_list(recipe_ids):
     if not recipe_ids or len(recipe_ids) == 0:
         return {'aisles': []}
     
-    endpoint = f"{SPOONACULAR_BASE_URL}/mealplanner/shopping-list/compute"
-    
     # Format the recipe list in the required format
     recipes = []
     for recipe_id in recipe_ids:
@@ -165,14 +523,10 @@ def generate_shopping_list(recipe_ids):
         "items": recipes
     }
     
-    params = {
-        'apiKey': Config.SPOONACULAR_API_KEY,
-    }
-    
     try:
-        response = requests.post(endpoint, json=data, params=params)
-        response.raise_for_status()
-        return response.json()
+        return _send('POST', '/mealplanner/shopping-list/compute', json=data).json()
+    except QuotaExceededError:
+        raise
     except requests.exceptions.RequestException as e:
         logging.error(f"Error generating shopping list: {e}")
         raise Exception(f"Error generating shopping list: {e}")
@@ -180,17 +534,49 @@ def generate_shopping_list(recipe_ids):
 def get_recipe_nutrition_widget(recipe_id):
     """
     Get a nutrition widget for a recipe
+
+    Recipes in the nutrition store are answered locally, in the same shape;
+    only unknown recipes cost an upstream call.
     """
-    endpoint = f"{SPOONACULAR_BASE_URL}/recipes/{recipe_id}/nutritionWidget.json"
-    
-    params = {
-        'apiKey': Config.SPOONACULAR_API_KEY
-    }
+    store = get_nutrition_store()
+    if store is not None:
+        try:
+            widget = store.widget(recipe_id)
+            if widget is None:
+                # Cached before the store existed: extract it now
+                information, _ = get_cache().get_stale(_information_key(recipe_id))
+                if information is not MISSING and store.add_recipes([information]):
+                    widget = store.widget(recipe_id)
+            if widget is not None:
+                return widget
+        except Exception as e:
+            logging.error(f"Error reading local nutrition for {recipe_id}: {e}")
     
     try:
-        response = requests.get(endpoint, params=params)
-        response.raise_for_status()
-        return response.json()
+        return _get_json(f'/recipes/{recipe_id}/nutritionWidget.json', {}, namespace='nutrition')
     except requests.exceptions.RequestException as e:
         logging.error(f"Error getting recipe nutrition: {e}")
         return None
+
+def search_by_nutrients(bounds, offset=0, number=12, sort=None, descending=False):
+    """
+    Find recipes by per-serving nutrient ranges, entirely from local data
+
+    bounds maps nutrient columns (see services.nutrition_store.COLUMNS) to
+    (minimum, maximum) pairs. Returns (total matches, results), each result
+    a recipe card, or just its ID for recipes missing from the local corpus,
+    with the recipe's 'nutrients' attached.
+    """
+    store = get_nutrition_store()
+    if store is None:
+        return 0, []
+    total, recipe_ids = store.query(bounds, offset + number, sort, descending)
+    recipe_ids = recipe_ids[offset:]
+    
+    recipes = get_recipe_store()
+    cards = recipes.cards(recipe_ids) if recipes is not None else {}
+    amounts = store.amounts(recipe_ids)
+    return total, [
+        {**cards.get(recipe_id, {'id': recipe_id}), 'nutrients': amounts.get(recipe_id, {})}
+        for recipe_id in recipe_ids
+    ]
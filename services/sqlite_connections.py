@@ -0,0 +1,61 @@
+"""
+Per-thread SQLite connections for the SQLite-backed stores
+Each store keeps one connection per thread in a threading.local, opened on
+first use. Under gevent threading.local is per greenlet and every request
+runs on a fresh greenlet, so connections opened while serving a request are
+closed when its app context tears down instead of piling up one per request.
+"""
+import sqlite3
+import threading
+
+# The store locals this thread has opened a connection in
+_opened = threading.local()
+
+
+def thread_connection(local, path):
+    """
+    The calling thread's connection to the database at path, kept in local
+    """
+    conn = getattr(local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        local.conn = conn
+        if not hasattr(_opened, 'locals'):
+            _opened.locals = []
+        _opened.locals.append(local)
+    return conn
+
+
+def close_thread_connections():
+    """
+    Close every connection the calling thread opened; the stores reopen
+    them on next use
+    """
+    for local in getattr(_opened, 'locals', ()):
+        conn = local.__dict__.pop('conn', None)
+        if conn is not None:
+            conn.close()
+    _opened.locals = []
+
+
+def _gevent_patched():
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('threading')
+
+
+def init_app(app):
+    """
+    Under gevent, close each request's connections when it finishes; OS
+    threads are long-lived, so their connections are kept for reuse
+    """
+    if not _gevent_patched():
+        return
+
+    @app.teardown_appcontext
+    def close_request_connections(exception=None):
+        close_thread_connections()
@@ -0,0 +1,174 @@
+"""
+Server-side session storage
+The session cookie carries only an opaque session ID; the session data lives
+in a shared store (SQLite by default, Redis when configured), so request
+headers stay small and the same size however much the session holds.
+"""
+import logging
+import os
+import secrets
+import threading
+import time
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+from services.sqlite_connections import thread_connection
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    """
+    Session dict that remembers its store ID and whether it was changed
+    """
+
+    def __init__(self, initial=None, sid=None, new=False):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+
+
+class SQLiteSessionStore:
+    """
+    Session store in a local SQLite file, shared by every worker on the host
+    """
+    # Only purge expired sessions every N writes to keep it off the hot path
+    PURGE_INTERVAL = 256
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " sid TEXT PRIMARY KEY,"
+            " data TEXT NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+
+    def _connection(self):
+        return thread_connection(self._local, self.path)
+
+    def get(self, sid):
+        row = self._connection().execute(
+            "SELECT data FROM sessions WHERE sid = ? AND expires_at > ?", (sid, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, sid, data, ttl):
+        conn = self._connection()
+        conn.execute(
+            "INSERT OR REPLACE INTO sessions (sid, data, expires_at) VALUES (?, ?, ?)",
+            (sid, data, time.time() + ttl)
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_INTERVAL == 0:
+            conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+
+    def delete(self, sid):
+        self._connection().execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+
+
+class RedisSessionStore:
+    """
+    Session store in Redis, shared by every worker on every host
+    """
+
+    def __init__(self, url, prefix='session:'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, sid):
+        data = self.client.get(self.prefix + sid)
+        return data.decode('utf-8') if data is not None else None
+
+    def set(self, sid, data, ttl):
+        self.client.setex(self.prefix + sid, ttl, data)
+
+    def delete(self, sid):
+        self.client.delete(self.prefix + sid)
+
+
+def build_session_store(backend, path=None, redis_url=None):
+    """
+    Build a session store for the given backend name: 'sqlite' or 'redis'
+    """
+    if backend == 'redis':
+        return RedisSessionStore(redis_url)
+    if backend != 'sqlite':
+        logging.warning(f"Unknown session backend '{backend}', falling back to sqlite")
+    return SQLiteSessionStore(path)
+
+
+class ServerSideSessionInterface(SessionInterface):
+    """
+    Flask session interface that keeps session data in a server-side store
+
+    The store is only written when the session changes, and the cookie is
+    only sent when a new session is first saved.
+    """
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            try:
+                data = self.store.get(sid)
+                if data is not None:
+                    return ServerSideSession(self.serializer.loads(data), sid=sid)
+            except Exception as e:
+                logging.error(f"Error loading session: {e}")
+        return ServerSideSession(sid=secrets.token_urlsafe(32), new=True)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.modified and not session.new:
+                self.store.delete(session.sid)
+                response.delete_cookie(
+                    name, domain=domain, path=path, secure=secure, samesite=samesite, httponly=httponly
+                )
+            return
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        ttl = int(app.permanent_session_lifetime.total_seconds())
+        try:
+            self.store.set(session.sid, self.serializer.dumps(dict(session)), ttl)
+        except Exception as e:
+            logging.error(f"Error saving session: {e}")
+            return
+
+        if session.new or session.permanent:
+            response.set_cookie(
+                name,
+                session.sid,
+                expires=self.get_expiration_time(app, session),
+                httponly=httponly,
+                domain=domain,
+                path=path,
+                secure=secure,
+                samesite=samesite,
+            )
@@ -31,7 +31,7 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Send message to server with selected provider
         const selectedProvider = aiProviderSelect ? aiProviderSelect.value : 'openrouter';
-        sendMessageToServer(message, selectedProvider);
+        streamMessageFromServer(message, selectedProvider);
     });
     
     // Event listener for suggestion buttons
@@ -72,6 +72,17 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // Scroll to bottom
         chatContainer.scrollTop = chatContainer.scrollHeight;
+        
+        return messageDiv;
+    }
+    
+    // Function to add a small provider badge to the last message
+    function addProviderBadge(provider) {
+        const lastMessage = chatContainer.lastElementChild;
+        const badge = document.createElement('div');
+        badge.className = 'provider-badge';
+        badge.innerHTML = `<small class="text-muted">via ${provider === 'openai' ? 'OpenAI' : 'OpenRouter'}</small>`;
+        lastMessage.appendChild(badge);
     }
     
     // Function to process message content for formatting
@@ -136,13 +147,123 @@ document.addEventListener('DOMContentLoaded', function() {
                 
                 // Add small provider badge if we have this info
                 if (data.provider) {
-                    const lastMessage = chatContainer.lastElementChild;
-                    const badge = document.createElement('div');
-                    badge.className = 'provider-badge';
-                    badge.innerHTML = `<small class="text-muted">via ${data.provider === 'openai' ? 'OpenAI' : 'OpenRouter'}</small>`;
-                    lastMessage.appendChild(badge);
+                    addProviderBadge(data.provider);
+                }
+            }
+        })
+        .catch(error => {
+            // Hide loading indicator
+            loadingOverlay.classList.add('d-none');
+            
+            console.error('Error:', error);
+            
+            // Show error message
+            addMessageToChat('assistant', `<div class="alert alert-danger mb-0">
+                <i class="fas fa-exclamation-circle me-2"></i> ${error.message || 'Sorry, there was an error processing your request. Please try again.'}
+            </div>`);
+        });
+    }
+    
+    // Function to stream the response from the server, rendering tokens as they arrive
+    function streamMessageFromServer(message, provider) {
+        // Fall back to a single JSON response where fetch streams are unsupported
+        if (!window.ReadableStream || !window.TextDecoder) {
+            sendMessageToServer(message, provider);
+            return;
+        }
+        
+        let contentDiv = null;
+        let responseText = '';
+        let renderPending = false;
+        
+        // Re-render at most once per frame however fast tokens arrive
+        function scheduleRender() {
+            if (renderPending) return;
+            renderPending = true;
+            requestAnimationFrame(() => {
+                renderPending = false;
+                contentDiv.innerHTML = processMessageContent(responseText);
+                chatContainer.scrollTop = chatContainer.scrollHeight;
+            });
+        }
+        
+        function handleEvent(rawEvent) {
+            let eventName = 'message';
+            let data = '';
+            rawEvent.split('\n').forEach(line => {
+                if (line.startsWith('event:')) {
+                    eventName = line.slice(6).trim();
+                } else if (line.startsWith('data:')) {
+                    data += line.slice(5).trim();
+                }
+            });
+            if (!data) return;
+            
+            const payload = JSON.parse(data);
+            if (eventName === 'token') {
+                if (!contentDiv) {
+                    // First token: swap the loading indicator for the message bubble
+                    loadingOverlay.classList.add('d-none');
+                    contentDiv = addMessageToChat('assistant', '').querySelector('.chat-message-content');
                 }
+                responseText += payload.text;
+                scheduleRender();
+            } else if (eventName === 'done') {
+                if (contentDiv) {
+                    contentDiv.innerHTML = processMessageContent(responseText);
+                    
+                    // Add to chat history
+                    chatHistory.push({ role: "assistant", content: responseText });
+                    
+                    addProviderBadge(payload.provider);
+                }
+            } else if (eventName === 'error') {
+                throw new Error(payload.error);
+            }
+        }
+        
+        fetch('/api/chat/stream', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify({
+                message: message,
+                history: chatHistory,
+                provider: provider
+            })
+        })
+        .then(response => {
+            if (!response.ok || !response.body) {
+                return response.json().then(data => {
+                    throw new Error(data.error || 'Server error');
+                });
+            }
+            
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            
+            function read() {
+                return reader.read().then(({ done, value }) => {
+                    if (done) return;
+                    
+                    buffer += decoder.decode(value, { stream: true });
+                    
+                    // Events are separated by a blank line
+                    let boundary;
+                    while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                        handleEvent(buffer.slice(0, boundary));
+                        buffer = buffer.slice(boundary + 2);
+                    }
+                    return read();
+                });
             }
+            
+            return read();
+        })
+        .then(() => {
+            loadingOverlay.classList.add('d-none');
         })
         .catch(error => {
             // Hide loading indicator
@@ -167,12 +167,10 @@ document.addEventListener('DOMContentLoaded', function() {
         enhanceNutritionVisuals();
     }
     
-    // YouTube Video Integration
+    // YouTube Video Integration (loaded after first paint in progressive mode)
     const recipeVideoSection = document.getElementById('recipeVideoSection');
-    if (recipeVideoSection) {
-        const recipeTitle = document.querySelector('h1').textContent;
-        
-        fetch(`/api/recipe-videos/${encodeURIComponent(recipeTitle)}`)
+    if (recipeVideoSection && recipeVideoSection.dataset.videosUrl) {
+        fetch(recipeVideoSection.dataset.videosUrl)
             .then(response => response.json())
             .then(data => {
                 if (data.error || !data.videos || data.videos.length === 0) {
@@ -191,15 +189,20 @@ document.addEventListener('DOMContentLoaded', function() {
                         videoCard.innerHTML = `
                             <div class="card h-100">
                                 <div class="ratio ratio-16x9">
-                                    <iframe src="https://www.youtube.com/embed/${video.youTubeId}" 
-                                            title="${video.title}" allowfullscreen></iframe>
+                                    <iframe allowfullscreen></iframe>
                                 </div>
                                 <div class="card-body">
-                                    <h5 class="card-title">${video.title}</h5>
-                                    <p class="text-muted small">${video.views} views</p>
+                                    <h5 class="card-title"></h5>
+                                    <p class="text-muted small"></p>
                                 </div>
                             </div>
                         `;
+                        // Titles come from YouTube: set as text, never parsed as HTML
+                        const iframe = videoCard.querySelector('iframe');
+                        iframe.setAttribute('src', `https://www.youtube.com/embed/${encodeURIComponent(video.youTubeId)}`);
+                        iframe.setAttribute('title', video.title);
+                        videoCard.querySelector('.card-title').textContent = video.title;
+                        videoCard.querySelector('.card-body p').textContent = `${video.views} views`;
                         
                         videoContainer.appendChild(videoCard);
                     });
@@ -212,4 +215,60 @@ document.addEventListener('DOMContentLoaded', function() {
                 recipeVideoSection.classList.add('d-none');
             });
     }
+    
+    // Similar recipes (loaded after first paint in progressive mode)
+    const similarRecipesSection = document.getElementById('similarRecipesSection');
+    if (similarRecipesSection && similarRecipesSection.dataset.similarUrl) {
+        fetch(similarRecipesSection.dataset.similarUrl)
+            .then(response => response.json())
+            .then(data => {
+                if (data.error || !data.similar_recipes || data.similar_recipes.length === 0) {
+                    return;
+                }
+                
+                const similarContainer = document.getElementById('similarRecipes');
+                similarContainer.innerHTML = '';
+                
+                data.similar_recipes.forEach(similar => {
+                    const similarCard = document.createElement('div');
+                    similarCard.className = 'col-md-4';
+                    
+                    similarCard.innerHTML = `
+                        <div class="card recipe-card h-100">
+                            <div class="placeholder-img"><i class="fas fa-image fa-3x text-muted"></i></div>
+                            <div class="card-body">
+                                <h5 class="card-title"></h5>
+                                <div class="recipe-card-meta">
+                                    <span class="badge bg-primary"><i class="fas fa-clock"></i> <span class="ready-in"></span> mins</span>
+                                    <span class="badge bg-secondary"><i class="fas fa-users"></i> <span class="servings"></span> servings</span>
+                                </div>
+                            </div>
+                            <div class="card-footer">
+                                <a class="btn btn-sm btn-outline-primary">View Recipe</a>
+                            </div>
+                        </div>
+                    `;
+                    // Recipe data comes from Spoonacular and the local corpus:
+                    // set as text and attributes, never parsed as HTML
+                    if (similar.image) {
+                        const image = document.createElement('img');
+                        image.className = 'card-img-top';
+                        image.setAttribute('src', similar.image);
+                        image.setAttribute('alt', similar.title);
+                        similarCard.querySelector('.placeholder-img').replaceWith(image);
+                    }
+                    similarCard.querySelector('.card-title').textContent = similar.title;
+                    similarCard.querySelector('.ready-in').textContent = similar.readyInMinutes;
+                    similarCard.querySelector('.servings').textContent = similar.servings;
+                    similarCard.querySelector('.card-footer a').setAttribute('href', `/recipe/${encodeURIComponent(similar.id)}`);
+                    
+                    similarContainer.appendChild(similarCard);
+                });
+                
+                similarRecipesSection.classList.remove('d-none');
+            })
+            .catch(error => {
+                console.error('Error loading similar recipes:', error);
+            });
+    }
 });
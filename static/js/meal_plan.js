@@ -236,8 +236,8 @@ document.addEventListener('DOMContentLoaded', function() {
         if (!imageUrl) {
             // If no image, use a placeholder
             imageUrl = 'https://via.placeholder.com/300x200?text=No+Image+Available';
-        } else if (!imageUrl.startsWith('http')) {
-            // If relative URL, prefix with base URL
+        } else if (!imageUrl.startsWith('http') && !imageUrl.startsWith('/')) {
+            // If a bare file name, prefix with base URL
             imageUrl = `https://spoonacular.com/recipeImages/${imageUrl}`;
         }
         
@@ -0,0 +1,75 @@
+import time
+import pytest
+from config import Config
+from services.cache import MISSING, MemoryCache, SQLiteCache, TieredCache, make_key
+
+
+@pytest.fixture(autouse=True)
+def short_grace(monkeypatch):
+    monkeypatch.setattr(Config, 'CACHE_STALE_GRACE', 0.2)
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'tiered'])
+def cache(request, tmp_path):
+    if request.param == 'memory':
+        return MemoryCache()
+    if request.param == 'sqlite':
+        return SQLiteCache(str(tmp_path / 'cache.sqlite3'))
+    return TieredCache(MemoryCache(), SQLiteCache(str(tmp_path / 'cache.sqlite3')))
+
+
+def test_values_are_served_until_their_ttl(cache):
+    cache.set('fresh', {'id': 1}, 60)
+    cache.set('empty', [], 60)
+
+    assert cache.get('fresh') == {'id': 1}
+    # Falsy values are cached too
+    assert cache.get('empty') == []
+    assert cache.get('unknown') is MISSING
+
+
+def test_expired_values_are_misses_but_stay_stale_for_the_grace_period(cache):
+    cache.set('key', 'value', 0.05)
+    time.sleep(0.1)
+
+    assert cache.get('key') is MISSING
+    assert cache.get_stale('key')[0] == 'value'
+
+    time.sleep(0.2)
+    assert cache.get_stale('key')[0] is MISSING
+
+
+@pytest.mark.parametrize('backend', ['memory', 'sqlite'])
+def test_expiration_is_counted_once_per_removed_entry(backend, tmp_path):
+    cache = MemoryCache() if backend == 'memory' else SQLiteCache(str(tmp_path / 'cache.sqlite3'))
+    cache.set('key', 'value', 0.05)
+    time.sleep(0.1)
+
+    for _ in range(3):
+        cache.get('key')
+        cache.get_stale('key')
+    assert cache.stats.snapshot()['expirations'] == 0
+
+    time.sleep(0.2)
+    for _ in range(3):
+        cache.get('key')
+        cache.get_stale('key')
+    assert cache.stats.snapshot()['expirations'] == 1
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(max_entries=2)
+    cache.set('a', 1, 60)
+    cache.set('b', 2, 60)
+    cache.get('a')
+
+    cache.set('c', 3, 60)
+
+    assert cache.get('b') is MISSING
+    assert cache.get('a') == 1
+    assert cache.stats.snapshot()['evictions'] == 1
+
+
+def test_keys_do_not_depend_on_dict_order():
+    assert make_key('search', {'a': 1, 'b': 2}) == make_key('search', {'b': 2, 'a': 1})
+    assert make_key('search', 'pasta') != make_key('information', 'pasta')
@@ -0,0 +1,74 @@
+import gzip
+
+import pytest
+from flask import Flask, jsonify, url_for
+
+import http_caching
+
+
+@pytest.fixture
+def client(tmp_path):
+    static = tmp_path / 'static'
+    static.mkdir()
+    (static / 'app.js').write_text('console.log("recipes");\n' * 100)
+
+    app = Flask(__name__, static_folder=str(static))
+
+    @app.route('/api/recipes')
+    def api_recipes():
+        return jsonify(results=[{'id': n, 'title': f"Recipe {n}"} for n in range(50)])
+
+    @app.route('/api/meal-plan')
+    def api_meal_plan():
+        return jsonify(meals=[])
+
+    http_caching.init_app(app)
+    return app.test_client()
+
+
+def test_matching_if_none_match_gets_304(client):
+    first = client.get('/api/recipes')
+    etag = first.headers['ETag']
+
+    again = client.get('/api/recipes', headers={'If-None-Match': etag})
+
+    assert first.status_code == 200
+    assert first.headers['Cache-Control'] == http_caching.DEFAULT_POLICY
+    assert again.status_code == 304
+    assert again.data == b''
+    assert client.get('/api/recipes', headers={'If-None-Match': 'W/"stale"'}).status_code == 200
+
+
+def test_compressed_and_identity_bodies_share_the_etag(client):
+    plain = client.get('/api/recipes', headers={'Accept-Encoding': 'identity'})
+    zipped = client.get('/api/recipes', headers={'Accept-Encoding': 'gzip'})
+
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(zipped.data) == plain.data
+    assert zipped.headers['ETag'] == plain.headers['ETag']
+    assert 'Accept-Encoding' in zipped.headers['Vary']
+    assert client.get('/api/recipes', headers={'Accept-Encoding': 'gzip', 'If-None-Match': plain.headers['ETag']}).status_code == 304
+
+
+def test_no_store_routes_are_never_validated(client):
+    response = client.get('/api/meal-plan', headers={'If-None-Match': '*'})
+
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == 'no-store'
+    assert 'ETag' not in response.headers
+
+
+def test_fingerprinted_static_urls_are_immutable(client):
+    with client.application.test_request_context():
+        url = url_for('static', filename='app.js')
+    assert '?v=' in url
+
+    response = client.get(url)
+    etag = response.headers['ETag']
+    response.close()
+
+    assert 'immutable' in response.headers['Cache-Control']
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+    plain = client.get('/static/app.js')
+    assert 'immutable' not in (plain.headers.get('Cache-Control') or '')
+    plain.close()
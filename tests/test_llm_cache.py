@@ -0,0 +1,51 @@
+import threading
+import time
+from services.cache import MemoryCache, get_cache
+from services.llm_cache import PromptCache, prompt_key
+
+
+def test_concurrent_identical_prompts_make_one_upstream_call():
+    cache = PromptCache(MemoryCache())
+    key = prompt_key('openrouter', 'model', [{'role': 'user', 'content': 'How do I poach an egg?'}])
+    calls = []
+    start = threading.Barrier(8)
+    results = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return 'Simmer, swirl, slide it in.'
+
+    def ask():
+        start.wait()
+        results.append(cache.get_or_compute(key, compute))
+
+    threads = [threading.Thread(target=ask) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert results == ['Simmer, swirl, slide it in.'] * 8
+    assert cache.get_or_compute(key, compute) == 'Simmer, swirl, slide it in.'
+    assert len(calls) == 1
+
+
+def test_normalized_prompts_share_an_entry():
+    first = prompt_key('openai', 'model', [{'role': 'user', 'content': 'How do I poach an egg?'}])
+    second = prompt_key('openai', 'model', [{'role': 'user', 'content': '  how do I  poach an EGG'}])
+
+    assert first == second
+
+
+def test_prompts_stay_out_of_the_response_cache():
+    backend = MemoryCache()
+    cache = PromptCache(backend)
+    responses = get_cache().stats.snapshot()
+
+    cache.store('llm:key', 'answer')
+
+    assert cache.lookup('llm:key') == 'answer'
+    assert len(backend) == 1
+    assert get_cache().stats.snapshot()['sets'] == responses['sets']
@@ -0,0 +1,75 @@
+import pytest
+
+from config import Config
+from services import meal_planner
+from services.nutrition_store import NutritionStore
+from services.recipe_store import RecipeStore
+
+
+def _recipe(recipe_id, dish_type, calories, vegetarian, ingredient):
+    # Macros in the default 20/30/50 split of the recipe's calories
+    nutrients = [
+        {'name': 'Calories', 'amount': calories},
+        {'name': 'Protein', 'amount': calories * 0.2 / 4},
+        {'name': 'Fat', 'amount': calories * 0.3 / 9},
+        {'name': 'Carbohydrates', 'amount': calories * 0.5 / 4},
+    ]
+    return {
+        'id': recipe_id,
+        'title': f"{dish_type.title()} {recipe_id}",
+        'dishTypes': [dish_type],
+        'vegetarian': vegetarian,
+        'readyInMinutes': 20,
+        'extendedIngredients': [{'name': ingredient}],
+        'nutrition': {'nutrients': nutrients},
+    }
+
+
+@pytest.fixture
+def corpus(tmp_path, monkeypatch):
+    recipes = RecipeStore(str(tmp_path / 'recipes.sqlite3'))
+    nutrition = NutritionStore(str(tmp_path / 'nutrition.sqlite3'))
+    monkeypatch.setattr(meal_planner, 'get_recipe_store', lambda: recipes)
+    monkeypatch.setattr(meal_planner, 'get_nutrition_store', lambda: nutrition)
+    monkeypatch.setattr(Config, 'MEAL_PLAN_MIN_POOL', 5)
+
+    batch = []
+    for n in range(40):
+        vegetarian = n % 2 == 0
+        ingredient = 'tofu' if vegetarian else 'chicken'
+        batch.append(_recipe(100 + n, 'breakfast', 300 + 10 * n, vegetarian, ingredient))
+        batch.append(_recipe(200 + n, 'main course', 600 + 15 * n, vegetarian, ingredient))
+    recipes.add_recipes(batch)
+    nutrition.add_recipes(batch)
+    return {recipe['id']: recipe for recipe in batch}
+
+
+def _meals(day):
+    return [meal['id'] for meal in day['meals']]
+
+
+def test_day_plan_meets_calorie_and_diet_targets(corpus):
+    plan = meal_planner.plan_locally('day', 2000, diet='vegetarian')
+
+    meals = _meals(plan)
+    assert len(meals) == 3 and len(set(meals)) == 3
+    assert all(corpus[recipe_id]['vegetarian'] for recipe_id in meals)
+    assert corpus[meals[0]]['dishTypes'] == ['breakfast']
+    calories = sum(corpus[recipe_id]['nutrition']['nutrients'][0]['amount'] for recipe_id in meals)
+    assert abs(calories - 2000) <= 2000 * Config.MEAL_PLAN_CALORIE_TOLERANCE
+    assert plan['nutrients']['calories'] == pytest.approx(calories)
+
+
+def test_week_plan_never_repeats_a_recipe_or_an_excluded_ingredient(corpus):
+    plan = meal_planner.plan_locally('week', 2300, exclude='tofu')
+
+    meals = [recipe_id for day in plan['week'].values() for recipe_id in _meals(day)]
+    assert len(meals) == 21 and len(set(meals)) == 21
+    assert not any(corpus[recipe_id]['vegetarian'] for recipe_id in meals)
+
+
+def test_falls_back_upstream_when_the_diet_leaves_too_few_recipes(corpus, monkeypatch):
+    monkeypatch.setattr(Config, 'MEAL_PLAN_MIN_POOL', 100)
+
+    assert meal_planner.plan_locally('day', 2000, diet='vegetarian') is None
+    assert meal_planner.plan_locally('day', 2000, diet='whole30') is None
@@ -0,0 +1,58 @@
+import math
+
+from services.nutrition_store import COLUMNS, NutritionStore
+
+
+def _recipe(recipe_id, calories, protein=None):
+    nutrients = [{'name': 'Calories', 'amount': calories, 'unit': 'kcal'}]
+    if protein is not None:
+        nutrients.append({'name': 'Protein', 'amount': protein, 'unit': 'g'})
+    return {'id': recipe_id, 'nutrition': {'nutrients': nutrients}}
+
+
+def test_vector_has_reported_nutrients_and_nan_elsewhere(tmp_path):
+    store = NutritionStore(str(tmp_path / 'nutrition.sqlite3'))
+
+    assert store.add_recipes([_recipe(1, 450, protein=32), {'id': 2, 'title': 'No nutrition'}]) == 1
+
+    vector = store.vector(1)
+    assert vector[COLUMNS.index('calories')] == 450
+    assert vector[COLUMNS.index('protein')] == 32
+    assert math.isnan(vector[COLUMNS.index('fat')])
+    assert store.vector(2) is None
+
+
+def test_query_skips_recipes_without_the_bounded_nutrient(tmp_path):
+    store = NutritionStore(str(tmp_path / 'nutrition.sqlite3'))
+    store.add_recipes([_recipe(1, 450, protein=32), _recipe(2, 300), _recipe(3, 700, protein=40)])
+
+    assert store.query({'calories': (None, 500)}) == (2, [1, 2])
+    assert store.query({'calories': (None, 500), 'protein': (30, None)}) == (1, [1])
+    assert store.query({}, sort='calories', descending=True, number=2) == (3, [3, 1])
+
+
+def test_workers_pick_up_each_others_writes_by_version(tmp_path):
+    path = str(tmp_path / 'nutrition.sqlite3')
+    first, second = NutritionStore(path), NutritionStore(path)
+    assert len(second) == 0
+
+    first.add_recipes([_recipe(1, 450)])
+    second._sync(force=True)
+    first.add_recipes([_recipe(1, 400), _recipe(2, 300)])
+    second._sync(force=True)
+
+    assert len(second) == 2
+    assert second.vector(1)[COLUMNS.index('calories')] == 400
+    assert second._synced_version == 2
+
+
+def test_own_writes_do_not_skip_other_workers_rows(tmp_path):
+    path = str(tmp_path / 'nutrition.sqlite3')
+    first, second = NutritionStore(path), NutritionStore(path)
+    len(first)
+
+    second.add_recipes([_recipe(1, 450)])
+    first.add_recipes([_recipe(2, 300)])
+    first._sync(force=True)
+
+    assert first.totals([1, 2])['calories'] == 750
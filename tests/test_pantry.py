@@ -0,0 +1,57 @@
+from services.pantry import find_by_ingredients
+from services.recipe_store import RecipeIndex
+
+
+def _recipe(recipe_id, *names):
+    return {
+        'id': recipe_id,
+        'title': f"Recipe {recipe_id}",
+        'extendedIngredients': [{'name': name, 'nameClean': name} for name in names],
+    }
+
+
+def _index(*recipes):
+    index = RecipeIndex()
+    for recipe in recipes:
+        index.add(recipe)
+    return index
+
+
+def test_staple_pepper_does_not_hide_bell_pepper():
+    index = _index(_recipe(1, 'bell pepper', 'onion', 'pepper', 'salt'))
+
+    total, results = find_by_ingredients(['bell pepper'], index=index)
+
+    assert total == 1
+    assert results[0]['usedIngredients'] == ['bell pepper']
+    assert results[0]['missedIngredients'] == ['onion']
+
+
+def test_staple_sugar_does_not_hide_brown_sugar():
+    index = _index(_recipe(1, 'brown sugar', 'butter', 'sugar', 'flour'))
+
+    total, results = find_by_ingredients(['butter'], index=index)
+
+    assert total == 1
+    assert results[0]['missedIngredients'] == ['brown sugar']
+    assert results[0]['missedIngredientCount'] == 1
+
+
+def test_staples_are_counted_without_ignore_pantry():
+    index = _index(_recipe(1, 'brown sugar', 'butter', 'sugar'))
+
+    _, results = find_by_ingredients(['butter'], ignore_pantry=False, index=index)
+
+    assert sorted(results[0]['missedIngredients']) == ['brown sugar', 'sugar']
+
+
+def test_each_index_gets_its_own_matrix():
+    # Built one after another so the second index can reuse the first's id()
+    total, _ = find_by_ingredients(['rice'], index=_index(_recipe(1, 'rice', 'beans')))
+    assert total == 1
+
+    total, results = find_by_ingredients(['pasta'], index=_index(_recipe(2, 'pasta', 'basil')))
+
+    assert total == 1
+    assert results[0]['id'] == 2
+    assert results[0]['usedIngredients'] == ['pasta']
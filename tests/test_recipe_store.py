@@ -0,0 +1,86 @@
+from services.recipe_store import RecipeIndex, RecipeStore
+
+
+def _recipe(recipe_id, title, *ingredients, **fields):
+    return {
+        'id': recipe_id,
+        'title': title,
+        'extendedIngredients': [{'name': name} for name in ingredients],
+        **fields,
+    }
+
+
+def _index(*recipes):
+    index = RecipeIndex()
+    for recipe in recipes:
+        index.add(recipe)
+    return index
+
+
+def _ids(results):
+    return [card['id'] for card in results]
+
+
+def test_postings_match_title_and_ingredient_words():
+    index = _index(_recipe(1, 'Tomato soup', 'tomato', 'onion'), _recipe(2, 'Onion rings', 'onion', 'flour'))
+
+    assert _ids(index.search('tomato')[1]) == [1]
+    # Title matches outrank ingredient matches
+    assert _ids(index.search('onions')[1]) == [2, 1]
+    assert index.search('tomato flour') == (0, [])
+
+
+def test_reindexing_replaces_old_postings():
+    index = _index(_recipe(1, 'Tomato soup', 'tomato'))
+
+    index.add(_recipe(1, 'Pumpkin soup', 'pumpkin'))
+
+    assert index.search('tomato') == (0, [])
+    assert _ids(index.search('pumpkin')[1]) == [1]
+
+
+def test_submitted_search_does_not_expand_prefixes():
+    index = _index(_recipe(1, 'Fried egg', 'egg'), _recipe(2, 'Grilled eggplant', 'eggplant'))
+
+    assert _ids(index.search('egg')[1]) == [1]
+    assert sorted(_ids(index.search('egg', prefix=True)[1])) == [1, 2]
+
+
+def test_diet_and_intolerance_bitsets_filter_results():
+    index = _index(
+        _recipe(1, 'Veggie pasta', 'pasta', 'tomato', vegetarian=True),
+        _recipe(2, 'Beef pasta', 'pasta', 'ground beef', vegetarian=False),
+        _recipe(3, 'Veggie rice bowl', 'rice', 'tomato', vegetarian=True),
+    )
+
+    assert _ids(index.search('pasta', diet='vegetarian')[1]) == [1]
+    assert _ids(index.search('veggie', intolerances='gluten')[1]) == [3]
+    # A filter the index cannot evaluate defers to upstream
+    assert index.search('pasta', diet='whole30') == (0, [])
+
+
+def test_workers_pick_up_each_others_writes_by_version(tmp_path):
+    path = str(tmp_path / 'recipes.sqlite3')
+    first, second = RecipeStore(path), RecipeStore(path)
+    assert len(second.current_index()) == 0
+
+    first.add_recipes([_recipe(1, 'Tomato soup', 'tomato')])
+    second._sync(force=True)
+    first.add_recipes([_recipe(1, 'Tomato basil soup', 'tomato', 'basil'), _recipe(2, 'Pesto', 'basil')])
+    second._sync(force=True)
+
+    assert len(second.index) == 2
+    assert sorted(_ids(second.index.search('basil')[1])) == [1, 2]
+    assert second._synced_version == 2
+
+
+def test_failed_write_leaves_index_untouched(tmp_path):
+    store = RecipeStore(str(tmp_path / 'recipes.sqlite3'))
+
+    try:
+        store.add_recipes([_recipe(1, 'Tomato soup', 'tomato'), _recipe(2, 'Broken', 'x', extra=object())])
+    except TypeError:
+        pass
+
+    assert 1 not in store.index
+    assert store.get(1) is None
@@ -0,0 +1,41 @@
+import pytest
+from config import Config
+from services import recommender
+from services.recipe_store import RecipeIndex
+
+
+@pytest.fixture(autouse=True)
+def small_corpus(monkeypatch):
+    monkeypatch.setattr(Config, 'LOCAL_SIMILAR_MIN_CORPUS', 1)
+    monkeypatch.setattr(recommender, 'get_nutrition_store', lambda: None)
+
+
+def _index(*recipes):
+    index = RecipeIndex()
+    for recipe_id, *names in recipes:
+        index.add({
+            'id': recipe_id,
+            'title': f"Recipe {recipe_id}",
+            'extendedIngredients': [{'name': name} for name in names],
+        })
+    return index
+
+
+def test_similar_recipes_share_ingredients():
+    index = _index((1, 'chicken', 'rice'), (2, 'chicken', 'rice', 'garlic'), (3, 'chocolate', 'cream'))
+
+    cards = recommender.similar_recipes(1, 1, index=index)
+
+    assert [card['id'] for card in cards] == [2]
+
+
+def test_each_index_gets_its_own_similarity_state():
+    # Same size, so both indexes reach the same version; built one after
+    # another so the second can reuse the first's id()
+    cards = recommender.similar_recipes(1, 1, index=_index((1, 'rice', 'beans'), (2, 'rice', 'beans', 'corn'), (3, 'fish')))
+    assert [card['id'] for card in cards] == [2]
+
+    index = _index((10, 'pasta', 'basil'), (11, 'pasta', 'basil', 'tomato'), (12, 'tofu'))
+    cards = recommender.similar_recipes(10, 1, index=index)
+
+    assert [card['id'] for card in cards] == [11]
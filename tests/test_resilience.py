@@ -0,0 +1,100 @@
+import pytest
+from config import Config
+from services.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+@pytest.fixture(autouse=True)
+def breaker_config(monkeypatch):
+    monkeypatch.setattr(Config, 'CIRCUIT_FAILURE_THRESHOLD', 3)
+    monkeypatch.setattr(Config, 'CIRCUIT_RESET_TIMEOUT', 0)
+
+
+def _tripped():
+    breaker = CircuitBreaker('test')
+    for _ in range(3):
+        breaker.release(breaker.allow())
+        breaker.record_failure()
+    return breaker
+
+
+def test_opens_after_consecutive_failures(monkeypatch):
+    monkeypatch.setattr(Config, 'CIRCUIT_RESET_TIMEOUT', 60)
+    breaker = CircuitBreaker('test')
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    breaker.record_failure()
+
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+    assert breaker.snapshot()['trips'] == 1
+    assert breaker.snapshot()['rejected'] == 1
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker('test')
+    breaker.record_failure()
+    breaker.record_failure()
+
+    breaker.record_success()
+    breaker.record_failure()
+
+    assert breaker.state == CLOSED
+
+
+def test_half_open_lets_one_trial_through():
+    breaker = _tripped()
+
+    trial = breaker.allow()
+
+    assert trial
+    assert breaker.state == HALF_OPEN
+    assert not breaker.allow()
+
+
+def test_successful_trial_closes_the_circuit():
+    breaker = _tripped()
+    trial = breaker.allow()
+
+    breaker.record_success()
+    breaker.release(trial)
+
+    assert breaker.state == CLOSED
+    assert breaker.allow() is True
+
+
+def test_failed_trial_reopens_the_circuit(monkeypatch):
+    breaker = _tripped()
+    trial = breaker.allow()
+    monkeypatch.setattr(Config, 'CIRCUIT_RESET_TIMEOUT', 60)
+
+    breaker.record_failure()
+    breaker.release(trial)
+
+    assert breaker.state == OPEN
+    assert not breaker.allow()
+
+
+def test_trial_that_raised_is_released():
+    breaker = _tripped()
+    trial = breaker.allow()
+
+    # Neither success nor failure was recorded
+    breaker.release(trial)
+
+    assert breaker.allow()
+
+
+def test_other_calls_do_not_end_a_running_trial():
+    breaker = CircuitBreaker('test')
+    earlier = breaker.allow()
+    for _ in range(3):
+        breaker.record_failure()
+    trial = breaker.allow()
+    assert trial
+
+    breaker.release(earlier)
+
+    assert not breaker.allow()
@@ -0,0 +1,114 @@
+import datetime
+import pytest
+from flask import Flask
+from models import db, RecipeIngredients, ShoppingList
+from services import shopping_list
+from session_store import ServerSideSessionInterface, SQLiteSessionStore
+
+RECIPES = {
+    1: [('Produce', 'onion', '', 1), ('Dairy', 'butter', 'tbsp', 2)],
+    2: [('Produce', 'onion', '', 2), ('Produce', 'garlic', 'clove', 3)],
+    # The same item twice in one recipe
+    3: [('Dairy', 'butter', 'tbsp', 1), ('Dairy', 'Butter', 'tbsp', 1)],
+}
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'app.db'}"
+    app.session_interface = ServerSideSessionInterface(SQLiteSessionStore(str(tmp_path / 'sessions.sqlite3')))
+    db.init_app(app)
+
+    def hydrate_recipes(recipe_ids):
+        return {
+            recipe_id: {
+                'id': recipe_id,
+                'title': f"Recipe {recipe_id}",
+                'extendedIngredients': [
+                    {'aisle': aisle, 'name': name, 'unit': unit, 'amount': amount}
+                    for aisle, name, unit, amount in RECIPES[recipe_id]
+                ],
+            }
+            for recipe_id in recipe_ids if recipe_id in RECIPES
+        }
+    monkeypatch.setattr(shopping_list, 'hydrate_recipes', hydrate_recipes)
+
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+def _totals(list_id):
+    return {
+        item['name']: (item['measures']['us']['amount'], item['measures']['us']['unit'])
+        for aisle in shopping_list.get_shopping_list(list_id)['aisles']
+        for item in aisle['items']
+    }
+
+
+def test_adding_recipes_sums_shared_ingredients(app):
+    list_id = shopping_list.create_list('sid')
+
+    assert shopping_list.add_recipe(list_id, 1)
+    assert shopping_list.add_recipe(list_id, 2)
+
+    assert _totals(list_id) == {'onion': (3, ''), 'butter': (2, 'tbsp'), 'garlic': (3, 'clove')}
+    assert shopping_list.get_recipe_ids(list_id) == [1, 2]
+
+
+def test_re_adding_a_recipe_changes_nothing(app):
+    list_id = shopping_list.create_list('sid')
+    shopping_list.add_recipe(list_id, 1)
+
+    assert not shopping_list.add_recipe(list_id, 1)
+
+    assert _totals(list_id) == {'onion': (1, ''), 'butter': (2, 'tbsp')}
+
+
+def test_duplicate_items_in_a_recipe_are_merged(app):
+    list_id = shopping_list.create_list('sid')
+    # A breakdown stored before ingredients were combined by name
+    db.session.add(RecipeIngredients(recipe_id=4, title='Old', ingredients=[
+        {'aisle': 'Dairy', 'name': 'butter', 'unit': 'tbsp', 'amount': 1},
+        {'aisle': 'Dairy', 'name': 'butter', 'unit': 'tbsp', 'amount': 2},
+    ]))
+    db.session.commit()
+
+    shopping_list.add_recipe(list_id, 3)
+    shopping_list.add_recipe(list_id, 4)
+    assert _totals(list_id) == {'butter': (5, 'tbsp')}
+
+    shopping_list.remove_recipe(list_id, 4)
+    assert _totals(list_id) == {'butter': (2, 'tbsp')}
+
+
+def test_removing_a_recipe_subtracts_it(app):
+    list_id = shopping_list.create_list('sid')
+    shopping_list.add_recipe(list_id, 1)
+    shopping_list.add_recipe(list_id, 2)
+
+    assert shopping_list.remove_recipe(list_id, 1)
+    assert not shopping_list.remove_recipe(list_id, 1)
+
+    assert _totals(list_id) == {'onion': (2, ''), 'garlic': (3, 'clove')}
+
+
+def test_purge_removes_only_lists_of_expired_sessions(app):
+    app.session_interface.store.set('live', '{}', 3600)
+    old = datetime.datetime.utcnow() - app.permanent_session_lifetime - datetime.timedelta(days=1)
+    lists = {}
+    for session_id in ('live', 'expired', 'recent'):
+        lists[session_id] = shopping_list.create_list(session_id)
+        shopping_list.add_recipe(lists[session_id], 1)
+    for session_id in ('live', 'expired'):
+        db.session.get(ShoppingList, lists[session_id]).created_at = old
+    db.session.commit()
+
+    assert shopping_list.purge_expired_lists() == 1
+
+    assert not shopping_list.list_exists(lists['expired'])
+    assert _totals(lists['expired']) == {}
+    assert shopping_list.list_exists(lists['live'])
+    assert shopping_list.list_exists(lists['recent'])
@@ -0,0 +1,36 @@
+import sqlite3
+import threading
+
+import pytest
+
+from services.sqlite_connections import close_thread_connections, thread_connection
+
+
+def test_connection_is_reused_until_closed(tmp_path):
+    local = threading.local()
+    path = str(tmp_path / 'store.sqlite3')
+
+    conn = thread_connection(local, path)
+    assert thread_connection(local, path) is conn
+
+    close_thread_connections()
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute("SELECT 1")
+    reopened = thread_connection(local, path)
+    assert reopened is not conn
+    assert reopened.execute("SELECT 1").fetchone() == (1,)
+    close_thread_connections()
+
+
+def test_close_only_touches_the_calling_threads_connections(tmp_path):
+    local = threading.local()
+    path = str(tmp_path / 'store.sqlite3')
+    mine = thread_connection(local, path)
+
+    thread = threading.Thread(target=lambda: (thread_connection(local, path), close_thread_connections()))
+    thread.start()
+    thread.join()
+
+    assert mine.execute("SELECT 1").fetchone() == (1,)
+    close_thread_connections()